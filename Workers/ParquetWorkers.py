@@ -0,0 +1,214 @@
+"""Columnar file sink.
+
+``ParquetSinkScheduler`` is an offline alternative to
+``PostgresMasterSchedule``: it reads the same ``(symbol, price,
+ingest_date)`` tuples or ``PriceBatch`` objects, collects them into columns and writes them to local
+Parquet (or Arrow IPC) files partitioned by date::
+
+    <output_dir>/date=2024-05-17/part-<id>-<n>.parquet
+
+Every instance writes its own files, a new one per date every
+``flush_interval`` seconds at most, and each flush becomes one row group (one
+record batch for Arrow). The layout is the hive style
+``pyarrow.dataset``, DuckDB, pandas and Spark understand, e.g.
+``pyarrow.dataset.dataset(output_dir, partitioning="hive")``.
+"""
+
+import os
+import threading
+import time
+import uuid
+from queue import Empty
+
+import logging
+from utils.metrics import NULL_STAGE_METRICS
+from utils.queues import ack
+from utils.records import PriceBatch
+from utils.setup_logging import setup_logging
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+setup_logging()
+logger = logging.getLogger(__name__)
+logger.info("ParquetWorkers logging initialized")
+
+FORMATS = ("parquet", "arrow")
+
+
+def _schema():
+    return pa.schema([
+        ("symbol", pa.string()),
+        ("price", pa.float64()),
+        ("ingest_date", pa.timestamp("us")),
+    ])
+
+
+class ParquetSinkScheduler(threading.Thread):
+    """Threaded sink writing prices to date partitioned columnar files.
+
+    Optional keyword arguments (from the ``parameters`` block of the YAML):
+
+    - ``output_dir``: root of the partitioned dataset (default
+      ``data/prices``).
+    - ``format``: ``parquet`` (default) or ``arrow`` for Arrow IPC files.
+    - ``row_group_size``: rows per row group; a partition's buffer is
+      written once it holds this many rows (default 10000).
+    - ``flush_interval``: seconds a partial row group may wait before it is
+      written anyway, and seconds a file stays open (default 60).
+    - ``row_groups_per_file``: row groups written to a file before it is
+      closed and the next rows go to a new one (default 100).
+    - ``compression``: Parquet codec or Arrow IPC codec (default ``zstd``).
+    - ``metrics``: stage metrics hook, passed in by the pipeline executor.
+
+    A file is closed, and so becomes readable, once ``flush_interval`` has
+    passed, once it holds ``row_groups_per_file`` row groups, when rows for a
+    later date arrive or when ``'DONE'`` is received. Input items are acknowledged (see
+    ``utils.queues.ack``) once the files holding their rows are closed.
+    """
+
+    def __init__(self, input_queue, **kwargs):
+        if pa is None:
+            raise ImportError("ParquetSinkScheduler needs pyarrow: pip install pyarrow")
+        if 'output_queues' in kwargs:
+            kwargs.pop('output_queues')
+        if 'output_queue' in kwargs:
+            kwargs.pop('output_queue')
+        self._metrics = kwargs.pop('metrics', None) or NULL_STAGE_METRICS
+        self._output_dir = kwargs.pop('output_dir', os.path.join('data', 'prices'))
+        self._format = kwargs.pop('format', 'parquet')
+        if self._format not in FORMATS:
+            raise ValueError(f"Unknown format {self._format!r}, expected one of {FORMATS}")
+        self._row_group_size = int(kwargs.pop('row_group_size', 10000))
+        self._flush_interval = float(kwargs.pop('flush_interval', 60))
+        self._row_groups_per_file = int(kwargs.pop('row_groups_per_file', 100))
+        self._compression = kwargs.pop('compression', 'zstd')
+        super(ParquetSinkScheduler, self).__init__(**kwargs)
+        self._input_queue = input_queue
+        self._schema = _schema()
+        self._file_id = uuid.uuid4().hex[:12]
+        self._file_count = 0
+        self._buffers = {}   # date -> (symbols, prices, ingest_dates)
+        self._writers = {}   # date -> open writer
+        self._row_groups = {}   # date -> row groups in the open file
+        self._buffer_items = {}   # date -> input items with rows in that date's buffer
+        self._unacked = {}        # date -> input items with rows in that date's open file
+        self._failed = {}         # id -> input item with rows that could not be written
+        self.start()
+
+    def run(self):
+        last_flush = time.monotonic()
+        while True:
+            timeout = None
+            if self._buffers or self._writers:
+                timeout = max(0.0, self._flush_interval - (time.monotonic() - last_flush))
+            try:
+                val = self._input_queue.get(timeout=timeout)  # (symbol, price, ingest_date) or PriceBatch
+            except Empty:
+                val = None
+            except Exception as e:
+                logger.error(f"Parquet sink has exception as {e}, stopping")
+                break
+
+            if val == 'DONE':
+                for date in list(self._buffers):
+                    self._flush(date)
+                self._close_writers()
+                break
+
+            if isinstance(val, PriceBatch):
+                self._metrics.item_in(len(val))
+                for row in val:
+                    self._append(row, val)
+            elif val is not None:
+                self._metrics.item_in()
+                self._append(val, val)
+            if (self._buffers or self._writers) and \
+                    time.monotonic() - last_flush >= self._flush_interval:
+                # close the files too: an open file has no footer, so a crash
+                # would lose it, and its items could not be acknowledged
+                for date in list(self._buffers):
+                    self._flush(date)
+                self._close_writers()
+                last_flush = time.monotonic()
+
+    def _append(self, row, item):
+        symbol, price, ingest_date = row
+        date = ingest_date.date().isoformat()
+        if date not in self._buffers:
+            # a new day: earlier days are complete, close their files
+            self._close_writers(before=date)
+            self._buffers[date] = ([], [], [])
+        items = self._buffer_items.setdefault(date, [])
+        if not items or items[-1] is not item:
+            items.append(item)
+        symbols, prices, ingest_dates = self._buffers[date]
+        symbols.append(symbol)
+        prices.append(price)
+        ingest_dates.append(ingest_date)
+        if len(symbols) >= self._row_group_size:
+            self._flush(date)
+
+    def _flush(self, date):
+        symbols, prices, ingest_dates = self._buffers.pop(date)
+        started = time.perf_counter()
+        try:
+            batch = pa.RecordBatch.from_arrays(
+                [pa.array(symbols, pa.string()), pa.array(prices, pa.float64()),
+                 pa.array(ingest_dates, pa.timestamp("us"))],
+                schema=self._schema,
+            )
+            writer = self._writer(date)
+            if self._format == 'parquet':
+                writer.write_batch(batch, row_group_size=self._row_group_size)
+            else:
+                writer.write_batch(batch)
+            self._metrics.item_out(len(symbols))
+            self._unacked.setdefault(date, []).extend(self._buffer_items.pop(date, []))
+            logger.info(f"Parquet sink wrote {len(symbols)} rows for {date}")
+            self._row_groups[date] = self._row_groups.get(date, 0) + 1
+            if self._row_groups[date] >= self._row_groups_per_file:
+                self._close_writer(date)
+        except Exception as e:
+            logger.error(f"Failed to write {len(symbols)} rows for {date}: {e}")
+            self._metrics.error(len(symbols))
+            # never acknowledged, so a durable input keeps them for the next run
+            for item in self._buffer_items.pop(date, []):
+                self._failed[id(item)] = item
+        self._metrics.observe(time.perf_counter() - started)
+
+    def _writer(self, date):
+        writer = self._writers.get(date)
+        if writer is None:
+            partition_dir = os.path.join(self._output_dir, f"date={date}")
+            os.makedirs(partition_dir, exist_ok=True)
+            # a date can be reopened by late rows: never reuse a closed file's name
+            self._file_count += 1
+            path = os.path.join(partition_dir, f"part-{self._file_id}-{self._file_count}.{self._format}")
+            if self._format == 'parquet':
+                writer = pq.ParquetWriter(path, self._schema, compression=self._compression)
+            else:
+                options = pa.ipc.IpcWriteOptions(compression=self._compression)
+                writer = pa.ipc.new_file(path, self._schema, options=options)
+            self._writers[date] = writer
+        return writer
+
+    def _close_writers(self, before=None):
+        for date in list(self._writers):
+            if before is None or date < before:
+                if date in self._buffers:
+                    self._flush(date)
+                if date in self._writers:
+                    self._close_writer(date)
+
+    def _close_writer(self, date):
+        self._writers.pop(date).close()
+        self._row_groups.pop(date, None)
+        # a batch spanning midnight waits for its other date's file
+        closed_items = self._unacked.pop(date, [])
+        still_open = {id(item) for items in list(self._unacked.values()) +
+                      list(self._buffer_items.values()) for item in items}
+        ack(self._input_queue, *[item for item in closed_items
+                                 if id(item) not in still_open and id(item) not in self._failed])
@@ -0,0 +1,83 @@
+"""HTML parser stage.
+
+``HtmlParserScheduler`` turns raw pages fetched by ``WikiWorkerScheduler``
+or ``YahooFinancePriceScheduler`` (both with ``emit: html``) into symbols or
+prices. Keeping parsing in its own stage means it can run with
+``mode: process`` in the pipeline YAML, one process per instance, so
+BeautifulSoup/lxml work no longer competes with the fetch threads for the
+GIL and the number of parser instances can be matched to the core count.
+"""
+
+import threading
+import time
+
+import logging
+from utils.metrics import NULL_STAGE_METRICS
+from utils.queues import ack
+from utils.setup_logging import setup_logging
+from Workers.WikiWorker import WikiWorker
+from Workers.YahooFinanceWorkers import YahooFinacePriceWorker
+setup_logging()
+logger = logging.getLogger(__name__)
+logger.info("ParserWorkers logging initialized")
+
+PARSERS = ("wiki_symbols", "yahoo_price")
+
+
+class HtmlParserScheduler(threading.Thread):
+    """Threaded scheduler that parses raw pages from its input queue.
+
+    With ``parser: wiki_symbols`` each input is ``(url, page_bytes)`` and
+    every constituent symbol on the page is put on the output queues. With
+    ``parser: yahoo_price`` each input is ``(symbol, page_bytes,
+    ingest_date)`` and the output is ``(symbol, price, ingest_date)``; pages
+    whose price can't be parsed are logged and dropped, like in
+    ``YahooFinacePriceWorker.get_price_for_symbol``.
+    """
+
+    def __init__(self, input_queue, output_queues, **kwargs):
+        self._metrics = kwargs.pop('metrics', None) or NULL_STAGE_METRICS
+        self._parser = kwargs.pop('parser')
+        if self._parser not in PARSERS:
+            raise ValueError(f"Unknown parser {self._parser!r}, expected one of {PARSERS}")
+        super(HtmlParserScheduler, self).__init__()
+        self._input_queue = input_queue
+        temp_queue = output_queues
+        if type(temp_queue) != list:
+            temp_queue = [temp_queue]
+        self._output_queues = temp_queue
+        self.start()
+
+    def run(self):
+        while True:
+            try:
+                val = self._input_queue.get()
+            except Exception as e:
+                logger.error(f"Html parser queue has exception as {e}, stopping")
+                break
+            if val == "DONE":
+                break
+
+            self._metrics.item_in()
+            started = time.perf_counter()
+            if self._parser == "wiki_symbols":
+                url, page = val
+                for symbol in WikiWorker._extract_company_symbols(page):
+                    self._put(symbol)
+            else:
+                symbol, page, ingest_date = val
+                try:
+                    price = YahooFinacePriceWorker._extract_price(page)
+                except Exception as e:
+                    logger.error(f"Exception parsing price for {symbol}: {e}")
+                    self._metrics.error()
+                    ack(self._input_queue, val)
+                    continue
+                self._put((symbol, price, ingest_date))
+            ack(self._input_queue, val)
+            self._metrics.observe(time.perf_counter() - started)
+
+    def _put(self, output_vals):
+        for output_queue in self._output_queues:
+            output_queue.put(output_vals)
+        self._metrics.item_out()
@@ -1,6 +1,8 @@
+import csv
+import io
 import os
 
-from sqlite3 import connect, Connection, Cursor
+from queue import Empty
 import threading
 
 import time
@@ -10,6 +12,9 @@ from sqlalchemy.sql import text
 from dotenv import load_dotenv
 
 import logging
+from utils.metrics import NULL_STAGE_METRICS
+from utils.queues import ack
+from utils.records import PriceBatch
 from utils.setup_logging import setup_logging
 setup_logging()
 logger = logging.getLogger(__name__)
@@ -23,63 +28,280 @@ a Postgres database using SQLAlchemy.
 
 Design notes
 - The master scheduler is a threading.Thread subclass that reads items from
-- The PostgresWorker encapsulates connection creation and the insert logic.
+  the input queue and buffers them; the buffer is flushed as one multi-row
+  insert when it reaches ``batch_size`` rows, when ``flush_interval`` seconds
+  have passed since the last flush, or when the ``'DONE'`` sentinel arrives.
+- The PostgresWorker encapsulates the insert logic. All schedulers in the
+  process share one SQLAlchemy engine (and so one connection pool) per
+  connection string, see ``get_engine``.
+- With ``dedup`` on, schedulers share a ``LastPriceIndex`` per connection
+  string: only prices that moved are written to ``prices``, and the newest
+  price per symbol is upserted into ``latest_prices``, which needs::
+
+      CREATE TABLE latest_prices (symbol TEXT PRIMARY KEY, price DOUBLE PRECISION,
+                                  ingest_date TIMESTAMP);
 - The file intentionally keeps behavior minimal; callers control thread start
   (the class currently calls start() in __init__ to preserve previous behavior).
 """
 
+_engines = {}
+_engines_lock = threading.Lock()
+
+
+def _connection_string_from_env():
+    load_dotenv()  # take environment variables from .env.
+    pg_user = os.environ.get("PG_USER", "postgres")
+    pg_pwd = os.environ.get("PG_PWD")
+    pg_host = os.environ.get("PG_HOST", "localhost").strip()
+    pg_port = os.environ.get("PG_PORT")
+    pg_db = os.environ.get("PG_DBNAME")
+    return f"postgresql+psycopg2://{pg_user}:{pg_pwd}@{pg_host}:{pg_port}/{pg_db}"
+
+
+def get_engine(connection_string=None, pool_size=5):
+    """Return the engine shared by every worker using ``connection_string``.
+
+    The engine is created on first use; later callers get the same engine and
+    therefore the same connection pool. ``pool_size`` only applies to the
+    call that creates the engine.
+    """
+    if connection_string is None:
+        connection_string = _connection_string_from_env()
+    with _engines_lock:
+        engine = _engines.get(connection_string)
+        if engine is None:
+            engine_options = {}
+            if connection_string.startswith("postgresql"):
+                engine_options = {"pool_size": pool_size, "pool_pre_ping": True}
+            engine = create_engine(connection_string, **engine_options)
+            _engines[connection_string] = engine
+            logger.info("Created shared engine with pool size %s", pool_size)
+        return engine
+
+
+class LastPriceIndex():
+    """Last written price per symbol, shared by the schedulers of a process.
+
+    Warmed from ``latest_prices`` with one query, then kept up to date in
+    memory as batches are selected for writing. A price counts as changed when it moved
+    by more than ``change_threshold`` (a fraction of the last price, so
+    0.001 is 0.1%; 0 means any change) or when the symbol is new.
+    """
+
+    def __init__(self, change_threshold=0.0):
+        self._change_threshold = change_threshold
+        self._prices = {}
+        self._lock = threading.Lock()
+        self.written = 0
+        self.skipped = 0
+
+    def warm(self, engine):
+        try:
+            with engine.connect() as connection:
+                rows = connection.execute(text("SELECT symbol, price FROM latest_prices")).fetchall()
+        except Exception as e:
+            logger.warning(f"Could not warm the last-price index from latest_prices, starting empty: {e}")
+            return
+        with self._lock:
+            self._prices.update((symbol, price) for symbol, price in rows)
+        logger.info("Warmed last-price index with %s symbols", len(rows))
+
+    def _changed(self, last_price, price):
+        if last_price is None:
+            return True
+        if price is None:
+            return False
+        return abs(price - last_price) > self._change_threshold * abs(last_price)
+
+    def select_changed(self, rows):
+        """Return ``(changed, previous)``: the rows of ``rows`` to write.
+
+        The selected prices are recorded in the index at once, under the
+        lock, so another scheduler sharing the index does not select the same
+        change. ``previous`` holds the prices they replaced: call ``commit``
+        once the rows are stored, or ``release`` if the write failed so the
+        change is retried on the next price rather than lost.
+        """
+        changed = []
+        previous = {}
+        with self._lock:
+            for row in rows:
+                symbol, price = row[0], row[1]
+                last_price = self._prices.get(symbol)
+                if self._changed(last_price, price):
+                    changed.append(row)
+                    previous.setdefault(symbol, last_price)
+                    self._prices[symbol] = price
+            self.skipped += len(rows) - len(changed)
+        return changed, previous
+
+    def commit(self, rows):
+        with self._lock:
+            self.written += len(rows)
+
+    def release(self, rows, previous):
+        """Undo the reservation of ``select_changed`` for rows not written."""
+        reserved = {row[0]: row[1] for row in rows}
+        with self._lock:
+            for symbol, price in reserved.items():
+                # a later batch may have moved the price again: keep that one
+                if self._prices.get(symbol) != price:
+                    continue
+                if previous.get(symbol) is None:
+                    self._prices.pop(symbol, None)
+                else:
+                    self._prices[symbol] = previous[symbol]
+
+    def stats(self):
+        with self._lock:
+            return {"symbols": len(self._prices), "written": self.written, "skipped": self.skipped}
+
+
+_price_indexes = {}
+
+
+def get_last_price_index(engine, change_threshold=0.0):
+    """Return the index shared by every scheduler writing through ``engine``.
+
+    The index is created and warmed from the database on first use;
+    ``change_threshold`` only applies to that call.
+    """
+    with _engines_lock:
+        index = _price_indexes.get(engine)
+        if index is None:
+            index = LastPriceIndex(change_threshold)
+            index.warm(engine)
+            _price_indexes[engine] = index
+        return index
+
+
 class PostgresMasterSchedule(threading.Thread):
-    """Threaded master schedule for managing tasks with Postgres."""
+    """Threaded master schedule for managing tasks with Postgres.
+
+    Optional keyword arguments (set from the ``parameters`` block of the
+    pipeline YAML):
+
+    - ``batch_size``: rows per multi-row insert (default 100).
+    - ``flush_interval``: seconds a partial batch may wait before it is
+      flushed anyway (default 2.0).
+    - ``pool_size``: connections in the shared engine pool (default 5).
+    - ``insert_method``: ``executemany`` (default) or ``copy`` to stream the
+      batch with ``COPY ... FROM STDIN``.
+    - ``connection_string``: SQLAlchemy URL; defaults to the ``PG_*``
+      environment variables.
+    - ``dedup``: write only prices that changed since the last written one
+      and upsert ``latest_prices`` (default False).
+    - ``change_threshold``: with ``dedup``, the fraction a price must move by
+      to be written (default 0, any change).
+    - ``metrics``: stage metrics hook, passed in by the pipeline executor.
+    """
 
     def __init__(self, input_queue, **kwargs):
         if 'output_queues' in kwargs:
             kwargs.pop('output_queues')
         if 'output_queue' in kwargs:
             kwargs.pop('output_queue')
+        self._metrics = kwargs.pop('metrics', None) or NULL_STAGE_METRICS
+        self._batch_size = int(kwargs.pop('batch_size', 100))
+        self._flush_interval = float(kwargs.pop('flush_interval', 2.0))
+        pool_size = int(kwargs.pop('pool_size', 5))
+        insert_method = kwargs.pop('insert_method', 'executemany')
+        connection_string = kwargs.pop('connection_string', None)
+        dedup = bool(kwargs.pop('dedup', False))
+        change_threshold = float(kwargs.pop('change_threshold', 0.0))
         super(PostgresMasterSchedule, self).__init__(**kwargs)
         self._input_queue = input_queue
+        engine = get_engine(connection_string, pool_size)
+        self._price_index = get_last_price_index(engine, change_threshold) if dedup else None
+        self._postgres_worker = PostgresWorker(
+            engine, insert_method=insert_method, upsert_latest=dedup
+        )
         self.start()
 
 
     def run(self):
         # Implementation for managing master schedule with Postgres
+        rows = []
+        received = []   # input items behind rows, acknowledged once written
+        last_flush = time.monotonic()
         while True:
+            timeout = None
+            if rows:
+                timeout = max(0.0, self._flush_interval - (time.monotonic() - last_flush))
             try:
-                val = self._input_queue.get() # [symbol, price, scrapped_time] , (symbol, price, scrapped_time)
+                val = self._input_queue.get(timeout=timeout) # (symbol, price, scrapped_time) or PriceBatch
+            except Empty:
+                val = None
             except Exception as e:
                 print(f"Postgres master schedule has exception as {e}, stopping")
                 break
-            
-            # Process the task with PostgresWorker
+
             logger.debug(f'Postgres Master Received: {val}')
             if val == 'DONE':
-                logger.debug(f'  Breaking...Postgres Master Received: {val}')             
+                logger.debug(f'  Breaking...Postgres Master Received: {val}')
+                self._flush(rows, received)
+                if self._price_index is not None:
+                    logger.info("Last-price index stats: %s", self._price_index.stats())
                 break
 
-            symbol, price, ingest_date = val        
-            postgres_worker = PostgresWorker( symbol, price, ingest_date)
-            postgres_worker.insert_into_db()
-            logger.info(f"Postgres master schedule processed task {val}")
-            # time.sleep(random.random())  # to avoid hitting Postgres too fast
+            if isinstance(val, PriceBatch):
+                self._metrics.item_in(len(val))
+                rows.extend(val)
+                received.append(val)
+            elif val is not None:
+                self._metrics.item_in()
+                rows.append(val)
+                received.append(val)
+            if len(rows) >= self._batch_size or \
+                    (rows and time.monotonic() - last_flush >= self._flush_interval):
+                self._flush(rows, received)
+                rows = []
+                received = []
+                last_flush = time.monotonic()
+
+
+    def _flush(self, rows, received_items=()):
+        if not rows:
+            return
+        started = time.perf_counter()
+        received = len(rows)
+        written = True
+        if self._price_index is not None:
+            rows, previous = self._price_index.select_changed(rows)
+        if rows:
+            written = self._postgres_worker.insert_many(rows)
+            if written:
+                self._metrics.item_out(len(rows))
+                if self._price_index is not None:
+                    self._price_index.commit(rows)
+            else:
+                self._metrics.error(len(rows))
+                if self._price_index is not None:
+                    self._price_index.release(rows, previous)
+        self._metrics.observe(time.perf_counter() - started)
+        if not written:
+            # rows that were not written stay unacknowledged, so a crashed run retries them
+            logger.error(f"Postgres master schedule failed to flush {len(rows)} rows")
+            return
+        ack(self._input_queue, *received_items)
+        logger.info(f"Postgres master schedule flushed {len(rows)} rows, "
+                    f"skipped {received - len(rows)} unchanged")
 
 
 class PostgresWorker():
-    """Worker class for handling Postgres related tasks."""
+    """Worker class for handling Postgres related tasks.
 
-    def __init__(self, symbol, price, ingest_date):
-        self._symbol = symbol
-        self._price = price
-        self._ingest_date = ingest_date
+    ``engine`` is normally the shared engine returned by ``get_engine``. With
+    ``upsert_latest`` every batch also upserts the newest price per symbol
+    into ``latest_prices``, in the same transaction as the insert.
+    """
 
-        load_dotenv()  # take environment variables from .env.
-        self._PG_USER = os.environ.get("PG_USER", "postgres")
-        self._PG__PWD = os.environ.get("PG_PWD")
-        self._PG_HOST = os.environ.get("PG_HOST", "localhost")
-        self._PG_PORT = os.environ.get("PG_PORT")
-        self._PG_DB = os.environ.get("PG_DBNAME")
-        self._connection_string = f"""postgresql+psycopg2://{self._PG_USER}:{self._PG__PWD}@{self._PG_HOST}:{self._PG_PORT}/{self._PG_DB}"""
-        # print(f"PostgresWorker using connection string: {self._connection_string}")
-        self._engine = create_engine(self._connection_string)
+    def __init__(self, engine, insert_method='executemany', upsert_latest=False):
+        if insert_method not in ('executemany', 'copy'):
+            raise ValueError(f"Unknown insert_method {insert_method!r}")
+        self._engine = engine
+        self._insert_method = insert_method
+        self._upsert_latest = upsert_latest
 
 
     def _create_insert_query(self):
@@ -90,14 +312,86 @@ class PostgresWorker():
         return SQL_STMT
 
 
-    def insert_into_db(self):
-        insert_query = self._create_insert_query()
-        try: 
-            with self._engine.connect() as connection:
-                connection.execute(
-                    text(insert_query), {"symbol": self._symbol, "price": self._price, "ingest_date": self._ingest_date}
-                )
-                # connection.commit()          
-            logger.info(f"Inserted data for symbol {self._symbol} into Postgres database.")
+    def _create_copy_query(self):
+        """Return the COPY statement used to stream a batch into prices."""
+        return "COPY prices (symbol, price, ingest_date) FROM STDIN WITH (FORMAT csv)"
+
+
+    def _create_upsert_query(self, paramstyle="named"):
+        """Return the statement that upserts one symbol into latest_prices."""
+        if paramstyle == "format":
+            values = "%s, %s, CAST(%s AS timestamp)"
+        else:
+            values = ":symbol, :price, CAST(:ingest_date AS timestamp)"
+        return f"""INSERT INTO latest_prices (symbol, price, ingest_date)
+                        VALUES ({values})
+                   ON CONFLICT (symbol) DO UPDATE
+                        SET price = excluded.price, ingest_date = excluded.ingest_date
+                        WHERE latest_prices.ingest_date <= excluded.ingest_date
+                """
+
+
+    @staticmethod
+    def _latest_rows(rows):
+        # one row per symbol, its newest: a bulk upsert may not touch the same
+        # key twice, and rows of a batch need not arrive in ingest_date order
+        latest = {}
+        for row in rows:
+            current = latest.get(row[0])
+            if current is None or row[2] >= current[2]:
+                latest[row[0]] = row
+        return list(latest.values())
+
+
+    def insert_into_db(self, symbol, price, ingest_date):
+        self.insert_many([(symbol, price, ingest_date)])
+
+
+    def insert_many(self, rows):
+        """Insert ``(symbol, price, ingest_date)`` rows in one round trip.
+
+        Returns True on success; failures are logged and return False.
+        """
+        try:
+            if self._insert_method == 'copy':
+                self._copy_rows(rows)
+            else:
+                self._executemany_rows(rows)
+            logger.info(f"Inserted {len(rows)} rows into Postgres database.")
+            return True
         except Exception as e:
-            print(f"Failed to insert data for {self._symbol} into Postgres: {e}")
\ No newline at end of file
+            logger.error(f"Failed to insert {len(rows)} rows into Postgres: {e}")
+            return False
+
+
+    def _executemany_rows(self, rows):
+        params = [
+            {"symbol": symbol, "price": price, "ingest_date": ingest_date}
+            for symbol, price, ingest_date in rows
+        ]
+        with self._engine.begin() as connection:
+            connection.execute(text(self._create_insert_query()), params)
+            if self._upsert_latest:
+                connection.execute(text(self._create_upsert_query()), [
+                    {"symbol": symbol, "price": price, "ingest_date": ingest_date}
+                    for symbol, price, ingest_date in self._latest_rows(rows)
+                ])
+
+
+    def _copy_rows(self, rows):
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        for symbol, price, ingest_date in rows:
+            writer.writerow((symbol, price, ingest_date.isoformat()))
+        buffer.seek(0)
+
+        raw_connection = self._engine.raw_connection()
+        try:
+            cursor = raw_connection.cursor()
+            cursor.copy_expert(self._create_copy_query(), buffer)
+            if self._upsert_latest:
+                cursor.executemany(self._create_upsert_query("format"), self._latest_rows(rows))
+            cursor.close()
+            raw_connection.commit()
+        finally:
+            raw_connection.close()
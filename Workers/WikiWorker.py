@@ -1,9 +1,19 @@
+import heapq
+import math
 import threading
+import time
+import zlib
+from datetime import datetime
 
 import requests
 from bs4 import BeautifulSoup
+from lxml import etree
 
 import logging
+from utils.cache import get_price_cache, get_response_cache
+from utils.http_session import get_session_pool
+from utils.metrics import NULL_STAGE_METRICS
+from utils.resilience import RetryPolicy
 from utils.setup_logging import setup_logging
 setup_logging()
 logger = logging.getLogger(__name__)
@@ -16,6 +26,23 @@ class WikiWorkerScheduler(threading.Thread):
             kwargs.pop('input_queue')
         
         self._input_values = kwargs.pop('input_values')  
+        self._metrics = kwargs.pop('metrics', None) or NULL_STAGE_METRICS
+        # timeouts, retries and per-host circuit breaking for the page download
+        self._retry_policy = RetryPolicy.from_kwargs(kwargs)
+        self._session_pool = get_session_pool(
+            pool_connections=int(kwargs.pop('pool_connections', 10)),
+            pool_maxsize=int(kwargs.pop('pool_maxsize', 10)),
+        )
+        # parse the page incrementally while it downloads
+        self._streaming = bool(kwargs.pop('streaming', False))
+        # on-disk copy of the page, revalidated with ETag/Last-Modified
+        cache_dir = kwargs.pop('cache_dir', None)
+        cache_ttl = float(kwargs.pop('cache_ttl', 0))
+        self._cache = get_response_cache(cache_dir, cache_ttl) if cache_dir else None
+        # 'symbols' parses here, 'html' hands (url, page_bytes) to a parser stage
+        self._emit = kwargs.pop('emit', 'symbols')
+        if self._emit not in ('symbols', 'html'):
+            raise ValueError(f"Unknown emit {self._emit!r}, expected 'symbols' or 'html'")
              
         temp_queue = output_queues
         if type(temp_queue) != list:
@@ -27,19 +54,219 @@ class WikiWorkerScheduler(threading.Thread):
     def run(self): 
         for entry in self._input_values:
             print(f'entry: {entry}')
-            wikiWorker = WikiWorker(entry)
+            self._metrics.item_in()
+            started = time.perf_counter()
+            wikiWorker = WikiWorker(entry, session=self._retry_policy.wrap(self._session_pool.get_session()),
+                                    streaming=self._streaming, cache=self._cache)
+            if self._emit == 'html':
+                page = wikiWorker.get_page()
+                if page is not None:
+                    for output_queue in self._output_queues:
+                        output_queue.put((entry, page))
+                    self._metrics.item_out()
+                else:
+                    self._metrics.error()
+                self._metrics.observe(time.perf_counter() - started)
+                continue
             symbol_count = 0
             for symbol in wikiWorker.get_sp_500_companies():
                 for output_queue in self._output_queues:
                     output_queue.put(symbol)
-                # symbol_count += 1
+                self._metrics.item_out()
+                symbol_count += 1
                 # if symbol_count > 5:
                 #     break
-        
+            if symbol_count == 0:
+                self._metrics.error()
+            self._metrics.observe(time.perf_counter() - started)
+        self._session_pool.log_stats()
+        self._session_pool.release()
+
+
+class SymbolPollingScheduler(threading.Thread):
+    """Long-running symbol source for intraday price snapshots.
+
+    Instead of sending every symbol once and finishing, the constituents are
+    re-read from ``input_values`` every ``refresh_interval`` seconds and each
+    symbol is put on the output queues once per ``interval`` seconds. Every
+    symbol has a fixed slot inside the interval (a hash of the symbol), so
+    puts are spread evenly over the interval rather than sent in one burst,
+    and a symbol is only sent again once ``interval`` seconds have passed
+    since it was last sent. Downstream workers, queues and connection pools
+    stay up for the whole run.
+
+    With the price cache the price workers write to (the same
+    ``price_cache_ttl``, ``price_cache_size`` and ``price_cache_path``), a
+    symbol that comes due is only sent when its last price is older than
+    ``interval``; otherwise it waits for its first slot after that price
+    turns ``interval`` seconds old. Without it, the time the symbol was last
+    sent stands in for the time of its last price.
+
+    When no constituents are known yet, e.g. the first refresh failed, the
+    refresh is retried after ``refresh_retry`` seconds, doubling up to
+    ``refresh_interval``, instead of waiting a whole ``refresh_interval``.
+
+    Optional keyword arguments (from the ``parameters`` block of the YAML):
+
+    - ``interval``: seconds between two snapshots of a symbol (default 60).
+    - ``refresh_interval``: seconds between constituent refreshes
+      (default 86400).
+    - ``refresh_retry``: seconds before the first retry of a refresh that
+      left no symbols (default 5).
+    - ``price_cache_ttl``, ``price_cache_size``, ``price_cache_path``: the
+      price cache to read the last prices from; off when left out.
+    - ``duration``: stop after this many seconds; runs until ``stop()`` when
+      left out.
+    - ``streaming``, ``cache_dir``, ``cache_ttl``, ``pool_connections``,
+      ``pool_maxsize`` and the ``utils.resilience.RetryPolicy`` settings
+      (``connect_timeout``, ``read_timeout``, ``max_retries``, ...): as for
+      ``WikiWorkerScheduler``.
+    """
+
+    def __init__(self, output_queues, **kwargs):
+        if 'input_queue' in kwargs:
+            kwargs.pop('input_queue')
+
+        self._input_values = kwargs.pop('input_values')
+        self._metrics = kwargs.pop('metrics', None) or NULL_STAGE_METRICS
+        self._interval = float(kwargs.pop('interval', 60))
+        self._refresh_interval = float(kwargs.pop('refresh_interval', 86400))
+        self._refresh_retry = float(kwargs.pop('refresh_retry', 5))
+        price_cache_ttl = kwargs.pop('price_cache_ttl', None)
+        price_cache_size = int(kwargs.pop('price_cache_size', 10000))
+        price_cache_path = kwargs.pop('price_cache_path', None)
+        self._price_cache = get_price_cache(float(price_cache_ttl), price_cache_size,
+                                            price_cache_path) if price_cache_ttl else None
+        duration = kwargs.pop('duration', None)
+        self._duration = float(duration) if duration is not None else None
+        self._retry_policy = RetryPolicy.from_kwargs(kwargs)
+        self._session_pool = get_session_pool(
+            pool_connections=int(kwargs.pop('pool_connections', 10)),
+            pool_maxsize=int(kwargs.pop('pool_maxsize', 10)),
+        )
+        self._streaming = bool(kwargs.pop('streaming', False))
+        cache_dir = kwargs.pop('cache_dir', None)
+        cache_ttl = float(kwargs.pop('cache_ttl', 0))
+        self._cache = get_response_cache(cache_dir, cache_ttl) if cache_dir else None
+        self._stopped = threading.Event()
+
+        temp_queue = output_queues
+        if type(temp_queue) != list:
+            temp_queue = [temp_queue]
+        self._output_queues = temp_queue
+        super(SymbolPollingScheduler, self).__init__(**kwargs)
+        self.start()
+
+    def stop(self):
+        """Finish after the current put; downstream workers then get 'DONE'."""
+        self._stopped.set()
+
+    def _first_due(self, symbol, now):
+        """Next time at or after ``now`` that falls on the symbol's slot."""
+        slot = (zlib.crc32(symbol.encode("utf-8")) % 1000000) / 1000000 * self._interval
+        return now + (slot - now) % self._interval
+
+    def _next_due(self, due_at, now):
+        # skip slots missed while the queues pushed back, keeping the stagger
+        missed = max(0, math.floor((now - due_at) / self._interval))
+        return due_at + (missed + 1) * self._interval
+
+    def _fetch_symbols(self):
+        symbols = set()
+        for entry in self._input_values:
+            self._metrics.item_in()
+            started = time.perf_counter()
+            wikiWorker = WikiWorker(entry, session=self._retry_policy.wrap(self._session_pool.get_session()),
+                                    streaming=self._streaming, cache=self._cache)
+            try:
+                entry_symbols = set(wikiWorker.get_sp_500_companies())
+            except Exception as e:
+                # a long-running poller keeps its current symbols instead of dying
+                logger.error(f"Couldn't refresh symbols from {entry}: {e}")
+                entry_symbols = set()
+            if not entry_symbols:
+                self._metrics.error()
+            symbols.update(entry_symbols)
+            self._metrics.observe(time.perf_counter() - started)
+        return symbols
+
+    def _priced_until(self, symbol, now):
+        """Time (on the ``now`` clock) at which the symbol's cached price
+        gets ``interval`` seconds old, or ``None`` if it has none."""
+        if self._price_cache is None:
+            return None
+        cached = self._price_cache.get(symbol)
+        if cached is None:
+            return None
+        age = (datetime.utcnow() - datetime.fromisoformat(cached[1])).total_seconds()
+        return now + self._interval - age
+
+    def _refresh(self, symbols, due, now):
+        fetched = self._fetch_symbols()
+        if not fetched:
+            logger.warning("constituent refresh returned no symbols, keeping %s known symbols", len(symbols))
+            return symbols
+        added = fetched - symbols
+        for symbol in added:
+            heapq.heappush(due, (self._first_due(symbol, now), symbol))
+        # removed symbols stay in the heap and are skipped when they come up
+        logger.info("constituents refreshed: %s symbols (%s added, %s removed)",
+                    len(fetched), len(added), len(symbols - fetched))
+        return fetched
+
+    def run(self):
+        started = time.monotonic()
+        stop_at = started + self._duration if self._duration is not None else math.inf
+        next_refresh = started
+        failed_refreshes = 0
+        symbols = set()
+        due = []  # heap of (due_at, symbol), one entry per symbol
+
+        while not self._stopped.is_set():
+            now = time.monotonic()
+            if now >= stop_at:
+                break
+            if now >= next_refresh:
+                symbols = self._refresh(symbols, due, now)
+                if symbols:
+                    failed_refreshes = 0
+                    next_refresh = now + self._refresh_interval
+                else:
+                    # nothing to poll: retry soon rather than idle until the next refresh
+                    next_refresh = now + min(self._refresh_interval,
+                                             self._refresh_retry * 2 ** failed_refreshes)
+                    failed_refreshes += 1
+
+            while due and due[0][0] <= now and not self._stopped.is_set():
+                due_at, symbol = heapq.heappop(due)
+                if symbol not in symbols:
+                    continue
+                priced_until = self._priced_until(symbol, now)
+                if priced_until is not None and priced_until > now:
+                    # priced recently enough, e.g. by an earlier run: wait for that price to age
+                    heapq.heappush(due, (self._first_due(symbol, priced_until), symbol))
+                    continue
+                for output_queue in self._output_queues:
+                    output_queue.put(symbol)
+                self._metrics.item_out()
+                heapq.heappush(due, (self._next_due(due_at, now), symbol))
+
+            wake_at = min(next_refresh, stop_at, due[0][0] if due else math.inf)
+            self._stopped.wait(max(0.0, wake_at - time.monotonic()))
+
+        logger.info("symbol polling finished after %.1f seconds", time.monotonic() - started)
+        self._session_pool.log_stats()
+        self._session_pool.release()
+
 
 class WikiWorker():
-    def __init__(self, url):
+    STREAM_CHUNK_SIZE = 64 * 1024
+
+    def __init__(self, url, session=None, streaming=False, cache=None):
         self._url = url   
+        self._streaming = streaming
+        self._cache = cache
+        self._session = session if session is not None else requests
         self._headers = {
             "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) "
                           "AppleWebKit/537.36 (KHTML, like Gecko) "
@@ -61,11 +288,92 @@ class WikiWorker():
                     yield symbol
 
 
+    @staticmethod
+    def _stream_company_symbols(chunks, encoding=None):
+        """Yield symbols from ``table#constituents`` while the page is fed in.
+
+        ``chunks`` is an iterable of raw byte chunks. Rows are handled on
+        their closing tag and then dropped from the tree, and everything
+        outside the table is cleared as soon as it is complete, so memory
+        stays flat whatever the size of the page. Stops reading once the
+        table is closed.
+        """
+        parser = etree.HTMLPullParser(events=("start", "end"), encoding=encoding)
+        in_table = False
+        for chunk in chunks:
+            parser.feed(chunk)
+            for event, element in parser.read_events():
+                is_table = element.tag == "table" and element.get("id") == "constituents"
+                if event == "start":
+                    in_table = in_table or is_table
+                    continue
+                if is_table:
+                    return
+                if not in_table:
+                    element.clear()
+                    continue
+                if element.tag == "tr":
+                    cols = [col for col in element if col.tag == "td"]
+                    if cols:
+                        yield "".join(cols[0].itertext()).strip()
+                    element.clear()
+                    # drop the rows already handled
+                    while element.getprevious() is not None:
+                        del element.getparent()[0]
+
+
+    def get_page(self):
+        """Return the raw bytes of the page, or None if it couldn't be fetched."""
+        logger.info("getting page %s", self._url)
+        if self._cache is not None:
+            page = self._cache.fetch(self._session, self._url, headers=self._headers)
+            if page is None:
+                logger.error(f"Couldn't get page {self._url}")
+            return page
+        response = self._session.get(self._url, headers=self._headers)
+        if response.status_code != 200:
+            logger.error(f"Couldn't get page {self._url}")
+            return None
+        return response.content
+
+
     def get_sp_500_companies(self):               
+        if self._streaming:
+            yield from self._stream_sp_500_companies()
+            return
+
+        if self._cache is not None:
+            page = self.get_page()
+            if page is not None:
+                yield from self._extract_company_symbols(page)
+            return
+
         logger.info("getting symbols from %s", self._url)
-        response = requests.get(self._url, headers=self._headers)        
+        response = self._session.get(self._url, headers=self._headers)        
         if response.status_code != 200:           
             logger.error(f"Couldn't get symbols from {self._url}")
             return []
 
         yield from self._extract_company_symbols(response.text)
+
+
+    def _stream_sp_500_companies(self):
+        logger.info("streaming symbols from %s", self._url)
+        if self._cache is not None:
+            # parsed while it downloads and is written to the cache
+            chunks = self._cache.stream(self._session, self._url, headers=self._headers,
+                                        chunk_size=self.STREAM_CHUNK_SIZE)
+            try:
+                yield from self._stream_company_symbols(chunks)
+            finally:
+                chunks.close()
+            return
+        response = self._session.get(self._url, headers=self._headers, stream=True)
+        try:
+            if response.status_code != 200:
+                logger.error(f"Couldn't get symbols from {self._url}")
+                return
+            chunks = response.iter_content(chunk_size=self.STREAM_CHUNK_SIZE)
+            yield from self._stream_company_symbols(chunks, encoding=response.encoding)
+        finally:
+            response.close()
@@ -1,37 +1,117 @@
 """Yahoo Finance price workers and scheduler.
 
-This module contains two convenience classes used by the demo scheduler:
+This module contains the convenience classes used by the demo scheduler:
 
 - ``YahooFinancePriceScheduler``: a ``threading.Thread`` subclass that reads
     symbols from an input queue and uses ``YahooFinacePriceWorker`` to fetch
     prices for each symbol.
+- ``AsyncYahooFinancePriceScheduler``: a ``threading.Thread`` subclass that
+    runs an asyncio event loop and keeps many quote requests in flight at
+    once, bounded by a semaphore and a token-bucket rate limit.
+- ``YahooFinanceBatchPriceScheduler``: a ``threading.Thread`` subclass that
+    groups symbols from its input queue and resolves each group with one
+    request to the multi-symbol JSON quote endpoint
+    (``YahooFinanceBatchQuoteWorker``).
+- ``YahooFinanceBatchQuoteWorker``: fetches the prices of many symbols with
+    one JSON quote request.
 - ``YahooFinacePriceWorker``: a small helper that requests the Yahoo Finance
     quote page for a single ticker symbol and attempts to parse the current
     price using an XPath expression.
 
 Notes
 -----
-- This file is intentionally kept small and focused on illustrating a simple
-    threaded scheduler + worker pattern used in the tutorial. It intentionally
-    mirrors the original behavior and does not change runtime logic.
+- All schedulers take timeouts, retries and per-host circuit breakers
+    (``utils.resilience``), an optional price cache (``utils.cache``), a
+    dead letter queue for symbols that could not be priced and stage
+    metrics, and acknowledge items of durable input queues
+    (``utils.queues.ack``). The threaded ones reuse keep-alive sessions from
+    ``utils.http_session``; the async one an ``aiohttp`` session.
+- Prices go out as ``(symbol, price, ingest_date)`` tuples or, with
+    ``output_format: batch`` (async and batch schedulers), as
+    ``utils.records.PriceBatch`` objects.
 """
 
+import asyncio
 import datetime
 import random
 import threading
 import time
+import urllib.parse
 from datetime import datetime
+from queue import Empty
 
+import aiohttp
 import requests
 from lxml import html
 
 import logging
+from utils.cache import get_price_cache
+from utils.http_session import ACCEPT_ENCODING, get_session_pool
+from utils.metrics import NULL_STAGE_METRICS
+from utils.queues import ack
+from utils.rate_limit import get_token_bucket
+from utils.records import PriceBatch
+from utils.resilience import RetryPolicy
 from utils.setup_logging import setup_logging
 setup_logging()
 logger = logging.getLogger(__name__)
 logger.info("YahooFinanceWorkers logging initialized")
 
 
+def _price_cache_from_kwargs(kwargs):
+    """Pop the price cache settings shared by the price schedulers.
+
+    ``price_cache_ttl`` (seconds) enables the cache, ``price_cache_size``
+    bounds it and ``price_cache_path`` keeps it in a SQLite file so it
+    survives between runs. A cache hit means the price was already put
+    downstream, so by default it is not put again; ``price_cache_emit: true``
+    puts the cached row (with its original ``ingest_date``) anyway.
+
+    Returns ``(cache, emit_cached)``; the cache is ``None`` when caching is
+    off.
+    """
+    ttl = kwargs.pop('price_cache_ttl', None)
+    maxsize = int(kwargs.pop('price_cache_size', 10000))
+    path = kwargs.pop('price_cache_path', None)
+    emit_cached = bool(kwargs.pop('price_cache_emit', False))
+    if not ttl:
+        return None, emit_cached
+    return get_price_cache(float(ttl), maxsize, path), emit_cached
+
+
+def _output_format_from_kwargs(kwargs):
+    """Pop ``output_format``: ``tuple`` (one row per put, the default) or
+    ``batch`` (``utils.records.PriceBatch`` holding many rows)."""
+    output_format = kwargs.pop('output_format', 'tuple')
+    if output_format not in ('tuple', 'batch'):
+        raise ValueError(f"Unknown output_format {output_format!r}, expected 'tuple' or 'batch'")
+    return output_format
+
+
+def _dead_letter(dead_letter_queue, symbols):
+    """Put symbols that could not be priced on the dead letter queue, if any."""
+    if dead_letter_queue is not None:
+        for symbol in symbols:
+            dead_letter_queue.put(symbol)
+
+
+def _get_cached_price(price_cache, symbol):
+    """Return the cached ``(symbol, price, ingest_date)`` or ``None``."""
+    if price_cache is None:
+        return None
+    cached = price_cache.get(symbol)
+    if cached is None:
+        return None
+    price, ingest_date = cached
+    return (symbol, price, datetime.fromisoformat(ingest_date))
+
+
+def _cache_price(price_cache, output_vals):
+    if price_cache is not None:
+        symbol, price, ingest_date = output_vals
+        price_cache.put(symbol, [price, ingest_date.isoformat()])
+
+
 class YahooFinancePriceScheduler(threading.Thread):
     """Threaded scheduler that consumes symbols from a queue and fetches prices.
 
@@ -54,7 +134,48 @@ class YahooFinancePriceScheduler(threading.Thread):
         input_queue : queue-like
             A queue providing symbols to process. The queue must implement
             ``get(timeout=...)``.
+        pool_connections, pool_maxsize : int, optional
+            Sizing of the shared keep-alive session pool (hosts kept and
+            open connections per host).
+        emit : {'price', 'html'}, optional
+            ``price`` (default) parses the page here and outputs
+            ``(symbol, price, ingest_date)``. ``html`` skips parsing and
+            outputs ``(symbol, page_bytes, ingest_date)`` for a separate
+            ``HtmlParserScheduler`` stage.
+        price_cache_ttl, price_cache_size, price_cache_path, price_cache_emit : optional
+            Skip symbols priced less than ``price_cache_ttl`` seconds ago,
+            per an LRU cache (in memory, or SQLite at ``price_cache_path``),
+            instead of downloading the quote page again. Their cached rows
+            are only put again with ``price_cache_emit: true``.
+        base_url : str, optional
+            Quote page prefix, defaults to Yahoo Finance.
+        request_delay : float, optional
+            After each downloaded page the thread sleeps a random time below
+            this many seconds, to avoid hitting Yahoo too fast (default 1;
+            0 turns the pause off, e.g. against a local server).
+        connect_timeout, read_timeout, max_retries, backoff_base, backoff_max, retry_budget : optional
+            Timeouts and retries, see ``utils.resilience.RetryPolicy``.
+        breaker_failure_rate, breaker_window, breaker_min_requests, breaker_reset : optional
+            Per-host circuit breaker settings.
+        dead_letter_queue : queue-like, optional
+            Symbols that could not be priced are put here; set from the
+            worker's ``dead_letter_queue`` in the YAML.
+        metrics : StageMetrics, optional
+            Stage metrics hook, passed in by the pipeline executor.
         """
+        self._metrics = kwargs.pop('metrics', None) or NULL_STAGE_METRICS
+        self._request_delay = float(kwargs.pop('request_delay', 1.0))
+        self._price_cache, self._emit_cached = _price_cache_from_kwargs(kwargs)
+        self._retry_policy = RetryPolicy.from_kwargs(kwargs)
+        self._dead_letter_queue = kwargs.pop('dead_letter_queue', None)
+        self._base_url = kwargs.pop('base_url', None)
+        self._emit = kwargs.pop('emit', 'price')
+        if self._emit not in ('price', 'html'):
+            raise ValueError(f"Unknown emit {self._emit!r}, expected 'price' or 'html'")
+        self._session_pool = get_session_pool(
+            pool_connections=int(kwargs.pop('pool_connections', 10)),
+            pool_maxsize=int(kwargs.pop('pool_maxsize', 10)),
+        )
         super(YahooFinancePriceScheduler, self).__init__()
         self._input_queue = input_queue
         temp_queue = output_queues
@@ -79,19 +200,436 @@ class YahooFinancePriceScheduler(threading.Thread):
                 print(f"Yahoo scheduler queue schedule has exception as {e}, stopping")
                 break            
             if val == "DONE":              
+               self._session_pool.log_stats()
                break
             
-            yahooFinacePriceWorker = YahooFinacePriceWorker(symbol=val)
-            price = yahooFinacePriceWorker.get_price_for_symbol()
-            # print(f"Yahoo scheduler queue got price {price} for symbol {val}")
+            self._metrics.item_in()
+            started = time.perf_counter()
+            if self._emit == 'price':
+                cached_vals = _get_cached_price(self._price_cache, val)
+                if cached_vals is not None:
+                    if self._emit_cached:
+                        self._put(cached_vals)
+                    ack(self._input_queue, val)
+                    self._metrics.observe(time.perf_counter() - started)
+                    continue
+
+            session = self._retry_policy.wrap(self._session_pool.get_session())
+            yahooFinacePriceWorker = YahooFinacePriceWorker(symbol=val, session=session,
+                                                            base_url=self._base_url)
+            if self._emit == 'html':
+                result = yahooFinacePriceWorker.get_page_for_symbol()  # parsed by a downstream stage
+            else:
+                result = yahooFinacePriceWorker.get_price_for_symbol()
+            # print(f"Yahoo scheduler queue got price {result} for symbol {val}")
 
-            if self._output_queues is not None and price is not None:
+            if result is None:
+                self._metrics.error()
+                _dead_letter(self._dead_letter_queue, [val])
+            elif self._output_queues is not None:
                 ingest_date = datetime.utcnow()               
-                output_vals = ( val, price, ingest_date) 
-                for output_queue in self._output_queues:            
-                    output_queue.put(output_vals)
+                output_vals = ( val, result, ingest_date) 
+                if self._emit == 'price':
+                    _cache_price(self._price_cache, output_vals)
+                self._put(output_vals)
                 # print(f"Yahoo scheduler queue put price {price} for symbol {val} into output queues")
-            time.sleep(random.random())  # to avoid hitting Yahoo too fast
+            ack(self._input_queue, val)
+            self._metrics.observe(time.perf_counter() - started)
+            if self._request_delay > 0:
+                time.sleep(random.uniform(0, self._request_delay))  # to avoid hitting Yahoo too fast
+        self._session_pool.release()
+
+    def _put(self, output_vals):
+        for output_queue in self._output_queues:
+            output_queue.put(output_vals)
+        self._metrics.item_out()
+
+
+class AsyncYahooFinancePriceScheduler(threading.Thread):
+    """Threaded scheduler that fetches prices concurrently on an event loop.
+
+    A single instance replaces many ``YahooFinancePriceScheduler`` threads:
+    symbols are read from ``input_queue`` and each one becomes a coroutine
+    that downloads and parses its quote page. Output tuples have the same
+    ``(symbol, price, ingest_date)`` format as ``YahooFinancePriceScheduler``.
+
+    Optional keyword arguments (from the ``parameters`` block of the YAML):
+
+    - ``concurrency``: maximum requests in flight (default 100).
+    - ``rate_limit``: requests started per second (default 20), for the
+      quote host as a whole: every instance sending to it shares one token
+      bucket, and the first settings for a host win.
+    - ``burst``: token-bucket capacity (default ``rate_limit``).
+    - ``request_timeout``: total seconds allowed per request (default 30).
+    - ``connect_timeout``, ``read_timeout``, ``max_retries``, ``backoff_*``,
+      ``retry_budget``, ``breaker_*``: timeouts, retries and circuit
+      breaking, see ``utils.resilience.RetryPolicy``.
+    - ``dead_letter_queue``: symbols that could not be priced are put here.
+    - ``base_url``: quote page prefix (default Yahoo Finance).
+    - ``price_cache_ttl``, ``price_cache_size``, ``price_cache_path``,
+      ``price_cache_emit``: price cache, as for ``YahooFinancePriceScheduler``.
+    - ``output_format``: ``tuple`` (default) or ``batch`` to put
+      ``PriceBatch`` objects of up to ``output_batch_size`` rows (default
+      100); a partial batch goes out once it is ``output_max_wait`` seconds
+      old (default 1.0), checked when the next price arrives, and at the end.
+    - ``metrics``: stage metrics hook, passed in by the pipeline executor.
+    """
+
+    def __init__(self, input_queue, output_queues, **kwargs):
+        self._metrics = kwargs.pop('metrics', None) or NULL_STAGE_METRICS
+        self._concurrency = int(kwargs.pop('concurrency', 100))
+        rate_limit = float(kwargs.pop('rate_limit', 20))
+        burst = kwargs.pop('burst', None)
+        self._request_timeout = float(kwargs.pop('request_timeout', 30))
+        self._retry_policy = RetryPolicy.from_kwargs(kwargs)
+        self._dead_letter_queue = kwargs.pop('dead_letter_queue', None)
+        self._base_url = kwargs.pop('base_url', YahooFinacePriceWorker.BASE_URL)
+        self._price_cache, self._emit_cached = _price_cache_from_kwargs(kwargs)
+        self._output_format = _output_format_from_kwargs(kwargs)
+        self._output_batch_size = int(kwargs.pop('output_batch_size', 100))
+        self._output_max_wait = float(kwargs.pop('output_max_wait', 1.0))
+        self._pending_batch = PriceBatch()
+        self._pending_symbols = []   # input symbols of the pending batch, acked once it is put
+        self._pending_since = None
+        super(AsyncYahooFinancePriceScheduler, self).__init__()
+        self._input_queue = input_queue
+        temp_queue = output_queues
+        if type(temp_queue) != list:
+            temp_queue = [temp_queue]
+        self._output_queues = temp_queue
+        self._rate_limiter = get_token_bucket(urllib.parse.urlsplit(self._base_url).netloc,
+                                              rate_limit, burst)
+        self.start()
+
+    def run(self):
+        asyncio.run(self._schedule())
+
+    async def _schedule(self):
+        """Read symbols until ``'DONE'`` and wait for outstanding fetches."""
+        loop = asyncio.get_running_loop()
+        semaphore = asyncio.Semaphore(self._concurrency)
+        pending = set()
+        timeout = aiohttp.ClientTimeout(total=self._request_timeout,
+                                        sock_connect=self._retry_policy.connect_timeout,
+                                        sock_read=self._retry_policy.read_timeout)
+        headers = dict(YahooFinacePriceWorker.HEADERS, **{"Accept-Encoding": ACCEPT_ENCODING})
+        # one connector per loop: keeps connections alive across symbols
+        connector = aiohttp.TCPConnector(limit=self._concurrency)
+        async with aiohttp.ClientSession(headers=headers, timeout=timeout, connector=connector) as session:
+            while True:
+                try:
+                    # the pipeline queues are blocking, keep them off the event loop
+                    val = await loop.run_in_executor(None, self._input_queue.get)
+                except Exception as e:
+                    logger.error(f"Async Yahoo scheduler queue has exception as {e}, stopping")
+                    break
+                if val == "DONE":
+                    break
+
+                self._metrics.item_in()
+                cached_vals = _get_cached_price(self._price_cache, val)
+                if cached_vals is not None:
+                    if self._emit_cached:
+                        await self._emit(cached_vals, val)
+                    else:
+                        ack(self._input_queue, val)
+                    continue
+
+                await semaphore.acquire()
+                task = asyncio.ensure_future(self._fetch_price(session, semaphore, val))
+                pending.add(task)
+                task.add_done_callback(pending.discard)
+
+            if pending:
+                await asyncio.gather(*pending)
+            if self._pending_batch:
+                await self._emit(None, None, flush=True)
+
+    async def _fetch_price(self, session, semaphore, symbol):
+        url = f"{self._base_url}{symbol}"
+        started = time.perf_counter()
+        try:
+            try:
+                page_html = await self._get_page(session, url)
+                price = YahooFinacePriceWorker._extract_price(page_html)
+            except Exception as e:
+                logger.error(f"Exception getting price for {symbol}: {e} via url: {url}")
+                self._metrics.error()
+                await asyncio.get_running_loop().run_in_executor(
+                    None, _dead_letter, self._dead_letter_queue, [symbol])
+                ack(self._input_queue, symbol)
+                return
+
+            output_vals = (symbol, price, datetime.utcnow())
+            _cache_price(self._price_cache, output_vals)
+            # keep the concurrency slot until the put is done, so
+            # backpressure from a bounded output queue slows fetching
+            await self._emit(output_vals, symbol)
+            self._metrics.observe(time.perf_counter() - started)
+        finally:
+            semaphore.release()
+
+    async def _get_page(self, session, url):
+        """Download ``url`` under the retry policy; raises if every attempt
+        failed or the final answer is not a 200."""
+        attempt = 0
+        while True:
+            wait = self._retry_policy.wait_time(url)
+            if wait > 0:
+                await asyncio.sleep(wait)
+                continue
+            await self._rate_limiter.wait()
+            status, error, retry_after = None, None, None
+            try:
+                async with session.get(url) as response:
+                    status = response.status
+                    retry_after = response.headers.get("Retry-After")
+                    if status == 200:
+                        page_html = await response.text()
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                error = e
+            except BaseException:
+                # e.g. cancelled: a half-open breaker still needs its probe's outcome
+                self._retry_policy.breaker(url).record(False)
+                raise
+            delay = self._retry_policy.after_attempt(url, attempt, status, error, retry_after)
+            if delay is None:
+                if error is not None:
+                    raise error
+                if status != 200:
+                    raise ValueError(f"status {status}")
+                return page_html
+            await asyncio.sleep(delay)
+            attempt += 1
+
+    async def _emit(self, output_vals, symbol, flush=False):
+        """Put a row, or add it to the pending ``PriceBatch`` and put the
+        batch once it is full or old enough; ``symbol``, the input the row
+        came from, is acknowledged after the put. Runs on the event loop only."""
+        symbols = [symbol] if symbol is not None else []
+        if self._output_format == 'batch':
+            if output_vals is not None:
+                if not self._pending_batch:
+                    self._pending_since = time.monotonic()
+                self._pending_batch.append(*output_vals)
+                self._pending_symbols.extend(symbols)
+            if not flush and len(self._pending_batch) < self._output_batch_size and \
+                    time.monotonic() - self._pending_since < self._output_max_wait:
+                return
+            output_vals, self._pending_batch = self._pending_batch, PriceBatch()
+            symbols, self._pending_symbols = self._pending_symbols, []
+        # a bounded output queue may block: do it off the loop
+        await asyncio.get_running_loop().run_in_executor(None, self._put, output_vals, symbols)
+
+    def _put(self, output_vals, symbols=()):
+        if self._output_queues is not None:
+            for output_queue in self._output_queues:
+                output_queue.put(output_vals)
+        self._metrics.item_out(len(output_vals) if isinstance(output_vals, PriceBatch) else 1)
+        ack(self._input_queue, *symbols)
+
+
+class YahooFinanceBatchPriceScheduler(threading.Thread):
+    """Threaded scheduler that fetches prices for groups of symbols.
+
+    Symbols are taken off ``input_queue`` until ``batch_size`` are collected
+    or ``max_wait`` seconds have passed since the first one, then the whole
+    group is priced with a single ``YahooFinanceBatchQuoteWorker`` request.
+    By default every price is put on the output queues as its own
+    ``(symbol, price, ingest_date)`` tuple, so downstream stages are the
+    same as for ``YahooFinancePriceScheduler``; with ``output_format:
+    batch`` each group goes out as one ``PriceBatch``.
+    """
+
+    def __init__(self, input_queue, output_queues, **kwargs):
+        """Initialize the scheduler and start the thread.
+
+        Parameters
+        ----------
+        input_queue : queue-like
+            A queue providing symbols to process.
+        batch_size : int, optional
+            Maximum symbols per request (default 50).
+        max_wait : float, optional
+            Seconds to wait for a batch to fill up (default 1.0).
+        quote_url : str, optional
+            Multi-symbol quote endpoint, e.g. a local stub server.
+        pool_connections, pool_maxsize : int, optional
+            Sizing of the shared keep-alive session pool.
+        price_cache_ttl, price_cache_size, price_cache_path, price_cache_emit : optional
+            Price cache, as for ``YahooFinancePriceScheduler``; only the
+            symbols missing from it are requested.
+        output_format : {'tuple', 'batch'}, optional
+            ``batch`` puts one ``utils.records.PriceBatch`` per group instead
+            of one tuple per symbol (default ``tuple``).
+        connect_timeout, read_timeout, max_retries, backoff_base, backoff_max, retry_budget : optional
+            Timeouts and retries, see ``utils.resilience.RetryPolicy``.
+        breaker_failure_rate, breaker_window, breaker_min_requests, breaker_reset : optional
+            Per-host circuit breaker settings.
+        dead_letter_queue : queue-like, optional
+            Symbols that could not be priced are put here.
+        metrics : StageMetrics, optional
+            Stage metrics hook, passed in by the pipeline executor.
+        """
+        self._metrics = kwargs.pop('metrics', None) or NULL_STAGE_METRICS
+        self._price_cache, self._emit_cached = _price_cache_from_kwargs(kwargs)
+        self._batch_size = int(kwargs.pop('batch_size', 50))
+        self._max_wait = float(kwargs.pop('max_wait', 1.0))
+        self._quote_url = kwargs.pop('quote_url', YahooFinanceBatchQuoteWorker.QUOTE_URL)
+        self._output_format = _output_format_from_kwargs(kwargs)
+        self._retry_policy = RetryPolicy.from_kwargs(kwargs)
+        self._dead_letter_queue = kwargs.pop('dead_letter_queue', None)
+        self._session_pool = get_session_pool(
+            pool_connections=int(kwargs.pop('pool_connections', 10)),
+            pool_maxsize=int(kwargs.pop('pool_maxsize', 10)),
+        )
+        super(YahooFinanceBatchPriceScheduler, self).__init__()
+        self._input_queue = input_queue
+        temp_queue = output_queues
+        if type(temp_queue) != list:
+            temp_queue = [temp_queue]
+        self._output_queues = temp_queue
+        self.start()
+
+    def run(self):
+        done = False
+        while not done:
+            symbols, done = self._next_batch()
+            self._metrics.item_in(len(symbols))
+            started = time.perf_counter()
+            # with output_format: batch, all prices of the group go out together
+            batch = PriceBatch() if self._output_format == 'batch' else None
+            to_fetch = []
+            for symbol in symbols:
+                cached_vals = _get_cached_price(self._price_cache, symbol)
+                if cached_vals is None:
+                    to_fetch.append(symbol)
+                elif not self._emit_cached:
+                    continue
+                elif batch is not None:
+                    batch.append(*cached_vals)
+                else:
+                    self._put(cached_vals)
+
+            if to_fetch:
+                session = self._retry_policy.wrap(self._session_pool.get_session())
+                worker = YahooFinanceBatchQuoteWorker(to_fetch, session=session, quote_url=self._quote_url)
+                prices = worker.get_prices()
+                logger.debug(f"Yahoo batch scheduler got {len(prices)} prices for {len(to_fetch)} symbols")
+                self._metrics.error(len(to_fetch) - len(prices))
+                _dead_letter(self._dead_letter_queue, [symbol for symbol in to_fetch if symbol not in prices])
+                ingest_date = datetime.utcnow()
+                for symbol, price in prices.items():
+                    output_vals = (symbol, price, ingest_date)
+                    _cache_price(self._price_cache, output_vals)
+                    if batch is not None:
+                        batch.append(*output_vals)
+                    else:
+                        self._put(output_vals)
+            if batch:
+                self._put(batch)
+            ack(self._input_queue, *symbols)
+            if not to_fetch:
+                continue
+            # every symbol of the batch waited for the same request
+            elapsed = time.perf_counter() - started
+            for _ in symbols:
+                self._metrics.observe(elapsed)
+        self._session_pool.log_stats()
+        self._session_pool.release()
+
+    def _put(self, output_vals):
+        if self._output_queues is not None:
+            for output_queue in self._output_queues:
+                output_queue.put(output_vals)
+        self._metrics.item_out(len(output_vals) if isinstance(output_vals, PriceBatch) else 1)
+
+    def _next_batch(self):
+        """Collect up to ``batch_size`` symbols.
+
+        Returns
+        -------
+        tuple of (list of str, bool)
+            The symbols collected and whether ``'DONE'`` was received.
+        """
+        symbols = []
+        deadline = None
+        while len(symbols) < self._batch_size:
+            timeout = None if deadline is None else max(0.0, deadline - time.monotonic())
+            try:
+                val = self._input_queue.get(timeout=timeout)
+            except Empty:
+                break
+            except Exception as e:
+                logger.error(f"Yahoo batch scheduler queue has exception as {e}, stopping")
+                return symbols, True
+            if val == "DONE":
+                return symbols, True
+            symbols.append(val)
+            if deadline is None:
+                deadline = time.monotonic() + self._max_wait
+        return symbols, False
+
+
+class YahooFinanceBatchQuoteWorker():
+    """Fetch current prices for several ticker symbols in one request.
+
+    Uses the JSON quote endpoint, which takes a comma separated ``symbols``
+    parameter and answers with ``quoteResponse.result``, one entry per
+    known symbol holding ``regularMarketPrice``.
+    """
+
+    QUOTE_URL = "https://query1.finance.yahoo.com/v7/finance/quote"
+
+    def __init__(self, symbols, session=None, quote_url=None):
+        """Create a worker for a group of ticker symbols.
+
+        Parameters
+        ----------
+        symbols : list of str
+            Ticker symbols to price.
+        session : requests.Session, optional
+            Keep-alive session to fetch with. Falls back to ``requests``.
+        quote_url : str, optional
+            Endpoint to query instead of ``QUOTE_URL``.
+        """
+        self._symbols = list(symbols)
+        self._session = session if session is not None else requests
+        self._quote_url = quote_url or self.QUOTE_URL
+
+    def get_prices(self):
+        """Request quotes for all symbols.
+
+        Returns
+        -------
+        dict
+            Maps symbol to float price. Symbols missing from the answer, or
+            every symbol when the request fails, are left out and logged.
+        """
+        try:
+            r = self._session.get(self._quote_url, params={"symbols": ",".join(self._symbols)},
+                                  headers=YahooFinacePriceWorker.HEADERS)
+            if r.status_code != 200:
+                logger.error(f"Quote request for {len(self._symbols)} symbols returned {r.status_code}")
+                return {}
+            prices = self._extract_prices(r.json())
+        except Exception as e:
+            logger.error(f"Exception getting prices for {self._symbols}: {e} via url: {self._quote_url}")
+            return {}
+
+        missing = set(self._symbols) - set(prices)
+        if missing:
+            logger.error(f"No price returned for {sorted(missing)}")
+        return prices
+
+    @staticmethod
+    def _extract_prices(payload):
+        prices = {}
+        for quote in payload["quoteResponse"]["result"]:
+            price = quote.get("regularMarketPrice")
+            if price is not None:
+                prices[quote["symbol"]] = float(price)
+        return prices
 
 
 class YahooFinacePriceWorker():
@@ -103,17 +641,30 @@ class YahooFinacePriceWorker():
     ``None`` on failure.
     """
 
-    def __init__(self, symbol):
+    BASE_URL = "https://finance.yahoo.com/quote/"
+    HEADERS = {
+        "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) "
+                      "AppleWebKit/537.36 (KHTML, like Gecko) "
+                      "Chrome/124.0.0.0 Safari/537.36"
+    }
+    PRICE_XPATH = '//*[@id="main-content-wrapper"]/section[6]/div/div/div/section[1]/div/div[2]/div'
+
+    def __init__(self, symbol, session=None, base_url=None):
         """Create a worker for the provided ticker symbol.
 
         Parameters
         ----------
         symbol : str
             Ticker symbol (for example, 'AAPL' or 'MSFT').
+        session : requests.Session, optional
+            Keep-alive session to fetch with, normally taken from the shared
+            ``SessionPool``. Falls back to the ``requests`` module.
+        base_url : str, optional
+            Quote page prefix to use instead of ``BASE_URL``.
         """
         self._symbol = symbol
-        base_url = "https://finance.yahoo.com/quote/"
-        self._url = f"{base_url}{self._symbol}" 
+        self._session = session if session is not None else requests
+        self._url = f"{base_url or self.BASE_URL}{self._symbol}" 
 
 
     def get_price_for_symbol(self):
@@ -131,17 +682,38 @@ class YahooFinacePriceWorker():
         - Network errors, non-200 responses, or missing elements result in a
           ``None`` return value and the exception (if any) is printed.
         """
+        page = self.get_page_for_symbol()
+        if page is None:
+            return
         try:
-            r = requests.get(self._url)
-            
-            if r.status_code != 200:
-                return
-            page_contents = html.fromstring(r.text)
-            path_id = '//*[@id="main-content-wrapper"]/section[6]/div/div/div/section[1]/div/div[2]/div'
-            raw_price = page_contents.xpath(path_id)[0].text
-            price = float(raw_price.replace(",", ""))
+            price = self._extract_price(page)
             # print(f"price for {self._symbol} is {price} USD as of {datetime.datetime.utcnow()} UTC ")
             return price
         except Exception as e:           
             logger.error(f"Exception getting price for {self._symbol}: {e} via url: {self._url}")
             return
+
+    def get_page_for_symbol(self):
+        """Request the Yahoo quote page without parsing it.
+
+        Returns
+        -------
+        bytes or None
+            The raw page body, or ``None`` on a network error or a non-200
+            response.
+        """
+        try:
+            r = self._session.get(self._url)
+            if r.status_code != 200:
+                return
+            return r.content
+        except Exception as e:
+            logger.error(f"Exception getting page for {self._symbol}: {e} via url: {self._url}")
+            return
+
+    @staticmethod
+    def _extract_price(page_html):
+        """Parse the price out of a quote page; raises if it is missing."""
+        page_contents = html.fromstring(page_html)
+        raw_price = page_contents.xpath(YahooFinacePriceWorker.PRICE_XPATH)[0].text
+        return float(raw_price.replace(",", ""))
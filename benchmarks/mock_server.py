@@ -0,0 +1,176 @@
+"""Local stand-in for Wikipedia and Yahoo Finance used by the benchmarks.
+
+``MockMarketServer`` serves, on 127.0.0.1:
+
+- ``/wiki/constituents``: the S&P 500 constituents page.
+- ``/quote/<SYMBOL>``: a quote page whose price sits where
+  ``YahooFinacePriceWorker.PRICE_XPATH`` looks for it.
+- ``/v7/finance/quote?symbols=A,B``: the JSON multi-symbol quote answer used
+  by ``YahooFinanceBatchQuoteWorker``.
+
+Pages are generated unless recorded copies are given (``constituents.html``
+and ``quote.html`` in ``pages_dir``). With generated pages, symbols that are
+not constituents are unknown, like delisted tickers: their quote page is a
+404 and the JSON answer leaves them out. Every response is delayed by
+``latency`` seconds plus up to ``jitter`` seconds, and the time of the first
+request for each symbol is recorded so per-item latency can be measured.
+
+To exercise retries and circuit breaking, ``error_rate`` of the quote
+requests are answered with ``error_status`` (429 answers carry a
+``Retry-After: 1``) and ``stall_rate`` of them hang for ``stall`` seconds
+before answering.
+"""
+
+import json
+import os
+import random
+import threading
+import time
+import urllib.parse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+QUOTE_PAGE = (
+    '<html><body><div id="main-content-wrapper">'
+    + '<section></section>' * 5
+    + '<section><div><div><div><section><div><div></div><div><div>{price}</div></div></div>'
+      '</section></div></div></div></section></div></body></html>'
+)
+
+
+def make_symbols(count):
+    return [f"SYM{i:04d}" for i in range(count)]
+
+
+def make_constituents_page(symbols):
+    rows = "".join(
+        f'<tr><td><a href="/quote/{symbol}">{symbol}</a>\n</td><td>Company {symbol}</td></tr>'
+        for symbol in symbols
+    )
+    return ('<html><body><table class="wikitable sortable" id="constituents"><tbody>'
+            '<tr><th>Symbol</th><th>Security</th></tr>' + rows + '</tbody></table></body></html>')
+
+
+def _price_for(symbol):
+    return round(10 + (sum(map(ord, symbol)) % 5000) / 10, 2)
+
+
+class _MockHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        server = self.server
+        url = urllib.parse.urlparse(self.path)
+        server.delay()
+        if url.path.startswith(("/quote/", "/v7/")):
+            failure = server.failure()
+            if failure is not None:
+                server.failures += 1
+                headers = {"Retry-After": "1"} if failure == 429 else {}
+                self._send("unavailable", "text/plain", status=failure, headers=headers)
+                return
+        if url.path.startswith("/wiki/"):
+            self._send(server.constituents_page, "text/html")
+        elif url.path.startswith("/quote/"):
+            symbol = urllib.parse.unquote(url.path[len("/quote/"):])
+            server.record([symbol])
+            if server.is_known(symbol):
+                self._send(server.quote_page(symbol), "text/html")
+            else:
+                self._send("unknown symbol", "text/plain", status=404)
+        elif url.path == "/v7/finance/quote":
+            symbols = urllib.parse.parse_qs(url.query).get("symbols", [""])[0].split(",")
+            server.record(symbols)
+            result = [{"symbol": symbol, "regularMarketPrice": _price_for(symbol)}
+                      for symbol in symbols if server.is_known(symbol)]
+            self._send(json.dumps({"quoteResponse": {"result": result, "error": None}}), "application/json")
+        else:
+            self._send("not found", "text/plain", status=404)
+
+    def _send(self, body, content_type, status=200, headers=None):
+        body = body.encode("utf-8")
+        try:
+            self.send_response(status)
+            for name, value in (headers or {}).items():
+                self.send_header(name, value)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        except (BrokenPipeError, ConnectionResetError):
+            pass  # the client timed out on a stalled request
+
+    def log_message(self, format, *args):
+        pass
+
+
+class MockMarketServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, symbols=None, latency=0.05, jitter=0.02, pages_dir=None, port=0,
+                 error_rate=0.0, error_status=503, stall_rate=0.0, stall=30.0):
+        super(MockMarketServer, self).__init__(("127.0.0.1", port), _MockHandler)
+        self._latency = latency
+        self._jitter = jitter
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.stall_rate = stall_rate
+        self._stall = stall
+        self.failures = 0
+        self._lock = threading.Lock()
+        self._first_request = {}
+        self._recorded_quote = None
+        self.known_symbols = None   # None: every symbol has a price
+
+        if pages_dir is not None:
+            with open(os.path.join(pages_dir, "constituents.html"), "r", encoding="utf-8") as infile:
+                self.constituents_page = infile.read()
+            quote_path = os.path.join(pages_dir, "quote.html")
+            if os.path.exists(quote_path):
+                with open(quote_path, "r", encoding="utf-8") as infile:
+                    self._recorded_quote = infile.read()
+        else:
+            symbols = symbols or make_symbols(500)
+            self.known_symbols = set(symbols)
+            self.constituents_page = make_constituents_page(symbols)
+
+    @property
+    def base_url(self):
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+    def delay(self):
+        time.sleep(self._latency + random.random() * self._jitter)
+
+    def failure(self):
+        """Return the error status to answer with, or None; may stall first."""
+        if self.stall_rate and random.random() < self.stall_rate:
+            time.sleep(self._stall)
+        if self.error_rate and random.random() < self.error_rate:
+            return self.error_status
+        return None
+
+    def is_known(self, symbol):
+        return self.known_symbols is None or symbol in self.known_symbols
+
+    def quote_page(self, symbol):
+        if self._recorded_quote is not None:
+            return self._recorded_quote
+        return QUOTE_PAGE.format(price=f"{_price_for(symbol):,.2f}")
+
+    def record(self, symbols):
+        now = time.time()
+        with self._lock:
+            for symbol in symbols:
+                self._first_request.setdefault(symbol, now)
+
+    def first_requests(self):
+        """Return ``{symbol: epoch seconds of its first quote request}``."""
+        with self._lock:
+            return dict(self._first_request)
+
+    def reset(self):
+        with self._lock:
+            self._first_request.clear()
+
+    def start(self):
+        threading.Thread(target=self.serve_forever, name="mock-market-server", daemon=True).start()
+        return self
@@ -0,0 +1,124 @@
+"""Per-record cost of ``(symbol, price, ingest_date)`` tuples vs ``PriceBatch``.
+
+For each row count this measures, for tuples and for ``PriceBatch`` records
+of ``--batch-size`` rows:
+
+- memory held by the records (tracemalloc),
+- pickled bytes and pickle + unpickle time, as paid per put on a
+  ``multiprocessing.Queue``,
+- wall time to move every row through a ``multiprocessing.Queue`` to a
+  spawned process that iterates the rows.
+
+Usage::
+
+    python -m benchmarks.record_overhead --rows 1000,10000,100000 --batch-size 100
+"""
+
+import argparse
+import json
+import multiprocessing
+import pickle
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+from benchmarks.mock_server import make_symbols
+from utils.records import PriceBatch
+
+
+def make_rows(count):
+    symbols = make_symbols(500)
+    start = datetime.utcnow()
+    return [(symbols[i % len(symbols)], 100.0 + i % 997 / 100, start + timedelta(microseconds=i))
+            for i in range(count)]
+
+
+def _build(rows, batch_size):
+    if batch_size is None:
+        # what the workers put: a fresh tuple per price
+        return [(symbol, price, ingest_date) for symbol, price, ingest_date in rows]
+    return [PriceBatch.from_rows(rows[i:i + batch_size]) for i in range(0, len(rows), batch_size)]
+
+
+def _memory(rows, batch_size):
+    tracemalloc.start()
+    records = _build(rows, batch_size)
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del records
+    return current
+
+
+def _pickling(records):
+    started = time.perf_counter()
+    payloads = [pickle.dumps(record, pickle.HIGHEST_PROTOCOL) for record in records]
+    for payload in payloads:
+        pickle.loads(payload)
+    return sum(map(len, payloads)), time.perf_counter() - started
+
+
+def _consume(input_queue, result_queue):
+    rows = 0
+    while True:
+        val = input_queue.get()
+        if val == 'DONE':
+            break
+        if isinstance(val, PriceBatch):
+            for _ in val:
+                rows += 1
+        else:
+            rows += 1
+    result_queue.put(rows)
+
+
+def _transport(records, context):
+    input_queue, result_queue = context.Queue(), context.Queue()
+    consumer = context.Process(target=_consume, args=(input_queue, result_queue))
+    consumer.start()
+    started = time.perf_counter()
+    for record in records:
+        input_queue.put(record)
+    input_queue.put('DONE')
+    rows = result_queue.get()
+    elapsed = time.perf_counter() - started
+    consumer.join()
+    return rows, elapsed
+
+
+def measure(count, batch_size, context):
+    rows = make_rows(count)
+    results = {}
+    for name, size in (("tuple", None), ("batch", batch_size)):
+        records = _build(rows, size)
+        pickled_bytes, pickle_seconds = _pickling(records)
+        moved, transport_seconds = _transport(records, context)
+        results[name] = {
+            "records": len(records),
+            "memory_bytes_per_row": round(_memory(rows, size) / count, 1),
+            "pickled_bytes_per_row": round(pickled_bytes / count, 1),
+            "pickle_us_per_row": round(pickle_seconds / count * 1e6, 3),
+            "transport_us_per_row": round(transport_seconds / count * 1e6, 3),
+            "rows_received": moved,
+        }
+    return {"rows": count, "batch_size": batch_size, **results}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--rows", default="1000,10000,100000", help="comma separated row counts")
+    parser.add_argument("--batch-size", type=int, default=100, help="rows per PriceBatch")
+    parser.add_argument("--output", help="write the JSON report here as well as to stdout")
+    args = parser.parse_args(argv)
+
+    # the pipeline's process queues use spawn as well
+    context = multiprocessing.get_context("spawn")
+    report = [measure(int(count), args.batch_size, context) for count in args.rows.split(",")]
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as outfile:
+            outfile.write(output)
+    print(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,229 @@
+"""Benchmark the pipeline across execution modes and instance counts.
+
+Each scenario drives ``YamlPipelineExecutor`` with the real worker classes
+against ``MockMarketServer`` and a SQLite file standing in for Postgres
+(``PostgresMasterSchedule`` with a ``sqlite:///`` connection string). Every
+scenario runs in a fresh interpreter so peak RSS is measured per scenario;
+the mock server stays in this process so it does not compete with the
+pipeline for the GIL.
+
+Usage::
+
+    python -m benchmarks.run_benchmark --symbols 200 --instances 1,4,16 \\
+        --modes sequential,threaded,async,batch,process --output bench.json
+
+Reported per scenario: symbols written, wall time, throughput (symbols/sec),
+p50/p95/p99 per-item latency (first quote request for a symbol until its row
+is written) and peak RSS of the pipeline process and its children.
+
+``--output-format batch`` makes the async and batch price stages put
+``PriceBatch`` records instead of one tuple per price; see
+``benchmarks/record_overhead.py`` for the per-record cost in isolation.
+"""
+
+import argparse
+import json
+import math
+import os
+import resource
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+
+import yaml
+
+from benchmarks.mock_server import MockMarketServer, make_symbols
+
+REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir))
+MODES = ("sequential", "threaded", "async", "batch", "process")
+
+
+def build_pipeline(mode, instances, base_url, db_url, output_format="tuple"):
+    """Return the pipeline YAML (as a dict) for one scenario."""
+    queues = [{"name": "SymbolQueue"}, {"name": "PostgresUploading"}]
+    wiki = {
+        "name": "WikiWorker", "location": "Workers.WikiWorker", "class": "WikiWorkerScheduler",
+        "instances": 1, "input_values": [f"{base_url}/wiki/constituents"],
+        "output_queues": ["SymbolQueue"], "parameters": {"streaming": True},
+    }
+    # a single writer: SQLite serialises writers anyway
+    sink = {
+        "name": "PostgresWorker", "location": "Workers.PostgresWorkers", "class": "PostgresMasterSchedule",
+        "instances": 1, "input_queue": "PostgresUploading",
+        "parameters": {"connection_string": db_url, "batch_size": 50, "flush_interval": 0.2},
+    }
+    price = {
+        "name": "YahooFinanceWorkers", "location": "Workers.YahooFinanceWorkers",
+        "input_queue": "SymbolQueue", "output_queues": ["PostgresUploading"],
+    }
+
+    if mode in ("sequential", "threaded"):
+        price.update({"class": "YahooFinancePriceScheduler",
+                      "instances": 1 if mode == "sequential" else instances,
+                      "parameters": {"base_url": f"{base_url}/quote/", "request_delay": 0}})
+    elif mode == "async":
+        price.update({"class": "AsyncYahooFinancePriceScheduler", "instances": 1,
+                      "parameters": {"base_url": f"{base_url}/quote/", "concurrency": instances,
+                                     "rate_limit": 100000, "output_format": output_format}})
+    elif mode == "batch":
+        price.update({"class": "YahooFinanceBatchPriceScheduler", "instances": instances,
+                      "parameters": {"quote_url": f"{base_url}/v7/finance/quote",
+                                     "batch_size": 50, "max_wait": 0.2, "output_format": output_format}})
+    elif mode == "process":
+        queues = [{"name": "WikiPages"}, {"name": "SymbolQueue"},
+                  {"name": "QuotePages"}, {"name": "PostgresUploading"}]
+        wiki.update({"output_queues": ["WikiPages"], "parameters": {"emit": "html"}})
+        wiki_parser = {
+            "name": "WikiParser", "location": "Workers.ParserWorkers", "class": "HtmlParserScheduler",
+            "mode": "process", "instances": 1, "input_queue": "WikiPages",
+            "output_queues": ["SymbolQueue"], "parameters": {"parser": "wiki_symbols"},
+        }
+        price.update({"class": "YahooFinancePriceScheduler", "instances": instances,
+                      "output_queues": ["QuotePages"],
+                      "parameters": {"base_url": f"{base_url}/quote/", "emit": "html",
+                                     "request_delay": 0}})
+        price_parser = {
+            "name": "YahooParser", "location": "Workers.ParserWorkers", "class": "HtmlParserScheduler",
+            "mode": "process", "instances": max(1, min(instances, os.cpu_count() or 1)),
+            "input_queue": "QuotePages", "output_queues": ["PostgresUploading"],
+            "parameters": {"parser": "yahoo_price"},
+        }
+        return {"queues": queues, "workers": [wiki, wiki_parser, price, price_parser, sink]}
+    else:
+        raise ValueError(f"Unknown mode {mode!r}, expected one of {MODES}")
+
+    return {"queues": queues, "workers": [wiki, price, sink]}
+
+
+def run_single(spec_path):
+    """Run one scenario in this process and write its raw result to disk."""
+    with open(spec_path, "r") as infile:
+        spec = json.load(infile)
+
+    db_path = os.path.join(spec["workdir"], "bench.db")
+    with sqlite3.connect(db_path) as connection:
+        connection.execute(
+            "CREATE TABLE prices (symbol TEXT, price REAL, ingest_date TEXT,"
+            " written_at REAL DEFAULT (julianday('now')))"
+        )
+    pipeline = build_pipeline(spec["mode"], spec["instances"], spec["base_url"], f"sqlite:///{db_path}",
+                              spec["output_format"])
+    pipeline_path = os.path.join(spec["workdir"], "pipeline.yaml")
+    with open(pipeline_path, "w") as outfile:
+        yaml.safe_dump(pipeline, outfile)
+
+    from yaml_reader import YamlPipelineExecutor
+
+    start_time = time.time()
+    pipeline_executor = YamlPipelineExecutor(pipeline_path)
+    pipeline_executor.start()
+    pipeline_executor.join()
+    elapsed = time.time() - start_time
+
+    with sqlite3.connect(db_path) as connection:
+        rows = connection.execute(
+            "SELECT symbol, (written_at - 2440587.5) * 86400.0 FROM prices"
+        ).fetchall()
+    peak_rss_kb = max(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+                      resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss)
+    with open(spec["result_path"], "w") as outfile:
+        json.dump({"elapsed": elapsed, "written": rows, "peak_rss_kb": peak_rss_kb}, outfile)
+
+
+def _percentile(values, percent):
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = max(0, math.ceil(percent / 100 * len(ordered)) - 1)
+    return ordered[index]
+
+
+def run_scenario(server, mode, instances, timeout, output_format="tuple"):
+    server.reset()
+    with tempfile.TemporaryDirectory(prefix="pipeline-bench-") as workdir:
+        spec = {"mode": mode, "instances": instances, "base_url": server.base_url, "workdir": workdir,
+                "output_format": output_format, "result_path": os.path.join(workdir, "result.json")}
+        spec_path = os.path.join(workdir, "spec.json")
+        with open(spec_path, "w") as outfile:
+            json.dump(spec, outfile)
+
+        subprocess.run(
+            [sys.executable, "-m", "benchmarks.run_benchmark", "--single", spec_path],
+            cwd=REPO_ROOT, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+            timeout=timeout, check=True,
+        )
+        with open(spec["result_path"], "r") as infile:
+            raw = json.load(infile)
+
+    first_requests = server.first_requests()
+    latencies = [
+        (written_at - first_requests[symbol]) * 1000
+        for symbol, written_at in raw["written"] if symbol in first_requests
+    ]
+    written = len(raw["written"])
+    return {
+        "mode": mode,
+        "instances": instances,
+        "output_format": output_format,
+        "symbols_written": written,
+        "elapsed_s": round(raw["elapsed"], 3),
+        "throughput_symbols_per_s": round(written / raw["elapsed"], 2) if raw["elapsed"] else None,
+        "latency_ms": {name: round(_percentile(latencies, pct), 1) if latencies else None
+                       for name, pct in (("p50", 50), ("p95", 95), ("p99", 99))},
+        "peak_rss_kb": raw["peak_rss_kb"],
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--symbols", type=int, default=100, help="size of the mock constituents table")
+    parser.add_argument("--instances", default="1,4,16", help="comma separated instance counts to sweep")
+    parser.add_argument("--modes", default=",".join(MODES), help="comma separated execution modes")
+    parser.add_argument("--latency", type=float, default=0.05, help="mock server latency in seconds")
+    parser.add_argument("--jitter", type=float, default=0.02, help="extra random latency in seconds")
+    parser.add_argument("--pages-dir", help="directory with recorded constituents.html / quote.html")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of quote requests answered 503")
+    parser.add_argument("--stall-rate", type=float, default=0.0, help="fraction of quote requests that hang")
+    parser.add_argument("--timeout", type=float, default=600, help="seconds allowed per scenario")
+    parser.add_argument("--output-format", default="tuple", choices=("tuple", "batch"),
+                        help="records put by the async and batch price stages")
+    parser.add_argument("--output", help="write the JSON report here as well as to stdout")
+    parser.add_argument("--single", help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.single:
+        run_single(args.single)
+        return
+
+    modes = [mode.strip() for mode in args.modes.split(",") if mode.strip()]
+    instance_counts = [int(count) for count in args.instances.split(",")]
+    server = MockMarketServer(make_symbols(args.symbols), latency=args.latency, jitter=args.jitter,
+                              pages_dir=args.pages_dir, error_rate=args.error_rate,
+                              stall_rate=args.stall_rate).start()
+
+    results = []
+    for mode in modes:
+        # a sequential run does not depend on the instance count
+        for instances in ([1] if mode == "sequential" else instance_counts):
+            result = run_scenario(server, mode, instances, args.timeout, args.output_format)
+            print(f"{mode:>10} x{instances:<4} {result['throughput_symbols_per_s']} symbols/s", file=sys.stderr)
+            results.append(result)
+    server.shutdown()
+
+    report = {
+        "config": {"symbols": args.symbols, "latency": args.latency, "jitter": args.jitter,
+                   "pages_dir": args.pages_dir, "output_format": args.output_format,
+                   "error_rate": args.error_rate, "stall_rate": args.stall_rate},
+        "results": results,
+    }
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as outfile:
+            outfile.write(output)
+    print(output)
+
+
+if __name__ == "__main__":
+    main()
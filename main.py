@@ -25,7 +25,13 @@ def main():
         logger.info("Starting pipeline %s", pipeline_location)
         pipeline_executor = YamlPipelineExecutor(pipeline_location)
         pipeline_executor.start()    
-        pipeline_executor.join()
+        try:
+            pipeline_executor.join()
+        except KeyboardInterrupt:
+            # polling pipelines run until stopped: drain and shut down cleanly
+            logger.info("Interrupted, stopping pipeline")
+            pipeline_executor.stop()
+            pipeline_executor.join()
         elapsed  = round(time.time() - start_time, 1)
         logger.info("Total time taken for running the pipeline: %s seconds", elapsed)     
     except Exception as e:
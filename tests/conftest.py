@@ -0,0 +1,22 @@
+import pytest
+
+from benchmarks.mock_server import MockMarketServer, make_symbols
+
+
+@pytest.fixture
+def market():
+    """Local stand-in for Wikipedia and Yahoo Finance, see ``benchmarks.mock_server``."""
+    server = MockMarketServer(symbols=make_symbols(20), latency=0, jitter=0).start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def drain(pipeline_queue):
+    """Everything put on ``pipeline_queue`` up to its first 'DONE'."""
+    items = []
+    while True:
+        item = pipeline_queue.get(timeout=10)
+        if item == 'DONE':
+            return items
+        items.append(item)
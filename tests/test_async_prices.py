@@ -0,0 +1,66 @@
+import queue
+import time
+
+from benchmarks.mock_server import make_symbols
+from tests.conftest import drain
+from utils.records import PriceBatch
+from Workers.YahooFinanceWorkers import AsyncYahooFinancePriceScheduler
+
+
+def _queue_of(items):
+    input_queue = queue.Queue()
+    for item in items:
+        input_queue.put(item)
+    return input_queue
+
+
+def _start(market, input_queue, output_queues, **parameters):
+    parameters.setdefault("rate_limit", 1000)
+    return AsyncYahooFinancePriceScheduler(input_queue, output_queues,
+                                           base_url=f"{market.base_url}/quote/", **parameters)
+
+
+def test_prices_every_symbol(market):
+    output_queue = queue.Queue()
+    scheduler = _start(market, _queue_of(make_symbols(20) + ['DONE']), [output_queue], concurrency=5)
+    scheduler.join(10)
+    assert not scheduler.is_alive()
+    output_queue.put('DONE')
+    rows = drain(output_queue)
+    assert sorted(symbol for symbol, _, _ in rows) == make_symbols(20)
+    assert all(isinstance(price, float) for _, price, _ in rows)
+
+
+def test_batch_output(market):
+    output_queue = queue.Queue()
+    scheduler = _start(market, _queue_of(make_symbols(12) + ['DONE']), [output_queue],
+                       output_format='batch', output_batch_size=5)
+    scheduler.join(10)
+    output_queue.put('DONE')
+    batches = drain(output_queue)
+    assert all(isinstance(batch, PriceBatch) for batch in batches)
+    assert sorted(symbol for batch in batches for symbol in batch.symbols) == make_symbols(12)
+    assert max(len(batch) for batch in batches) <= 5
+
+
+def test_unknown_symbols_go_to_the_dead_letter_queue(market):
+    output_queue, dead_letter_queue = queue.Queue(), queue.Queue()
+    scheduler = _start(market, _queue_of(make_symbols(2) + ["DELISTED", 'DONE']), [output_queue],
+                       dead_letter_queue=dead_letter_queue, max_retries=0)
+    scheduler.join(10)
+    output_queue.put('DONE')
+    dead_letter_queue.put('DONE')
+    assert sorted(symbol for symbol, _, _ in drain(output_queue)) == make_symbols(2)
+    assert drain(dead_letter_queue) == ["DELISTED"]
+
+
+def test_instances_share_the_host_rate(market):
+    # two instances at rate_limit 40: together, not each, 40 requests a second
+    input_queue, output_queue = _queue_of(make_symbols(20) + ['DONE', 'DONE']), queue.Queue()
+    started = time.monotonic()
+    schedulers = [_start(market, input_queue, [output_queue], rate_limit=40, burst=1) for _ in range(2)]
+    for scheduler in schedulers:
+        scheduler.join(10)
+    assert time.monotonic() - started >= 19 / 40 * 0.9
+    output_queue.put('DONE')
+    assert len(drain(output_queue)) == 20
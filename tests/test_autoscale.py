@@ -0,0 +1,74 @@
+import queue
+
+import pytest
+
+from yaml_reader import YamlPipelineExecutor
+
+
+@pytest.fixture
+def executor(monkeypatch):
+    executor = YamlPipelineExecutor("unused.yaml")
+    executor._queues = {"Symbols": queue.Queue()}
+    executor._active_instances = {"Prices": 2}
+    executor._queue_consumers = {"Symbols": 2}
+
+    def start_instance(worker_name):
+        executor._active_instances[worker_name] += 1
+
+    monkeypatch.setattr(executor, "_start_instance", start_instance)
+    executor._init_autoscale("Prices", "Symbols", [], {
+        "min_instances": 1, "max_instances": 4, "interval": 1,
+        "scale_up_depth": 5, "scale_down_intervals": 3}, 2)
+    return executor
+
+
+def _check(executor, depth, drained, now):
+    """Leave ``depth`` items queued, count ``drained`` taken in, run one check."""
+    symbols = executor._queues["Symbols"]
+    while symbols.qsize() > depth:
+        symbols.get()
+    while symbols.qsize() < depth:
+        symbols.put("SYM")
+    executor.metrics.stage("Prices").item_in(drained)
+    settings = executor._autoscale["Prices"]
+    executor._autoscale_stage("Prices", settings, settings["last_check"] + now)
+
+
+def test_growing_backlog_adds_an_instance(executor):
+    _check(executor, depth=20, drained=0, now=1)
+    assert executor._active_instances["Prices"] == 3
+
+
+def test_backlog_drained_fast_enough_adds_nothing(executor):
+    _check(executor, depth=200, drained=0, now=1)
+    assert executor._active_instances["Prices"] == 3
+    # 180 left, 400 taken in over the interval: arrivals no longer keep up
+    _check(executor, depth=20, drained=400, now=1)
+    assert executor._active_instances["Prices"] == 3
+
+
+def test_deep_backlog_draining_in_time_adds_nothing(executor):
+    _check(executor, depth=300, drained=0, now=1)
+    assert executor._active_instances["Prices"] == 3
+    # arrival 29/s, drain 40/s: the 289 queued drain in about 26s, within drain_time
+    _check(executor, depth=289, drained=40, now=1)
+    assert executor._active_instances["Prices"] == 3
+
+
+def test_slowly_draining_backlog_adds_an_instance(executor):
+    executor._autoscale["Prices"]["last_depth"] = 300
+    # drained 10, 1 arrived: 291 left would take over 30s
+    _check(executor, depth=291, drained=10, now=1)
+    assert executor._active_instances["Prices"] == 3
+
+
+def test_instance_retired_only_after_consecutive_idle_intervals(executor):
+    _check(executor, depth=0, drained=0, now=1)
+    _check(executor, depth=0, drained=0, now=1)
+    _check(executor, depth=1, drained=10, now=1)   # a burst resets the count
+    _check(executor, depth=0, drained=1, now=1)
+    _check(executor, depth=0, drained=0, now=1)
+    assert executor._active_instances["Prices"] == 2
+    _check(executor, depth=0, drained=0, now=1)
+    assert executor._active_instances["Prices"] == 1
+    assert executor._queues["Symbols"].get_nowait() == 'DONE'
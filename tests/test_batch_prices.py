@@ -0,0 +1,81 @@
+import datetime
+import queue
+import time
+
+from benchmarks.mock_server import make_symbols
+from tests.conftest import drain
+from utils.records import PriceBatch
+from Workers.YahooFinanceWorkers import YahooFinanceBatchPriceScheduler
+
+
+def _start(market, input_queue, output_queues, **parameters):
+    return YahooFinanceBatchPriceScheduler(
+        input_queue, output_queues, quote_url=f"{market.base_url}/v7/finance/quote", **parameters)
+
+
+def _queue_of(items):
+    input_queue = queue.Queue()
+    for item in items:
+        input_queue.put(item)
+    return input_queue
+
+
+def test_batches_are_cut_at_batch_size(market):
+    output_queue = queue.Queue()
+    scheduler = _start(market, _queue_of(make_symbols(12) + ['DONE']), [output_queue],
+                       batch_size=5, max_wait=10, output_format='batch')
+    scheduler.join(10)
+    output_queue.put('DONE')
+    batches = drain(output_queue)
+    assert all(isinstance(batch, PriceBatch) for batch in batches)
+    assert [len(batch) for batch in batches] == [5, 5, 2]
+    assert [symbol for batch in batches for symbol in batch.symbols] == make_symbols(12)
+
+
+def test_partial_batch_goes_out_after_max_wait(market):
+    input_queue, output_queue = _queue_of(make_symbols(3)), queue.Queue()
+    scheduler = _start(market, input_queue, [output_queue], batch_size=50, max_wait=0.1,
+                       output_format='batch')
+    batch = output_queue.get(timeout=5)
+    assert scheduler.is_alive()
+    assert batch.symbols == make_symbols(3)
+    input_queue.put('DONE')
+    scheduler.join(10)
+    assert not scheduler.is_alive()
+
+
+def test_done_flushes_the_partial_batch(market):
+    output_queue = queue.Queue()
+    started = time.monotonic()
+    scheduler = _start(market, _queue_of(make_symbols(2) + ['DONE']), [output_queue],
+                       batch_size=50, max_wait=30, output_format='batch')
+    scheduler.join(10)
+    assert time.monotonic() - started < 5
+    output_queue.put('DONE')
+    assert [batch.symbols for batch in drain(output_queue)] == [make_symbols(2)]
+
+
+def test_prices_fan_out_as_tuples(market):
+    first, second = queue.Queue(), queue.Queue()
+    scheduler = _start(market, _queue_of(make_symbols(4) + ['DONE']), [first, second],
+                       batch_size=50, max_wait=0.05)
+    scheduler.join(10)
+    for output_queue in (first, second):
+        output_queue.put('DONE')
+        rows = drain(output_queue)
+        assert [symbol for symbol, _, _ in rows] == make_symbols(4)
+        for symbol, price, ingest_date in rows:
+            assert isinstance(price, float)
+            assert isinstance(ingest_date, datetime.datetime)
+
+
+def test_missing_symbols_go_to_the_dead_letter_queue(market):
+    output_queue, dead_letter_queue = queue.Queue(), queue.Queue()
+    symbols = make_symbols(3) + ["DELISTED"]
+    scheduler = _start(market, _queue_of(symbols + ['DONE']), [output_queue],
+                       batch_size=50, max_wait=0.05, dead_letter_queue=dead_letter_queue)
+    scheduler.join(10)
+    output_queue.put('DONE')
+    dead_letter_queue.put('DONE')
+    assert [symbol for symbol, _, _ in drain(output_queue)] == make_symbols(3)
+    assert drain(dead_letter_queue) == ["DELISTED"]
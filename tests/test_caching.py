@@ -0,0 +1,49 @@
+import os
+import queue
+
+import requests
+
+from benchmarks.mock_server import make_symbols
+from tests.conftest import drain
+from utils.cache import DiskResponseCache
+from Workers.WikiWorker import WikiWorker
+from Workers.YahooFinanceWorkers import YahooFinanceBatchPriceScheduler
+
+
+def _run_batch_scheduler(market, symbols, **parameters):
+    input_queue, output_queue = queue.Queue(), queue.Queue()
+    for symbol in symbols:
+        input_queue.put(symbol)
+    input_queue.put('DONE')
+    scheduler = YahooFinanceBatchPriceScheduler(
+        input_queue, [output_queue], quote_url=f"{market.base_url}/v7/finance/quote",
+        max_wait=0.05, **parameters)
+    scheduler.join(10)
+    output_queue.put('DONE')
+    return drain(output_queue)
+
+
+def test_cached_prices_are_not_put_again(market, tmp_path):
+    cache = {"price_cache_ttl": 60, "price_cache_path": str(tmp_path / "prices.sqlite")}
+    symbols = make_symbols(5)
+    assert len(_run_batch_scheduler(market, symbols, **cache)) == 5
+    assert _run_batch_scheduler(market, symbols, **cache) == []
+
+
+def test_cached_prices_are_put_again_on_request(market, tmp_path):
+    cache = {"price_cache_ttl": 60, "price_cache_path": str(tmp_path / "prices.sqlite")}
+    symbols = make_symbols(5)
+    first = _run_batch_scheduler(market, symbols, **cache)
+    assert _run_batch_scheduler(market, symbols, price_cache_emit=True, **cache) == first
+
+
+def test_streaming_fills_the_page_cache(market, tmp_path):
+    cache = DiskResponseCache(str(tmp_path / "wiki"), ttl=60)
+    url = f"{market.base_url}/wiki/constituents"
+    for _ in range(2):
+        worker = WikiWorker(url, session=requests.Session(), streaming=True, cache=cache)
+        assert list(worker.get_sp_500_companies()) == make_symbols(20)
+    assert cache.stats()["misses"] == 1 and cache.stats()["hits"] == 1
+    body, = [name for name in os.listdir(tmp_path / "wiki") if name.endswith(".body")]
+    with open(tmp_path / "wiki" / body, "r", encoding="utf-8") as infile:
+        assert infile.read() == market.constituents_page
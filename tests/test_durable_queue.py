@@ -0,0 +1,136 @@
+import datetime
+import gc
+import time
+
+import pytest
+import yaml
+
+from utils.checkpoint import CheckpointStore
+from utils.queues import DurableQueue, ack
+from yaml_reader import YamlPipelineExecutor
+
+
+@pytest.fixture
+def store(tmp_path):
+    checkpoint = CheckpointStore(str(tmp_path / "checkpoint.db"), "test")
+    yield checkpoint
+    checkpoint.close()
+
+
+def _stored(store, queue_name="Prices"):
+    return [item for _, item in store.pending(queue_name)]
+
+
+def test_items_survive_until_acked(store):
+    first = DurableQueue(store, "Prices")
+    for symbol in ("A", "B", "C"):
+        first.put((symbol, 1.0))
+    ack(first, first.get())
+
+    recovered = DurableQueue(store, "Prices")
+    assert recovered.recovered == 2
+    assert [recovered.get(), recovered.get()] == [("B", 1.0), ("C", 1.0)]
+
+
+def test_sentinels_are_not_stored(store):
+    durable = DurableQueue(store, "Prices")
+    durable.put('DONE')
+    assert _stored(store) == []
+    assert durable.get() == 'DONE'
+
+
+def test_ack_matches_the_item_not_a_reused_id(store):
+    durable = DurableQueue(store, "Prices")
+    for cycle in range(50):
+        durable.put(f"F{cycle}")
+        durable.get()          # failed: dropped without an ack
+        gc.collect()
+        durable.put(f"OK{cycle}")
+        ack(durable, durable.get())
+    assert _stored(store) == [f"F{cycle}" for cycle in range(50)]
+
+
+def test_ack_of_unknown_item_is_ignored(store):
+    durable = DurableQueue(store, "Prices")
+    durable.put("A")
+    item = durable.get()
+    ack(durable, "something else")
+    assert _stored(store) == ["A"]
+    ack(durable, item)
+    assert _stored(store) == []
+
+
+def test_failed_parquet_flush_is_not_acked(store, tmp_path, monkeypatch):
+    pytest.importorskip("pyarrow")
+    from Workers import ParquetWorkers
+
+    writes = []
+    write_batch = ParquetWorkers.pq.ParquetWriter.write_batch
+
+    def fail_second_write(self, batch, *args, **kwargs):
+        writes.append(batch.num_rows)
+        if len(writes) == 2:
+            raise OSError("disk full")
+        return write_batch(self, batch, *args, **kwargs)
+
+    monkeypatch.setattr(ParquetWorkers.pq.ParquetWriter, "write_batch", fail_second_write)
+    durable = DurableQueue(store, "Prices")
+    ingest_date = datetime.datetime(2024, 5, 17, 12)
+    durable.put(("A", 1.0, ingest_date))
+    durable.put(("B", 2.0, ingest_date))
+    durable.put('DONE')
+    sink = ParquetWorkers.ParquetSinkScheduler(durable, output_dir=str(tmp_path / "prices"),
+                                               row_group_size=1)
+    sink.join(10)
+    assert len(writes) == 2
+    assert _stored(store) == [("B", 2.0, ingest_date)]
+
+
+def _wait_until_acked(store, timeout=5):
+    deadline = time.monotonic() + timeout
+    while _stored(store) and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return _stored(store)
+
+
+@pytest.mark.parametrize("roll", [{"row_groups_per_file": 2}, {"flush_interval": 0.1}],
+                         ids=["row-groups", "interval"])
+def test_parquet_files_roll_while_the_run_goes_on(store, tmp_path, roll):
+    pytest.importorskip("pyarrow")
+    from Workers import ParquetWorkers
+
+    durable = DurableQueue(store, "Prices")
+    ingest_date = datetime.datetime(2024, 5, 17, 12)
+    durable.put(("A", 1.0, ingest_date))
+    durable.put(("B", 2.0, ingest_date))
+    output_dir = tmp_path / "prices"
+    sink = ParquetWorkers.ParquetSinkScheduler(durable, output_dir=str(output_dir),
+                                               row_group_size=1, **roll)
+    # no 'DONE' yet: the closed file is readable and its items acknowledged
+    assert _wait_until_acked(store) == []
+    table = ParquetWorkers.pq.read_table(next(output_dir.rglob("*.parquet")))
+    assert table.column("symbol").to_pylist() == ["A", "B"]
+    durable.put('DONE')
+    sink.join(10)
+
+
+def test_finished_stage_reruns_when_its_producer_reruns(store, tmp_path):
+    # Source -> Raw (not durable) -> Parse -> Parsed (durable) -> Sink:
+    # Source never finished, so Parse has to run again even though it did
+    store.mark_finished("Parse")
+    pipeline = {
+        "checkpoint": {"path": store.path, "run_id": "test"},
+        "queues": [{"name": "Raw"}, {"name": "Parsed", "durable": True}],
+        "workers": [
+            {"name": "Source", "location": "x", "class": "x", "output_queues": ["Raw"]},
+            {"name": "Parse", "location": "x", "class": "x", "input_queue": "Raw",
+             "output_queues": ["Parsed"]},
+            {"name": "Sink", "location": "x", "class": "x", "input_queue": "Parsed"},
+        ],
+    }
+    path = tmp_path / "pipeline.yaml"
+    path.write_text(yaml.safe_dump(pipeline))
+    executor = YamlPipelineExecutor(str(path))
+    executor._load_pipeline()
+    executor._init_checkpoint()
+    assert executor._resumed_stages == set()
@@ -0,0 +1,90 @@
+import time
+import urllib.request
+
+import pytest
+
+from utils.metrics import Histogram, InstrumentedQueue, MetricsRegistry, serve_metrics
+
+
+@pytest.fixture
+def registry():
+    registry = MetricsRegistry()
+    stage = registry.stage("Prices")
+    stage.instances = 2
+    stage.item_in(5)
+    stage.item_out(4)
+    stage.error()
+    stage.observe(0.003)
+    stage.observe(0.2)
+    symbols = InstrumentedQueue()
+    for symbol in ("A", "B", "C"):
+        symbols.put(symbol)
+    time.sleep(0.02)
+    symbols.get()
+    registry.register_queue("Symbols", symbols)
+    return registry
+
+
+def _scrape(registry):
+    server = serve_metrics(registry, port=0)
+    try:
+        with urllib.request.urlopen(f"http://127.0.0.1:{server.server_address[1]}/metrics") as response:
+            assert response.headers["Content-Type"].startswith("text/plain")
+            body = response.read().decode("utf-8")
+    finally:
+        server.shutdown()
+        server.server_close()
+    samples = {}
+    for line in body.splitlines():
+        if line and not line.startswith("#"):
+            name, value = line.rsplit(" ", 1)
+            samples[name] = float(value)
+    return samples
+
+
+def test_prometheus_exposition(registry):
+    samples = _scrape(registry)
+    assert samples['pipeline_stage_items_in_total{stage="Prices"}'] == 5
+    assert samples['pipeline_stage_items_out_total{stage="Prices"}'] == 4
+    assert samples['pipeline_stage_errors_total{stage="Prices"}'] == 1
+    assert samples['pipeline_stage_instances{stage="Prices"}'] == 2
+    # buckets are cumulative
+    assert samples['pipeline_stage_latency_seconds_bucket{stage="Prices",le="0.005"}'] == 1
+    assert samples['pipeline_stage_latency_seconds_bucket{stage="Prices",le="0.25"}'] == 2
+    assert samples['pipeline_stage_latency_seconds_bucket{stage="Prices",le="+Inf"}'] == 2
+    assert samples['pipeline_stage_latency_seconds_count{stage="Prices"}'] == 2
+    assert samples['pipeline_stage_latency_seconds_sum{stage="Prices"}'] == pytest.approx(0.203)
+
+    assert samples['pipeline_queue_depth{queue="Symbols"}'] == 2
+    assert samples['pipeline_queue_wait_seconds_count{queue="Symbols"}'] == 1
+    assert samples['pipeline_queue_wait_seconds_sum{queue="Symbols"}'] >= 0.02
+    assert samples['pipeline_queue_wait_seconds_bucket{queue="Symbols",le="0.01"}'] == 0
+    assert samples['pipeline_queue_dropped_total{queue="Symbols"}'] == 0
+
+
+def test_unknown_path_is_not_found(registry):
+    server = serve_metrics(registry, port=0)
+    try:
+        with pytest.raises(urllib.error.HTTPError):
+            urllib.request.urlopen(f"http://127.0.0.1:{server.server_address[1]}/other")
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def test_snapshot(registry):
+    snapshot = registry.snapshot()
+    assert snapshot["stages"]["Prices"]["items_out"] == 4
+    assert snapshot["queues"]["Symbols"]["puts"] == 3
+    assert snapshot["queues"]["Symbols"]["gets"] == 1
+
+
+def test_histogram_quantiles():
+    histogram = Histogram()
+    for seconds in (0.002,) * 90 + (0.3,) * 10:
+        histogram.observe(seconds)
+    summary = histogram.summary()
+    assert summary["count"] == 100
+    assert summary["p50"] == 0.005
+    assert summary["p99"] == 0.5
+    assert Histogram().summary()["p50"] is None
@@ -0,0 +1,88 @@
+import threading
+import time
+
+import pytest
+
+from utils.metrics import InstrumentedQueue
+from utils.queues import DropOldestQueue, SpillQueue, make_thread_queue
+
+
+def _get_all(pipeline_queue):
+    return [pipeline_queue.get_nowait() for _ in range(pipeline_queue.qsize())]
+
+
+def test_drop_oldest_keeps_the_newest_items():
+    drop_oldest = DropOldestQueue(3)
+    for i in range(5):
+        drop_oldest.put(i)
+    assert _get_all(drop_oldest) == [2, 3, 4]
+    assert drop_oldest.dropped == 2
+    assert drop_oldest.puts == 5
+
+
+def test_drop_oldest_never_drops_done():
+    drop_oldest = DropOldestQueue(2)
+    drop_oldest.put('DONE')
+    for item in ("A", "B", "C"):
+        drop_oldest.put(item)
+    assert _get_all(drop_oldest) == ['DONE', "C"]
+    assert drop_oldest.dropped == 2
+
+
+def test_drop_oldest_does_not_leave_unfinished_tasks():
+    drop_oldest = DropOldestQueue(1)
+    drop_oldest.put("A")
+    drop_oldest.put("B")
+    drop_oldest.get()
+    drop_oldest.task_done()
+    drop_oldest.join()   # would hang if the dropped item still counted
+
+
+def test_spill_keeps_order_and_bounds_memory(tmp_path):
+    spill = SpillQueue(2, spill_dir=str(tmp_path))
+    for i in range(10):
+        spill.put(i)
+    assert spill.qsize() == 10
+    assert len(spill.queue) == 2
+    assert spill.spilled == 8
+    got = [spill.get_nowait() for _ in range(4)]
+    for i in range(10, 13):
+        spill.put(i)
+    got += _get_all(spill)
+    assert got == list(range(13))
+    assert len(spill.queue) == 0
+
+
+def test_spill_never_blocks():
+    spill = SpillQueue(1)
+    for i in range(100):
+        spill.put(i, timeout=0.01)
+    assert spill.qsize() == 100
+
+
+def test_blocked_put_is_measured():
+    bounded = InstrumentedQueue(1)
+    bounded.put("A")
+    producer = threading.Thread(target=bounded.put, args=("B",))
+    producer.start()
+    time.sleep(0.1)
+    assert bounded.get() == "A"
+    producer.join(1)
+    _, blocked_seconds, blocked_puts = bounded.put_blocked.state()
+    assert blocked_puts == 2
+    assert blocked_seconds >= 0.09
+    assert bounded.get() == "B"
+    assert bounded.wait.state()[2] == 2
+
+
+@pytest.mark.parametrize("overflow, expected", [("block", InstrumentedQueue),
+                                                ("drop_oldest", DropOldestQueue),
+                                                ("spill", SpillQueue)])
+def test_make_thread_queue(overflow, expected):
+    assert type(make_thread_queue(5, overflow)) is expected
+
+
+@pytest.mark.parametrize("maxsize, overflow", [(5, "grow"), (0, "drop_oldest"), (0, "spill")])
+def test_make_thread_queue_rejects_bad_settings(maxsize, overflow):
+    with pytest.raises(ValueError):
+        make_thread_queue(maxsize, overflow)
@@ -0,0 +1,44 @@
+import datetime
+import queue
+
+import pytest
+import requests
+
+from benchmarks.mock_server import _price_for, make_symbols
+from tests.conftest import drain
+from Workers.ParserWorkers import HtmlParserScheduler
+
+NOON = datetime.datetime(2024, 5, 17, 12)
+
+
+def _parse(parser, pages):
+    input_queue, output_queue = queue.Queue(), queue.Queue()
+    for page in pages:
+        input_queue.put(page)
+    input_queue.put('DONE')
+    HtmlParserScheduler(input_queue, [output_queue], parser=parser).join(10)
+    output_queue.put('DONE')
+    return drain(output_queue)
+
+
+def test_wiki_symbols(market):
+    url = f"{market.base_url}/wiki/constituents"
+    page = requests.get(url).content
+    assert _parse("wiki_symbols", [(url, page)]) == make_symbols(20)
+
+
+def test_yahoo_price(market):
+    pages = [(symbol, requests.get(f"{market.base_url}/quote/{symbol}").content, NOON)
+             for symbol in make_symbols(3)]
+    assert _parse("yahoo_price", pages) == [(symbol, _price_for(symbol), NOON) for symbol in make_symbols(3)]
+
+
+def test_unparsable_quote_page_is_dropped(market):
+    good = requests.get(f"{market.base_url}/quote/SYM0001").content
+    pages = [("BAD", b"<html><body>no price here</body></html>", NOON), ("SYM0001", good, NOON)]
+    assert _parse("yahoo_price", pages) == [("SYM0001", _price_for("SYM0001"), NOON)]
+
+
+def test_unknown_parser():
+    with pytest.raises(ValueError):
+        HtmlParserScheduler(queue.Queue(), [queue.Queue()], parser="pdf")
@@ -0,0 +1,157 @@
+import collections
+import datetime
+import queue
+import threading
+import time
+
+import pytest
+import yaml
+
+from utils.queues import PartitionRouter, PartitionedQueue
+from utils.records import PriceBatch
+from yaml_reader import PipelineValidationError, YamlPipelineExecutor
+
+RECEIVED = collections.defaultdict(list)   # partition thread name -> items
+
+
+class SymbolSource(threading.Thread):
+    def __init__(self, output_queues, **kwargs):
+        kwargs.pop('input_queue', None)
+        kwargs.pop('metrics', None)
+        self._count = kwargs.pop('input_values')[0]
+        self._output_queues = output_queues
+        super(SymbolSource, self).__init__()
+        self.start()
+
+    def run(self):
+        for round_number in range(3):
+            for i in range(self._count):
+                for output_queue in self._output_queues:
+                    output_queue.put((f"SYM{i}", float(round_number)))
+
+
+class RecordingSink(threading.Thread):
+    def __init__(self, input_queue, **kwargs):
+        kwargs.pop('output_queues', None)
+        kwargs.pop('metrics', None)
+        self._input_queue = input_queue
+        super(RecordingSink, self).__init__()
+        self.start()
+
+    def run(self):
+        while True:
+            val = self._input_queue.get()
+            if val == 'DONE':
+                break
+            RECEIVED[self.name].append(val)
+
+
+def _write_pipeline(tmp_path, workers, queues=None):
+    pipeline = {
+        "queues": queues or [{"name": "Prices", "partitioned": True}],
+        "workers": workers,
+    }
+    path = tmp_path / "pipeline.yaml"
+    path.write_text(yaml.safe_dump(pipeline))
+    return str(path)
+
+
+SOURCE = {"name": "Source", "location": __name__, "class": "SymbolSource",
+          "input_values": [50], "output_queues": ["Prices"]}
+SINK = {"name": "Sink", "location": __name__, "class": "RecordingSink",
+        "instances": 3, "input_queue": "Prices"}
+
+
+def test_put_waits_for_first_partition():
+    partitioned = PartitionedQueue()
+    producer = threading.Thread(target=partitioned.put, args=(("SYM1", 1.0),))
+    producer.start()
+    producer.join(0.1)
+    assert producer.is_alive()
+
+    sub_queue = partitioned.add_partition("Sink-0")
+    producer.join(1)
+    assert not producer.is_alive()
+    assert sub_queue.get(timeout=1) == ("SYM1", 1.0)
+
+
+def test_put_without_partitions_does_not_block_forever():
+    partitioned = PartitionedQueue()
+    with pytest.raises(queue.Full):
+        partitioned.put(("SYM1", 1.0), block=False)
+    with pytest.raises(queue.Full):
+        partitioned.put(("SYM1", 1.0), timeout=0.05)
+
+
+def test_put_to_full_partition_wakes_on_get():
+    partitioned = PartitionedQueue(maxsize=1)
+    sub_queue = partitioned.add_partition("Sink-0")
+    partitioned.put(("SYM1", 1.0))
+    with pytest.raises(queue.Full):
+        partitioned.put(("SYM1", 2.0), timeout=0.05)
+
+    producer = threading.Thread(target=partitioned.put, args=(("SYM1", 3.0),))
+    producer.start()
+    producer.join(0.1)
+    assert producer.is_alive()
+    started = time.perf_counter()
+    assert sub_queue.get() == ("SYM1", 1.0)
+    producer.join(1)
+    assert not producer.is_alive()
+    assert time.perf_counter() - started < 0.5
+    assert sub_queue.get(timeout=1) == ("SYM1", 3.0)
+
+
+def _batch(*symbols):
+    return PriceBatch.from_rows((symbol, float(i), datetime.datetime(2024, 5, 17))
+                                for i, symbol in enumerate(symbols))
+
+
+def test_batches_are_split_by_symbol():
+    symbols = [f"SYM{i}" for i in range(20)]
+    sub_queues = [queue.Queue() for _ in range(3)]
+    PartitionRouter(sub_queues).put(_batch(*symbols))
+
+    partitioned = PartitionedQueue()
+    partitions = [partitioned.add_partition(f"Sink-{i}") for i in range(3)]
+    partitioned.put(_batch(*symbols))
+
+    for routed in (sub_queues, partitions):
+        parts = [routed_queue.get_nowait() for routed_queue in routed if routed_queue.qsize()]
+        assert sorted(symbol for part in parts for symbol, _, _ in part) == sorted(symbols)
+        # a symbol's rows keep their price when split off
+        assert all(price == float(symbols.index(symbol)) for part in parts for symbol, price, _ in part)
+
+
+@pytest.mark.parametrize("workers", [[SOURCE, SINK], [SINK, SOURCE]], ids=["producer-first", "consumer-first"])
+def test_partitioned_pipeline_delivers_every_item(tmp_path, workers):
+    RECEIVED.clear()
+    executor = YamlPipelineExecutor(_write_pipeline(tmp_path, workers))
+    executor.start()
+    executor.join(30)
+    assert not executor.is_alive()
+
+    items = [item for received in RECEIVED.values() for item in received]
+    assert len(items) == 150
+    owners = collections.defaultdict(set)
+    for name, received in RECEIVED.items():
+        for symbol, _ in received:
+            owners[symbol].add(name)
+    assert all(len(names) == 1 for names in owners.values())
+    # every partition exists before the source starts, so the symbols spread out
+    counts = sorted(len(received) for received in RECEIVED.values())
+    assert len(counts) == 3
+    assert counts[0] >= 150 // 3 // 2
+
+
+def test_partitioned_reader_cannot_autoscale(tmp_path):
+    sink = dict(SINK, autoscale={"max_instances": 4})
+    executor = YamlPipelineExecutor(_write_pipeline(tmp_path, [SOURCE, sink]))
+    with pytest.raises(PipelineValidationError):
+        executor._load_pipeline()
+
+
+def test_partitioned_queue_needs_a_reader(tmp_path):
+    executor = YamlPipelineExecutor(_write_pipeline(tmp_path, [SOURCE]))
+    with pytest.raises(PipelineValidationError):
+        executor._load_pipeline()
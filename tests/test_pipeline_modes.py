@@ -0,0 +1,108 @@
+import threading
+
+import pytest
+import yaml
+
+from benchmarks.mock_server import make_symbols
+from yaml_reader import YamlPipelineExecutor
+
+RECEIVED = []
+
+
+class RecordingSink(threading.Thread):
+    def __init__(self, input_queue, **kwargs):
+        kwargs.pop('output_queues', None)
+        kwargs.pop('metrics', None)
+        self._input_queue = input_queue
+        super(RecordingSink, self).__init__()
+        self.start()
+
+    def run(self):
+        while True:
+            val = self._input_queue.get()
+            if val == 'DONE':
+                break
+            RECEIVED.append(val)
+
+
+def _executor(tmp_path, queues, workers):
+    path = tmp_path / "pipeline.yaml"
+    path.write_text(yaml.safe_dump({"queues": queues, "workers": workers}))
+    return YamlPipelineExecutor(str(path))
+
+
+def _worker(name, cls, location="x", **fields):
+    return dict({"name": name, "location": location, "class": cls}, **fields)
+
+
+@pytest.mark.parametrize("queue_def, workers, expected", [
+    ({"name": "Q"}, [], "thread"),
+    ({"name": "Q", "type": "simple"}, [], "simple"),
+    ({"name": "Q"}, [_worker("P", "x", mode="process", input_queue="Q")], "process"),
+    ({"name": "Q", "type": "process"}, [], "process"),
+], ids=["default", "simple", "process-worker", "explicit-process"])
+def test_queue_type(tmp_path, queue_def, workers, expected):
+    executor = _executor(tmp_path, [queue_def], workers)
+    executor._yaml_data = {"queues": [queue_def], "workers": workers}
+    assert executor._queue_type(queue_def) == expected
+
+
+@pytest.mark.parametrize("queue_def, workers", [
+    ({"name": "Q", "type": "deque"}, []),
+    ({"name": "Q", "type": "thread"}, [_worker("P", "x", mode="process", input_queue="Q")]),
+], ids=["unknown", "thread-for-process-worker"])
+def test_queue_type_rejects(tmp_path, queue_def, workers):
+    executor = _executor(tmp_path, [queue_def], workers)
+    executor._yaml_data = {"queues": [queue_def], "workers": workers}
+    with pytest.raises(ValueError):
+        executor._queue_type(queue_def)
+
+
+def test_simple_queue_cannot_be_bounded(tmp_path):
+    executor = _executor(tmp_path, [], [])
+    executor._yaml_data = {"queues": [{"name": "Q", "type": "simple", "maxsize": 5}], "workers": []}
+    with pytest.raises(ValueError):
+        executor._init_queues()
+
+
+@pytest.mark.parametrize("symbol_queue_type", ["thread", "simple", "process"])
+def test_pipeline_runs_with_each_queue_type(tmp_path, market, symbol_queue_type):
+    RECEIVED.clear()
+    executor = _executor(tmp_path, [{"name": "Symbols", "type": symbol_queue_type}, {"name": "Prices"}], [
+        _worker("Wiki", "WikiWorkerScheduler", "Workers.WikiWorker",
+                input_values=[f"{market.base_url}/wiki/constituents"], output_queues=["Symbols"]),
+        _worker("Yahoo", "YahooFinancePriceScheduler", "Workers.YahooFinanceWorkers", instances=3,
+                input_queue="Symbols", output_queues=["Prices"],
+                parameters={"base_url": f"{market.base_url}/quote/", "request_delay": 0}),
+        _worker("Sink", "RecordingSink", __name__, input_queue="Prices"),
+    ])
+    executor.start()
+    executor.join(30)
+    assert not executor.is_alive()
+    assert sorted(symbol for symbol, _, _ in RECEIVED) == make_symbols(20)
+
+
+def test_process_mode_parsers(tmp_path, market):
+    RECEIVED.clear()
+    executor = _executor(tmp_path, [{"name": "WikiPages"}, {"name": "Symbols"},
+                                    {"name": "QuotePages"}, {"name": "Prices"}], [
+        _worker("Wiki", "WikiWorkerScheduler", "Workers.WikiWorker",
+                input_values=[f"{market.base_url}/wiki/constituents"], output_queues=["WikiPages"],
+                parameters={"emit": "html"}),
+        _worker("WikiParser", "HtmlParserScheduler", "Workers.ParserWorkers", mode="process",
+                input_queue="WikiPages", output_queues=["Symbols"], parameters={"parser": "wiki_symbols"}),
+        _worker("Yahoo", "YahooFinancePriceScheduler", "Workers.YahooFinanceWorkers", instances=3,
+                input_queue="Symbols", output_queues=["QuotePages"],
+                parameters={"base_url": f"{market.base_url}/quote/", "emit": "html", "request_delay": 0}),
+        _worker("YahooParser", "HtmlParserScheduler", "Workers.ParserWorkers", mode="process", instances=2,
+                input_queue="QuotePages", output_queues=["Prices"], parameters={"parser": "yahoo_price"}),
+        _worker("Sink", "RecordingSink", __name__, input_queue="Prices"),
+    ])
+    executor._load_pipeline()
+    assert executor._queue_type({"name": "QuotePages"}) == "process"
+    assert executor._queue_type({"name": "Prices"}) == "process"
+    executor.start()
+    executor.join(60)
+    assert not executor.is_alive()
+    assert sorted(symbol for symbol, _, _ in RECEIVED) == make_symbols(20)
+    assert all(isinstance(price, float) for _, price, _ in RECEIVED)
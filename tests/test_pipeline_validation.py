@@ -0,0 +1,115 @@
+import logging
+import pathlib
+
+import pytest
+import yaml
+
+from yaml_reader import PipelineValidationError, YamlPipelineExecutor
+
+
+def _worker(name, input_queue=None, output_queues=None, **options):
+    worker = {"name": name, "location": "Workers.WikiWorker", "class": "WikiWorkerMasterScheduler"}
+    if input_queue is not None:
+        worker["input_queue"] = input_queue
+    if output_queues is not None:
+        worker["output_queues"] = output_queues
+    worker.update(options)
+    return worker
+
+
+def _queues(*names, **options):
+    return [dict({"name": name}, **options.get(name, {})) for name in names]
+
+
+def _load(tmp_path, queues, workers, **extra):
+    path = tmp_path / "pipeline.yaml"
+    path.write_text(yaml.safe_dump(dict({"queues": queues, "workers": workers}, **extra)))
+    executor = YamlPipelineExecutor(str(path))
+    executor._load_pipeline()
+    return executor
+
+
+INVALID_PIPELINES = {
+    "duplicate queue": (
+        _queues("A", "A"),
+        [_worker("Source", output_queues=["A"]), _worker("Sink", input_queue="A")],
+        {}, "Queues declared more than once"),
+    "worker without a name": (
+        _queues("A"),
+        [_worker("Source", output_queues=["A"]), {"input_queue": "A"}],
+        {}, "Every worker needs a name"),
+    "duplicate worker": (
+        _queues("A"),
+        [_worker("Source", output_queues=["A"]), _worker("Source", input_queue="A")],
+        {}, "Workers declared more than once"),
+    "unknown input queue": (
+        _queues("A"),
+        [_worker("Source", output_queues=["A"]), _worker("Sink", input_queue="B")],
+        {}, "unknown queue 'B'"),
+    "unknown output queue": (
+        _queues("A"),
+        [_worker("Source", output_queues=["A", "B"]), _worker("Sink", input_queue="A")],
+        {}, "unknown queue 'B'"),
+    "stage without queues": (
+        _queues("A"),
+        [_worker("Source", output_queues=["A"]), _worker("Sink", input_queue="A"), _worker("Idle")],
+        {}, "neither an input nor an output queue"),
+    "unknown fan_out": (
+        _queues("A"),
+        [_worker("Source", output_queues=["A"], fan_out="random"), _worker("Sink", input_queue="A")],
+        {}, "unknown fan_out 'random'"),
+    "unfed input": (
+        _queues("A", "B"),
+        [_worker("Source", output_queues=["A"]), _worker("Sink", input_queue="B")],
+        {}, "reads B, which no worker puts to"),
+    "durable without checkpoint": (
+        _queues("A", A={"durable": True}),
+        [_worker("Source", output_queues=["A"]), _worker("Sink", input_queue="A")],
+        {}, "needs a checkpoint entry"),
+    "durable reader with a plain output": (
+        _queues("A", "B", A={"durable": True}),
+        [_worker("Source", output_queues=["A"]), _worker("Middle", input_queue="A", output_queues=["B"]),
+         _worker("Sink", input_queue="B")],
+        {"checkpoint": {"path": "checkpoint.db"}}, "output queues \\['B'\\] must be durable too"),
+    "cycle": (
+        _queues("A", "B", "C"),
+        [_worker("Source", output_queues=["A"]), _worker("First", input_queue="A", output_queues=["B"]),
+         _worker("Second", input_queue="B", output_queues=["C"]), _worker("Third", input_queue="C", output_queues=["A"])],
+        {}, "cycle: First -> Second -> Third -> First"),
+    "self loop": (
+        _queues("A", "B"),
+        [_worker("Source", output_queues=["A"]), _worker("Loop", input_queue="A", output_queues=["A", "B"]),
+         _worker("Sink", input_queue="B")],
+        {}, "cycle: Loop -> Loop"),
+}
+
+
+@pytest.mark.parametrize("queues, workers, extra, message",
+                         list(INVALID_PIPELINES.values()), ids=list(INVALID_PIPELINES))
+def test_invalid_pipeline(tmp_path, queues, workers, extra, message):
+    with pytest.raises(PipelineValidationError, match=message):
+        _load(tmp_path, queues, workers, **extra)
+
+
+def test_valid_pipeline(tmp_path):
+    executor = _load(tmp_path, _queues("A", "B", "C"), [
+        _worker("Source", output_queues=["A", "B"]),
+        _worker("Left", input_queue="A", output_queues=["C"]),
+        _worker("Right", input_queue="B", output_queues=["C"]),
+        _worker("Sink", input_queue="C"),
+    ])
+    assert executor._queue_producers["C"] == {"Left", "Right"}
+    assert executor._queue_readers["A"] == {"Left"}
+
+
+def test_unused_and_unread_queues_warn(tmp_path, caplog):
+    with caplog.at_level(logging.WARNING):
+        _load(tmp_path, _queues("A", "Unused"), [_worker("Source", output_queues=["A"])])
+    assert "queue Unused is not used by any worker" in caplog.text
+    assert "nothing reads queue A" in caplog.text
+
+
+@pytest.mark.parametrize("location", sorted((pathlib.Path(__file__).parent.parent / "pipelines").glob("*.yaml")),
+                         ids=lambda location: location.name)
+def test_shipped_pipeline_is_valid(location):
+    YamlPipelineExecutor(str(location))._load_pipeline()
@@ -0,0 +1,82 @@
+import collections
+import queue
+import threading
+import time
+from datetime import datetime
+
+from benchmarks.mock_server import make_constituents_page, make_symbols
+from utils.cache import get_price_cache
+from Workers.WikiWorker import SymbolPollingScheduler
+
+
+class RecordingQueue(queue.Queue):
+    """Queue remembering when each symbol was put."""
+
+    def __init__(self):
+        super(RecordingQueue, self).__init__()
+        self.sent = collections.defaultdict(list)
+
+    def put(self, item, block=True, timeout=None):
+        self.sent[item].append(time.monotonic())
+        super(RecordingQueue, self).put(item, block, timeout)
+
+
+def _poll(market, output_queue, **parameters):
+    return SymbolPollingScheduler([output_queue], input_values=[f"{market.base_url}/wiki/constituents"],
+                                  **parameters)
+
+
+def test_every_symbol_is_sent_once_per_interval(market):
+    output_queue = RecordingQueue()
+    poller = _poll(market, output_queue, interval=0.4, duration=1.0)
+    poller.join(10)
+    assert sorted(output_queue.sent) == make_symbols(20)
+    for times in output_queue.sent.values():
+        assert len(times) >= 2
+        gaps = [later - earlier for earlier, later in zip(times, times[1:])]
+        assert min(gaps) >= 0.35
+
+
+def test_sends_are_spread_over_the_interval(market):
+    output_queue = RecordingQueue()
+    poller = _poll(market, output_queue, interval=0.5, duration=0.45)
+    poller.join(10)
+    first_sends = sorted(times[0] for times in output_queue.sent.values())
+    # staggered by slot, not one burst
+    assert first_sends[-1] - first_sends[0] > 0.2
+
+
+def test_refresh_is_retried_while_no_symbols_are_known(market):
+    constituents_page = market.constituents_page
+    market.constituents_page = make_constituents_page([])
+    output_queue = RecordingQueue()
+    poller = _poll(market, output_queue, interval=0.2, refresh_retry=0.05, duration=2.0)
+    time.sleep(0.3)
+    assert not output_queue.sent
+    market.constituents_page = constituents_page
+    poller.join(10)
+    assert sorted(output_queue.sent) == make_symbols(20)
+
+
+def test_recently_priced_symbols_wait(market, tmp_path):
+    path = str(tmp_path / "prices.sqlite")
+    price_cache = get_price_cache(60, 100, path)
+    fresh = set(make_symbols(5))
+    for symbol in fresh:
+        price_cache.put(symbol, [1.0, datetime.utcnow().isoformat()])
+    output_queue = RecordingQueue()
+    started = time.monotonic()
+    poller = _poll(market, output_queue, interval=1, duration=1.5,
+                   price_cache_ttl=60, price_cache_path=path)
+    poller.join(10)
+    # every slot comes up within the first interval, but a fresh price is not a second old yet
+    first_sends = {symbol: times[0] - started for symbol, times in output_queue.sent.items()}
+    assert set(make_symbols(20)) - fresh <= set(first_sends)
+    assert all(first_sends[symbol] >= 1.0 for symbol in fresh & set(first_sends))
+
+
+def test_stop_ends_the_run(market):
+    poller = _poll(market, RecordingQueue(), interval=10)
+    threading.Timer(0.2, poller.stop).start()
+    poller.join(5)
+    assert not poller.is_alive()
@@ -0,0 +1,38 @@
+import datetime
+
+import pytest
+
+from Workers.PostgresWorkers import LastPriceIndex, PostgresWorker
+
+MORNING = datetime.datetime(2024, 5, 17, 9)
+NOON = datetime.datetime(2024, 5, 17, 12)
+
+
+def test_selected_change_is_not_selected_twice():
+    index = LastPriceIndex()
+    rows = [("A", 1.0, NOON), ("B", 2.0, NOON)]
+    first, _ = index.select_changed(rows)
+    second, _ = index.select_changed(rows)
+    assert first == rows
+    assert second == []
+
+
+def test_released_change_is_selected_again():
+    index = LastPriceIndex()
+    index.commit(index.select_changed([("A", 1.0, MORNING)])[0])
+    changed, previous = index.select_changed([("A", 2.0, NOON), ("B", 3.0, NOON)])
+    index.release(changed, previous)
+    assert index.select_changed([("A", 2.0, NOON), ("B", 3.0, NOON)])[0] == changed
+    assert index.select_changed([("A", 1.0, NOON)])[0] == [("A", 1.0, NOON)]
+
+
+def test_latest_rows_keeps_the_newest_per_symbol():
+    rows = [("A", 2.0, NOON), ("A", 1.0, MORNING), ("B", 3.0, MORNING)]
+    assert sorted(PostgresWorker._latest_rows(rows)) == [("A", 2.0, NOON), ("B", 3.0, MORNING)]
+
+
+@pytest.mark.parametrize("paramstyle", ["named", "format"])
+def test_upsert_never_moves_latest_price_back(paramstyle):
+    # a late, older price must not replace a newer one in latest_prices
+    query = " ".join(PostgresWorker(None)._create_upsert_query(paramstyle).split())
+    assert query.endswith("WHERE latest_prices.ingest_date <= excluded.ingest_date")
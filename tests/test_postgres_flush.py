@@ -0,0 +1,82 @@
+import datetime
+import logging
+import queue
+import time
+
+import pytest
+from sqlalchemy import text
+
+from Workers.PostgresWorkers import PostgresMasterSchedule, get_engine
+
+NOON = datetime.datetime(2024, 5, 17, 12)
+
+
+@pytest.fixture
+def database(tmp_path):
+    """SQLite stand-in for Postgres: the plain insert path is the same SQL."""
+    connection_string = f"sqlite:///{tmp_path / 'prices.db'}"
+    with get_engine(connection_string).begin() as connection:
+        connection.execute(text("CREATE TABLE prices (symbol TEXT, price REAL, ingest_date TIMESTAMP)"))
+    return connection_string
+
+
+def _count(connection_string):
+    with get_engine(connection_string).connect() as connection:
+        return connection.execute(text("SELECT count(*) FROM prices")).scalar()
+
+
+def _wait_for_rows(connection_string, count, timeout=3):
+    deadline = time.monotonic() + timeout
+    while _count(connection_string) < count and time.monotonic() < deadline:
+        time.sleep(0.02)
+    return _count(connection_string)
+
+
+def _put_rows(input_queue, count):
+    for i in range(count):
+        input_queue.put((f"SYM{i}", float(i), NOON))
+
+
+def test_flushes_a_full_batch(database):
+    input_queue = queue.Queue()
+    sink = PostgresMasterSchedule(input_queue, connection_string=database, batch_size=5, flush_interval=60)
+    _put_rows(input_queue, 7)
+    assert _wait_for_rows(database, 5) == 5
+    time.sleep(0.1)
+    assert _count(database) == 5   # the other two wait for a full batch
+    input_queue.put('DONE')
+    sink.join(5)
+    assert _count(database) == 7
+
+
+def test_flushes_a_partial_batch_after_flush_interval(database):
+    input_queue = queue.Queue()
+    sink = PostgresMasterSchedule(input_queue, connection_string=database, batch_size=100, flush_interval=0.1)
+    _put_rows(input_queue, 2)
+    assert _wait_for_rows(database, 2) == 2
+    assert sink.is_alive()
+    input_queue.put('DONE')
+    sink.join(5)
+
+
+def test_flushes_on_done(database):
+    input_queue = queue.Queue()
+    _put_rows(input_queue, 3)
+    input_queue.put('DONE')
+    sink = PostgresMasterSchedule(input_queue, connection_string=database, batch_size=100, flush_interval=60)
+    sink.join(5)
+    assert not sink.is_alive()
+    assert _count(database) == 3
+
+
+def test_failed_flush_is_not_logged_as_flushed(tmp_path, caplog):
+    input_queue = queue.Queue()
+    _put_rows(input_queue, 3)
+    input_queue.put('DONE')
+    with caplog.at_level(logging.INFO, logger="Workers.PostgresWorkers"):
+        # no prices table: the insert fails
+        sink = PostgresMasterSchedule(input_queue, connection_string=f"sqlite:///{tmp_path / 'empty.db'}")
+        sink.join(5)
+    messages = [record.getMessage() for record in caplog.records]
+    assert not any("flushed" in message for message in messages)
+    assert any("failed to flush 3 rows" in message for message in messages)
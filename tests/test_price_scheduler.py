@@ -0,0 +1,35 @@
+import queue
+import time
+
+from benchmarks.mock_server import make_symbols
+from tests.conftest import drain
+from utils.http_session import get_session_pool
+from Workers.YahooFinanceWorkers import YahooFinancePriceScheduler
+
+
+def test_request_delay_zero_does_not_pause(market):
+    input_queue, output_queue = queue.Queue(), queue.Queue()
+    for symbol in make_symbols(20) + ['DONE']:
+        input_queue.put(symbol)
+    started = time.monotonic()
+    scheduler = YahooFinancePriceScheduler(input_queue, [output_queue], request_delay=0,
+                                           base_url=f"{market.base_url}/quote/")
+    scheduler.join(10)
+    # the default pauses up to a second after every symbol
+    assert time.monotonic() - started < 2
+    output_queue.put('DONE')
+    assert [symbol for symbol, _, _ in drain(output_queue)] == make_symbols(20)
+
+
+def test_finished_scheduler_releases_its_session(market):
+    input_queue, output_queue = queue.Queue(), queue.Queue()
+    for symbol in make_symbols(3) + ['DONE']:
+        input_queue.put(symbol)
+    # a pool size no other test uses, so the process wide pool is this test's own
+    session_pool = get_session_pool(pool_maxsize=7)
+    scheduler = YahooFinancePriceScheduler(input_queue, [output_queue], request_delay=0, pool_maxsize=7,
+                                           base_url=f"{market.base_url}/quote/")
+    scheduler.join(10)
+    assert session_pool._sessions == []
+    stats = session_pool.stats()
+    assert stats["connection_hits"] + stats["connection_misses"] == 3
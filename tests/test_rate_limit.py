@@ -0,0 +1,51 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from utils.rate_limit import TokenBucket, get_token_bucket
+
+
+def test_burst_then_rate():
+    bucket = TokenBucket(rate=50, capacity=5)
+    started = time.monotonic()
+    for _ in range(5):
+        bucket.take()
+    assert time.monotonic() - started < 0.05
+    for _ in range(10):
+        bucket.take()
+    assert time.monotonic() - started >= 10 / 50 * 0.9
+
+
+def test_threads_share_the_rate():
+    bucket = TokenBucket(rate=100, capacity=1)
+    threads = [threading.Thread(target=lambda: [bucket.take() for _ in range(10)]) for _ in range(3)]
+    started = time.monotonic()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert time.monotonic() - started >= 29 / 100 * 0.9
+
+
+def test_coroutines_wait_for_tokens():
+    bucket = TokenBucket(rate=100, capacity=1)
+
+    async def take_all():
+        await asyncio.gather(*(bucket.wait() for _ in range(20)))
+
+    started = time.monotonic()
+    asyncio.run(take_all())
+    assert time.monotonic() - started >= 19 / 100 * 0.9
+
+
+def test_rate_must_be_positive():
+    with pytest.raises(ValueError):
+        TokenBucket(0)
+
+
+def test_one_bucket_per_host():
+    first = get_token_bucket("rate-limit-test:1", 10)
+    assert get_token_bucket("rate-limit-test:1", 999) is first
+    assert get_token_bucket("rate-limit-test:2", 10) is not first
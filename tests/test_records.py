@@ -0,0 +1,50 @@
+import datetime
+import multiprocessing
+import pickle
+
+from utils.records import PriceBatch
+
+ROWS = [
+    ("AAPL", 189.87, datetime.datetime(2024, 5, 17, 14, 30, 0, 123456)),
+    ("MSFT", None, datetime.datetime(2024, 5, 17, 14, 30, 1)),
+    ("GOOG", 176.06, datetime.datetime(1999, 12, 31, 23, 59, 59)),
+    ("AAPL", 190.01, datetime.datetime(2024, 5, 17, 14, 31, 0)),
+]
+
+
+def test_iteration_gives_back_the_rows():
+    batch = PriceBatch.from_rows(ROWS)
+    assert len(batch) == 4
+    assert list(batch) == ROWS
+    assert list(batch)[1][1] is None
+
+
+def test_empty_batch():
+    batch = PriceBatch()
+    assert len(batch) == 0
+    assert list(batch) == []
+    assert list(pickle.loads(pickle.dumps(batch))) == []
+
+
+def test_pickle_round_trip():
+    batch = PriceBatch.from_rows(ROWS)
+    restored = pickle.loads(pickle.dumps(batch))
+    assert isinstance(restored, PriceBatch)
+    assert len(restored) == len(batch)
+    assert list(restored) == ROWS
+    # symbols are interned again on the way in
+    assert restored.symbols[0] is restored.symbols[3]
+
+
+def test_round_trip_through_a_process_queue():
+    queue = multiprocessing.Queue()
+    queue.put(PriceBatch.from_rows(ROWS))
+    assert list(queue.get(timeout=5)) == ROWS
+
+
+def test_split_keeps_order_within_each_part():
+    parts = PriceBatch.from_rows(ROWS).split(lambda symbol: symbol[0])
+    assert sorted(parts) == ["A", "G", "M"]
+    assert list(parts["A"]) == [ROWS[0], ROWS[3]]
+    assert list(parts["M"]) == [ROWS[1]]
+    assert sum(len(part) for part in parts.values()) == len(ROWS)
@@ -0,0 +1,123 @@
+import time
+
+import pytest
+import requests
+
+from utils.resilience import CircuitBreaker, RetryBudget, RetryPolicy
+
+# breakers are per host and process wide; a high min_requests keeps them
+# out of the way in the retry tests
+NO_BREAKER = {"min_requests": 1000}
+
+
+def _quote_url(market, symbol="SYM0000"):
+    return f"{market.base_url}/quote/{symbol}"
+
+
+def test_retries_until_success(market):
+    market.error_rate = 1.0
+    policy = RetryPolicy(max_retries=3, backoff_base=0.01, budget=RetryBudget(min_retries=10),
+                         breaker_settings=NO_BREAKER)
+    session = requests.Session()
+    assert policy.get(session, _quote_url(market)).status_code == 503
+    assert market.failures == 4
+
+    market.error_rate = 0.0
+    assert policy.get(session, _quote_url(market)).status_code == 200
+
+
+def test_retry_budget_caps_retries(market):
+    market.error_rate = 1.0
+    budget = RetryBudget(ratio=0.0, min_retries=2)
+    policy = RetryPolicy(max_retries=5, backoff_base=0.01, budget=budget, breaker_settings=NO_BREAKER)
+    session = requests.Session()
+    policy.get(session, _quote_url(market))
+    policy.get(session, _quote_url(market))
+    # two retries for the whole budget, then every request gets one attempt
+    assert market.failures == 4
+    assert budget.exhausted == 2
+
+
+def test_retry_after_is_honoured(market):
+    market.error_rate = 1.0
+    market.error_status = 429
+    policy = RetryPolicy(max_retries=1, backoff_base=0.01, budget=RetryBudget(min_retries=10),
+                         breaker_settings=NO_BREAKER)
+    started = time.monotonic()
+    assert policy.get(requests.Session(), _quote_url(market)).status_code == 429
+    assert time.monotonic() - started >= 1.0
+    assert market.failures == 2
+
+
+def test_stalled_requests_time_out_and_are_retried(market):
+    market.stall_rate = 1.0
+    market._stall = 2.0
+    policy = RetryPolicy(read_timeout=0.2, max_retries=1, backoff_base=0.01,
+                         budget=RetryBudget(min_retries=10), breaker_settings=NO_BREAKER)
+    started = time.monotonic()
+    with pytest.raises(requests.Timeout):
+        policy.get(requests.Session(), _quote_url(market))
+    assert time.monotonic() - started < 1.5
+
+
+def test_breaker_opens_probes_and_closes(market):
+    market.error_rate = 1.0
+    policy = RetryPolicy(max_retries=0, budget=RetryBudget(min_retries=10),
+                         breaker_settings={"window": 4, "min_requests": 4, "reset_timeout": 0.3})
+    url = _quote_url(market)
+    session = requests.Session()
+    for _ in range(4):
+        policy.get(session, url)
+    breaker = policy.breaker(url)
+    assert breaker.state == "open"
+    assert policy.wait_time(url) > 0
+
+    # after reset_timeout one probe goes through; a failing probe opens it again
+    time.sleep(0.3)
+    policy.get(session, url)
+    assert breaker.state == "open"
+    assert breaker.opened == 2
+
+    market.error_rate = 0.0
+    time.sleep(0.3)
+    assert policy.get(session, url).status_code == 200
+    assert breaker.state == "closed"
+
+
+def test_half_open_breaker_lets_one_probe_through():
+    breaker = CircuitBreaker("example", window=2, min_requests=2, reset_timeout=0.05)
+    breaker.record(False)
+    breaker.record(False)
+    assert breaker.state == "open"
+    time.sleep(0.05)
+    assert breaker.wait_time() == 0
+    assert breaker.state == "half_open"
+    assert breaker.wait_time() > 0   # a second caller waits for the probe
+    breaker.record(True)
+    assert breaker.state == "closed"
+
+
+class ExplodingSession():
+    def get(self, url, **kwargs):
+        raise RuntimeError("not a requests error")
+
+
+def test_probe_that_raises_does_not_wedge_the_breaker(market):
+    market.error_rate = 1.0
+    policy = RetryPolicy(max_retries=0, budget=RetryBudget(min_retries=10),
+                         breaker_settings={"window": 2, "min_requests": 2, "reset_timeout": 0.1})
+    url = _quote_url(market)
+    for _ in range(2):
+        policy.get(requests.Session(), url)
+    breaker = policy.breaker(url)
+    assert breaker.state == "open"
+
+    time.sleep(0.1)
+    with pytest.raises(RuntimeError):
+        policy.get(ExplodingSession(), url)
+    # the failed probe opened the breaker again instead of leaving it half open
+    assert breaker.state == "open"
+    market.error_rate = 0.0
+    time.sleep(0.1)
+    assert policy.get(requests.Session(), url).status_code == 200
+    assert breaker.state == "closed"
@@ -0,0 +1,291 @@
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+
+class DiskResponseCache():
+    """On-disk cache of HTTP response bodies with conditional revalidation.
+
+    Each URL is stored as a body file plus a small JSON file holding its
+    ``ETag``/``Last-Modified`` validators. A cached entry younger than
+    ``ttl`` seconds is returned without any request; an older one is
+    revalidated with ``If-None-Match``/``If-Modified-Since`` and a ``304``
+    answer reuses the stored body.
+    """
+
+    def __init__(self, directory, ttl=0):
+        self._directory = directory
+        self._ttl = ttl
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.revalidated = 0
+        self.misses = 0
+        os.makedirs(directory, exist_ok=True)
+
+    def _paths(self, url):
+        key = hashlib.sha256(url.encode("utf-8")).hexdigest()
+        base = os.path.join(self._directory, key)
+        return base + ".body", base + ".json"
+
+    def _count(self, name):
+        with self._lock:
+            setattr(self, name, getattr(self, name) + 1)
+
+    def _lookup(self, url):
+        """Return ``(body_path, meta_path, meta, fresh)`` for ``url``; ``meta``
+        is ``None`` when nothing is cached."""
+        body_path, meta_path = self._paths(url)
+        meta = None
+        if os.path.exists(body_path) and os.path.exists(meta_path):
+            with open(meta_path, "r", encoding="utf-8") as infile:
+                meta = json.load(infile)
+        fresh = meta is not None and time.time() - meta["stored_at"] < self._ttl
+        return body_path, meta_path, meta, fresh
+
+    @staticmethod
+    def _revalidation_headers(meta, headers):
+        request_headers = dict(headers or {})
+        if meta is not None:
+            if meta.get("etag"):
+                request_headers["If-None-Match"] = meta["etag"]
+            if meta.get("last_modified"):
+                request_headers["If-Modified-Since"] = meta["last_modified"]
+        return request_headers
+
+    def _mark_revalidated(self, meta_path, meta):
+        self._count("revalidated")
+        meta["stored_at"] = time.time()
+        self._write(meta_path, json.dumps(meta).encode("utf-8"))
+
+    def _write_meta(self, meta_path, url, response):
+        self._write(meta_path, json.dumps({
+            "url": url,
+            "etag": response.headers.get("ETag"),
+            "last_modified": response.headers.get("Last-Modified"),
+            "stored_at": time.time(),
+        }).encode("utf-8"))
+
+    def fetch(self, session, url, headers=None):
+        """Return the body of ``url`` as bytes, or ``None`` on a non-200 answer."""
+        body_path, meta_path, meta, fresh = self._lookup(url)
+        if fresh:
+            self._count("hits")
+            with open(body_path, "rb") as infile:
+                return infile.read()
+
+        response = session.get(url, headers=self._revalidation_headers(meta, headers))
+        if response.status_code == 304 and meta is not None:
+            self._mark_revalidated(meta_path, meta)
+            with open(body_path, "rb") as infile:
+                return infile.read()
+        if response.status_code != 200:
+            return None
+
+        self._count("misses")
+        self._write(body_path, response.content)
+        self._write_meta(meta_path, url, response)
+        return response.content
+
+    def stream(self, session, url, headers=None, chunk_size=64 * 1024):
+        """Yield the body of ``url`` in chunks; nothing on a non-200 answer.
+
+        Same caching as ``fetch``, but a download is passed on chunk by
+        chunk while it is written to the cache, and stored once complete.
+        When the reader closes the generator early, the rest of the body is
+        still read, so only whole pages are cached.
+        """
+        body_path, meta_path, meta, fresh = self._lookup(url)
+        if fresh:
+            self._count("hits")
+        else:
+            response = session.get(url, headers=self._revalidation_headers(meta, headers), stream=True)
+            try:
+                if response.status_code == 304 and meta is not None:
+                    self._mark_revalidated(meta_path, meta)
+                elif response.status_code != 200:
+                    return
+                else:
+                    self._count("misses")
+                    yield from self._download(response, url, body_path, meta_path, chunk_size)
+                    return
+            finally:
+                response.close()
+
+        with open(body_path, "rb") as infile:
+            for chunk in iter(lambda: infile.read(chunk_size), b""):
+                yield chunk
+
+    def _download(self, response, url, body_path, meta_path, chunk_size):
+        temp_path = f"{body_path}.{threading.get_ident()}.tmp"
+        chunks = response.iter_content(chunk_size=chunk_size)
+        try:
+            with open(temp_path, "wb") as outfile:
+                try:
+                    for chunk in chunks:
+                        outfile.write(chunk)
+                        yield chunk
+                except GeneratorExit:
+                    # the reader is done, finish the page for the cache
+                    for chunk in chunks:
+                        outfile.write(chunk)
+        except BaseException:
+            os.remove(temp_path)
+            raise
+        os.replace(temp_path, body_path)
+        self._write_meta(meta_path, url, response)
+
+    @staticmethod
+    def _write(path, data):
+        # write then rename, so concurrent readers never see half a file
+        temp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(temp_path, "wb") as outfile:
+            outfile.write(data)
+        os.replace(temp_path, path)
+
+    def stats(self):
+        with self._lock:
+            served = self.hits + self.revalidated
+            total = served + self.misses
+            return {"hits": self.hits, "revalidated": self.revalidated, "misses": self.misses,
+                    "hit_ratio": round(served / total, 3) if total else None}
+
+
+class TTLCache():
+    """Thread-safe in-memory cache with per-entry expiry and LRU eviction."""
+
+    def __init__(self, ttl, maxsize=10000):
+        self._ttl = ttl
+        self._maxsize = maxsize
+        self._entries = OrderedDict()   # key -> (stored_at, value)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        """Return the cached value for ``key`` or ``None`` if absent or expired."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or time.monotonic() - entry[0] >= self._ttl:
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, key, value):
+        with self._lock:
+            self._entries[key] = (time.monotonic(), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self._maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {"hits": self.hits, "misses": self.misses, "evictions": self.evictions,
+                    "size": len(self._entries),
+                    "hit_ratio": round(self.hits / total, 3) if total else None}
+
+
+class SQLiteTTLCache():
+    """``TTLCache`` backed by a SQLite file, so entries survive between runs.
+
+    Values must be JSON serialisable. Least recently used rows are deleted
+    once the table holds more than ``maxsize`` entries.
+    """
+
+    def __init__(self, path, ttl, maxsize=10000):
+        self._ttl = ttl
+        self._maxsize = maxsize
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        with self._connection:
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS ttl_cache ("
+                " key TEXT PRIMARY KEY, value TEXT NOT NULL,"
+                " stored_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+            )
+
+    def get(self, key):
+        now = time.time()
+        with self._lock, self._connection:
+            row = self._connection.execute(
+                "SELECT value FROM ttl_cache WHERE key = ? AND stored_at > ?", (key, now - self._ttl)
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self._connection.execute("UPDATE ttl_cache SET accessed_at = ? WHERE key = ?", (now, key))
+            self.hits += 1
+            return json.loads(row[0])
+
+    def put(self, key, value):
+        now = time.time()
+        with self._lock, self._connection:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO ttl_cache (key, value, stored_at, accessed_at) VALUES (?, ?, ?, ?)",
+                (key, json.dumps(value), now, now),
+            )
+            size = self._connection.execute("SELECT COUNT(*) FROM ttl_cache").fetchone()[0]
+            if size > self._maxsize:
+                cursor = self._connection.execute(
+                    "DELETE FROM ttl_cache WHERE key IN "
+                    "(SELECT key FROM ttl_cache ORDER BY accessed_at LIMIT ?)", (size - self._maxsize,)
+                )
+                self.evictions += cursor.rowcount
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            size = self._connection.execute("SELECT COUNT(*) FROM ttl_cache").fetchone()[0]
+            return {"hits": self.hits, "misses": self.misses, "evictions": self.evictions,
+                    "size": size, "hit_ratio": round(self.hits / total, 3) if total else None}
+
+
+_caches = {}
+_caches_lock = threading.Lock()
+
+
+def get_response_cache(directory, ttl=0):
+    """Return the process wide ``DiskResponseCache`` for ``directory``."""
+    key = ("response", directory, ttl)
+    with _caches_lock:
+        if key not in _caches:
+            _caches[key] = DiskResponseCache(directory, ttl)
+        return _caches[key]
+
+
+def get_price_cache(ttl, maxsize=10000, path=None):
+    """Return the process wide price cache; SQLite backed when ``path`` is set."""
+    key = ("price", path, ttl, maxsize)
+    with _caches_lock:
+        if key not in _caches:
+            if path is not None:
+                _caches[key] = SQLiteTTLCache(path, ttl, maxsize)
+            else:
+                _caches[key] = TTLCache(ttl, maxsize)
+        return _caches[key]
+
+
+def log_cache_stats():
+    """Log hit ratios of every cache created in this process."""
+    with _caches_lock:
+        caches = dict(_caches)
+    for key, cache in caches.items():
+        logger.info("cache %s stats: %s", key, cache.stats())
@@ -0,0 +1,103 @@
+import logging
+import os
+import pickle
+import sqlite3
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class CheckpointStore():
+    """SQLite file (WAL mode) holding what a pipeline run needs to resume.
+
+    - ``queue_items``: items of the durable queues that have been put but
+      not yet acknowledged by their consumer, in put order.
+    - ``finished_stages``: stages whose instances all exited.
+
+    Rows are kept per ``run_id``, so several pipelines can share a file.
+    Every write is its own transaction; with ``synchronous=NORMAL`` a
+    committed row survives the process being killed.
+    """
+
+    def __init__(self, path, run_id):
+        self.path = path
+        self.run_id = run_id
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        with self._connection:
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.execute("PRAGMA synchronous=NORMAL")
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS queue_items ("
+                " id INTEGER PRIMARY KEY AUTOINCREMENT, run_id TEXT NOT NULL,"
+                " queue TEXT NOT NULL, payload BLOB NOT NULL)"
+            )
+            self._connection.execute(
+                "CREATE INDEX IF NOT EXISTS queue_items_run_queue ON queue_items (run_id, queue, id)"
+            )
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS finished_stages ("
+                " run_id TEXT NOT NULL, stage TEXT NOT NULL, finished_at REAL NOT NULL,"
+                " PRIMARY KEY (run_id, stage))"
+            )
+
+    def append(self, queue_name, item):
+        """Store ``item`` for ``queue_name`` and return its row id."""
+        payload = pickle.dumps(item, pickle.HIGHEST_PROTOCOL)
+        with self._lock, self._connection:
+            cursor = self._connection.execute(
+                "INSERT INTO queue_items (run_id, queue, payload) VALUES (?, ?, ?)",
+                (self.run_id, queue_name, payload),
+            )
+            return cursor.lastrowid
+
+    def delete(self, row_ids):
+        """Forget acknowledged items."""
+        with self._lock, self._connection:
+            self._connection.executemany("DELETE FROM queue_items WHERE id = ?",
+                                         [(row_id,) for row_id in row_ids])
+
+    def pending(self, queue_name):
+        """``(row_id, item)`` of every unacknowledged item of a queue, oldest first."""
+        with self._lock:
+            rows = self._connection.execute(
+                "SELECT id, payload FROM queue_items WHERE run_id = ? AND queue = ? ORDER BY id",
+                (self.run_id, queue_name),
+            ).fetchall()
+        return [(row_id, pickle.loads(payload)) for row_id, payload in rows]
+
+    def clear_queue(self, queue_name):
+        with self._lock, self._connection:
+            self._connection.execute("DELETE FROM queue_items WHERE run_id = ? AND queue = ?",
+                                     (self.run_id, queue_name))
+
+    def finished_stages(self):
+        with self._lock:
+            rows = self._connection.execute(
+                "SELECT stage FROM finished_stages WHERE run_id = ?", (self.run_id,)
+            ).fetchall()
+        return {stage for stage, in rows}
+
+    def mark_finished(self, stage, drained_queues=()):
+        """Record ``stage`` as finished and, in the same transaction, drop
+        what is left of ``drained_queues``, the inputs nobody will read again."""
+        with self._lock, self._connection:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO finished_stages (run_id, stage, finished_at) VALUES (?, ?, ?)",
+                (self.run_id, stage, time.time()),
+            )
+            for queue_name in drained_queues:
+                self._connection.execute("DELETE FROM queue_items WHERE run_id = ? AND queue = ?",
+                                         (self.run_id, queue_name))
+
+    def clear(self):
+        """Forget the run, once it has completed."""
+        with self._lock, self._connection:
+            self._connection.execute("DELETE FROM queue_items WHERE run_id = ?", (self.run_id,))
+            self._connection.execute("DELETE FROM finished_stages WHERE run_id = ?", (self.run_id,))
+
+    def close(self):
+        with self._lock:
+            self._connection.close()
@@ -0,0 +1,71 @@
+import bisect
+import hashlib
+import threading
+
+
+def _hash(value):
+    # stable across processes and runs, unlike hash()
+    return int.from_bytes(hashlib.blake2b(value.encode("utf-8"), digest_size=8).digest(), "big")
+
+
+class HashRing():
+    """Consistent hash ring mapping keys (symbols) to nodes (partitions).
+
+    Every node is placed on the ring ``virtual_nodes`` times so keys spread
+    evenly; adding or removing a node only moves the keys of that node,
+    about ``1 / len(nodes)`` of them, and the same node names always give
+    the same mapping. Lookups are cached until the ring changes.
+    """
+
+    def __init__(self, nodes=(), virtual_nodes=64):
+        self._virtual_nodes = virtual_nodes
+        self._hashes = []
+        self._owners = []
+        self._nodes = set()
+        self._cache = {}
+        self._lock = threading.Lock()
+        for node in nodes:
+            self.add(node)
+
+    @property
+    def nodes(self):
+        with self._lock:
+            return set(self._nodes)
+
+    def __len__(self):
+        return len(self._nodes)
+
+    def add(self, node):
+        with self._lock:
+            if node in self._nodes:
+                return
+            self._nodes.add(node)
+            for replica in range(self._virtual_nodes):
+                point = _hash(f"{node}#{replica}")
+                index = bisect.bisect(self._hashes, point)
+                self._hashes.insert(index, point)
+                self._owners.insert(index, node)
+            self._cache.clear()
+
+    def remove(self, node):
+        with self._lock:
+            if node not in self._nodes:
+                return
+            self._nodes.discard(node)
+            kept = [(point, owner) for point, owner in zip(self._hashes, self._owners) if owner != node]
+            self._hashes = [point for point, _ in kept]
+            self._owners = [owner for _, owner in kept]
+            self._cache.clear()
+
+    def get(self, key):
+        """Return the node owning ``key``; raises ``LookupError`` when empty."""
+        with self._lock:
+            node = self._cache.get(key)
+            if node is not None:
+                return node
+            if not self._hashes:
+                raise LookupError("hash ring has no nodes")
+            index = bisect.bisect(self._hashes, _hash(str(key))) % len(self._hashes)
+            node = self._owners[index]
+            self._cache[key] = node
+            return node
@@ -0,0 +1,131 @@
+import logging
+import threading
+
+import requests
+from requests.adapters import HTTPAdapter
+
+logger = logging.getLogger(__name__)
+
+try:
+    import brotli  # noqa: F401  urllib3 only decodes br responses when installed
+    ACCEPT_ENCODING = "gzip, deflate, br"
+except ImportError:
+    ACCEPT_ENCODING = "gzip, deflate"
+
+
+class SessionPool():
+    """Keep-alive ``requests`` sessions handed out one per thread.
+
+    ``requests.Session`` is not safe to share between threads, so every
+    thread that calls ``get_session`` gets its own session; each session
+    keeps up to ``pool_maxsize`` open connections per host, for up to
+    ``pool_connections`` hosts. Session reuse and connection reuse are
+    counted so they can be logged with ``log_stats``. A thread that is done
+    calls ``release`` to close its session.
+    """
+
+    def __init__(self, pool_connections=10, pool_maxsize=10, headers=None):
+        self._pool_connections = pool_connections
+        self._pool_maxsize = pool_maxsize
+        self._headers = {"Accept-Encoding": ACCEPT_ENCODING}
+        if headers:
+            self._headers.update(headers)
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._sessions = []
+        self._session_hits = 0
+        self._session_misses = 0
+        self._released_requests = 0      # counted from sessions already closed
+        self._released_connections = 0
+
+    def get_session(self):
+        """Return the calling thread's session, creating it on first use."""
+        session = getattr(self._local, "session", None)
+        if session is not None:
+            with self._lock:
+                self._session_hits += 1
+            return session
+
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=self._pool_connections,
+                              pool_maxsize=self._pool_maxsize)
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        session.headers.update(self._headers)
+        self._local.session = session
+        with self._lock:
+            self._session_misses += 1
+            self._sessions.append(session)
+        return session
+
+    def release(self):
+        """Close the calling thread's session and drop it from the pool.
+
+        Schedulers call this when they exit; the pool is process wide, so it
+        would otherwise keep every finished thread's session and its open
+        connections. The thread gets a new session if it asks again.
+        """
+        session = getattr(self._local, "session", None)
+        if session is None:
+            return
+        del self._local.session
+        requests_made, connections_opened = _connection_counts(session)
+        with self._lock:
+            self._sessions.remove(session)
+            self._released_requests += requests_made
+            self._released_connections += connections_opened
+        session.close()
+
+    def stats(self):
+        """Return session and connection hit/miss counts.
+
+        A connection hit is a request served over an already open
+        connection, a miss is a request that had to open a new one.
+        """
+        with self._lock:
+            sessions = list(self._sessions)
+            stats = {"session_hits": self._session_hits,
+                     "session_misses": self._session_misses}
+            requests_made = self._released_requests
+            connections_opened = self._released_connections
+        for session in sessions:
+            session_requests, session_connections = _connection_counts(session)
+            requests_made += session_requests
+            connections_opened += session_connections
+        stats["connection_hits"] = max(0, requests_made - connections_opened)
+        stats["connection_misses"] = connections_opened
+        return stats
+
+    def log_stats(self):
+        logger.info("HTTP session pool stats: %s", self.stats())
+
+
+def _connection_counts(session):
+    """Return ``(requests made, connections opened)`` over a session's pools."""
+    requests_made = 0
+    connections_opened = 0
+    for adapter in set(session.adapters.values()):
+        pools = adapter.poolmanager.pools
+        for key in list(pools.keys()):
+            try:
+                pool = pools[key]
+            except KeyError:
+                continue
+            requests_made += pool.num_requests
+            connections_opened += pool.num_connections
+    return requests_made, connections_opened
+
+
+_session_pools = {}
+_session_pools_lock = threading.Lock()
+
+
+def get_session_pool(pool_connections=10, pool_maxsize=10):
+    """Return the process wide ``SessionPool`` for the given pool sizes."""
+    key = (pool_connections, pool_maxsize)
+    with _session_pools_lock:
+        session_pool = _session_pools.get(key)
+        if session_pool is None:
+            session_pool = SessionPool(pool_connections, pool_maxsize)
+            _session_pools[key] = session_pool
+        return session_pool
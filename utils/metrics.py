@@ -0,0 +1,309 @@
+import json
+import logging
+import queue
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+logger = logging.getLogger(__name__)
+
+# seconds; the last bucket catches everything slower
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, float("inf"))
+
+
+class Histogram():
+    """Fixed-bucket histogram of durations in seconds."""
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self._buckets = buckets
+        self._counts = [0] * len(buckets)
+        self._sum = 0.0
+        self._count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, seconds):
+        for index, bound in enumerate(self._buckets):
+            if seconds <= bound:
+                break
+        with self._lock:
+            self._counts[index] += 1
+            self._sum += seconds
+            self._count += 1
+
+    def state(self):
+        with self._lock:
+            return list(self._counts), self._sum, self._count
+
+    def quantile(self, q, counts=None, count=None):
+        """Upper bound of the bucket holding the ``q`` quantile."""
+        if counts is None:
+            counts, _, count = self.state()
+        if not count:
+            return None
+        rank = q * count
+        running = 0
+        for bound, bucket_count in zip(self._buckets, counts):
+            running += bucket_count
+            if running >= rank:
+                return bound
+        return self._buckets[-1]
+
+    def summary(self):
+        counts, total, count = self.state()
+        return {
+            "count": count,
+            "mean": round(total / count, 6) if count else None,
+            "p50": self.quantile(0.5, counts, count),
+            "p95": self.quantile(0.95, counts, count),
+            "p99": self.quantile(0.99, counts, count),
+        }
+
+    def prometheus(self, name, labels):
+        counts, total, count = self.state()
+        lines = []
+        running = 0
+        for bound, bucket_count in zip(self._buckets, counts):
+            running += bucket_count
+            le = "+Inf" if bound == float("inf") else repr(bound)
+            lines.append(f'{name}_bucket{{{labels},le="{le}"}} {running}')
+        lines.append(f"{name}_sum{{{labels}}} {total}")
+        lines.append(f"{name}_count{{{labels}}} {count}")
+        return lines
+
+
+class StageMetrics():
+    """Counters and latency histogram for one pipeline stage.
+
+    Workers call ``item_in`` when they take an item off their input queue,
+    ``item_out`` for every item they put downstream (or write), ``error``
+    when an item is dropped, and ``observe`` with the seconds spent on an
+    item. Each call is a counter bump under a lock.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.instances = 0
+        self._items_in = 0
+        self._items_out = 0
+        self._errors = 0
+        self._started = time.monotonic()
+        self._lock = threading.Lock()
+        self.latency = Histogram()
+
+    def item_in(self, count=1):
+        with self._lock:
+            self._items_in += count
+
+    def item_out(self, count=1):
+        with self._lock:
+            self._items_out += count
+
+    def error(self, count=1):
+        with self._lock:
+            self._errors += count
+
+    def observe(self, seconds):
+        self.latency.observe(seconds)
+
+    def counters(self):
+        with self._lock:
+            return self._items_in, self._items_out, self._errors
+
+    def snapshot(self):
+        items_in, items_out, errors = self.counters()
+        elapsed = time.monotonic() - self._started
+        return {
+            "instances": self.instances,
+            "items_in": items_in,
+            "items_out": items_out,
+            "errors": errors,
+            "items_per_sec": round(items_out / elapsed, 2) if elapsed > 0 else None,
+            "latency_seconds": self.latency.summary(),
+        }
+
+
+class _NullStageMetrics():
+    """Stand-in used when a worker runs without an executor registry."""
+
+    def item_in(self, count=1):
+        pass
+
+    def item_out(self, count=1):
+        pass
+
+    def error(self, count=1):
+        pass
+
+    def observe(self, seconds):
+        pass
+
+
+NULL_STAGE_METRICS = _NullStageMetrics()
+
+
+class InstrumentedQueue(queue.Queue):
+    """``queue.Queue`` that records puts, gets and time spent in the queue.
+
+    Items are stored with their enqueue time inside the queue's own deque,
+    so callers still put and get plain items. When the queue is bounded the
+    time producers spend blocked in ``put`` is recorded too.
+    """
+
+    def __init__(self, maxsize=0):
+        super(InstrumentedQueue, self).__init__(maxsize)
+        self.puts = 0
+        self.gets = 0
+        self.dropped = 0
+        self.spilled = 0
+        self.wait = Histogram()
+        self.put_blocked = Histogram()
+
+    def put(self, item, block=True, timeout=None):
+        if self.maxsize <= 0:
+            return super(InstrumentedQueue, self).put(item, block, timeout)
+        started = time.perf_counter()
+        super(InstrumentedQueue, self).put(item, block, timeout)
+        self.put_blocked.observe(time.perf_counter() - started)
+
+    def _put(self, item):
+        self.queue.append((time.perf_counter(), item))
+        self.puts += 1
+
+    def _get(self):
+        enqueued_at, item = self.queue.popleft()
+        self.gets += 1
+        self.wait.observe(time.perf_counter() - enqueued_at)
+        return item
+
+
+class MetricsRegistry():
+    """All stage and queue metrics of one pipeline."""
+
+    def __init__(self):
+        self._stages = {}
+        self._queues = {}
+        self._lock = threading.Lock()
+
+    def stage(self, name):
+        with self._lock:
+            if name not in self._stages:
+                self._stages[name] = StageMetrics(name)
+            return self._stages[name]
+
+    def register_queue(self, name, pipeline_queue):
+        with self._lock:
+            self._queues[name] = pipeline_queue
+
+    @staticmethod
+    def _depth(pipeline_queue):
+        try:
+            return pipeline_queue.qsize()
+        except NotImplementedError:  # multiprocessing.Queue on macOS
+            return None
+
+    def snapshot(self):
+        with self._lock:
+            stages = dict(self._stages)
+            queues = dict(self._queues)
+        queue_stats = {}
+        for name, pipeline_queue in queues.items():
+            stats = {"depth": self._depth(pipeline_queue)}
+            if isinstance(pipeline_queue, InstrumentedQueue):
+                stats.update({"puts": pipeline_queue.puts, "gets": pipeline_queue.gets,
+                              "dropped": pipeline_queue.dropped, "spilled": pipeline_queue.spilled,
+                              "wait_seconds": pipeline_queue.wait.summary(),
+                              "put_blocked_seconds": pipeline_queue.put_blocked.summary()})
+            queue_stats[name] = stats
+        return {
+            "timestamp": time.time(),
+            "stages": {name: stage.snapshot() for name, stage in stages.items()},
+            "queues": queue_stats,
+        }
+
+    def prometheus(self):
+        """Render all metrics in the Prometheus text exposition format."""
+        with self._lock:
+            stages = dict(self._stages)
+            queues = dict(self._queues)
+        lines = []
+        for metric, index, help_text in (
+            ("pipeline_stage_items_in_total", 0, "Items taken off the input queue"),
+            ("pipeline_stage_items_out_total", 1, "Items put downstream or written"),
+            ("pipeline_stage_errors_total", 2, "Items dropped because of an error"),
+        ):
+            lines.append(f"# HELP {metric} {help_text}")
+            lines.append(f"# TYPE {metric} counter")
+            for name, stage in stages.items():
+                lines.append(f'{metric}{{stage="{name}"}} {stage.counters()[index]}')
+        lines.append("# TYPE pipeline_stage_instances gauge")
+        for name, stage in stages.items():
+            lines.append(f'pipeline_stage_instances{{stage="{name}"}} {stage.instances}')
+        lines.append("# TYPE pipeline_stage_latency_seconds histogram")
+        for name, stage in stages.items():
+            lines.extend(stage.latency.prometheus("pipeline_stage_latency_seconds", f'stage="{name}"'))
+        lines.append("# TYPE pipeline_queue_depth gauge")
+        for name, pipeline_queue in queues.items():
+            depth = self._depth(pipeline_queue)
+            if depth is not None:
+                lines.append(f'pipeline_queue_depth{{queue="{name}"}} {depth}')
+        instrumented = {name: pipeline_queue for name, pipeline_queue in queues.items()
+                        if isinstance(pipeline_queue, InstrumentedQueue)}
+        lines.append("# TYPE pipeline_queue_wait_seconds histogram")
+        for name, pipeline_queue in instrumented.items():
+            lines.extend(pipeline_queue.wait.prometheus("pipeline_queue_wait_seconds", f'queue="{name}"'))
+        lines.append("# TYPE pipeline_queue_put_blocked_seconds histogram")
+        for name, pipeline_queue in instrumented.items():
+            lines.extend(pipeline_queue.put_blocked.prometheus("pipeline_queue_put_blocked_seconds",
+                                                               f'queue="{name}"'))
+        for metric, attribute in (("pipeline_queue_dropped_total", "dropped"),
+                                  ("pipeline_queue_spilled_total", "spilled")):
+            lines.append(f"# TYPE {metric} counter")
+            for name, pipeline_queue in instrumented.items():
+                lines.append(f'{metric}{{queue="{name}"}} {getattr(pipeline_queue, attribute)}')
+        return "\n".join(lines) + "\n"
+
+
+class MetricsReporter(threading.Thread):
+    """Logs a JSON snapshot of the registry every ``interval`` seconds."""
+
+    def __init__(self, registry, interval=10.0):
+        super(MetricsReporter, self).__init__(name="metrics-reporter", daemon=True)
+        self._registry = registry
+        self._interval = interval
+        self._stopped = threading.Event()
+
+    def run(self):
+        while not self._stopped.wait(self._interval):
+            self.report()
+
+    def report(self):
+        logger.info("pipeline metrics: %s", json.dumps(self._registry.snapshot()))
+
+    def stop(self):
+        self._stopped.set()
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] not in ("/", "/metrics"):
+            self.send_error(404)
+            return
+        body = self.server.registry.prometheus().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def serve_metrics(registry, port, host="127.0.0.1"):
+    """Serve ``registry`` as Prometheus text on ``http://host:port/metrics``."""
+    server = ThreadingHTTPServer((host, port), _MetricsHandler)
+    server.daemon_threads = True
+    server.registry = registry
+    threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+    logger.info("serving pipeline metrics on http://%s:%s/metrics", host, server.server_address[1])
+    return server
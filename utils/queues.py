@@ -0,0 +1,296 @@
+import os
+import pickle
+import queue
+import tempfile
+import threading
+import time
+import zlib
+
+from utils.hashing import HashRing
+from utils.metrics import InstrumentedQueue
+from utils.records import PriceBatch
+
+SENTINEL = 'DONE'
+OVERFLOW_POLICIES = ("block", "drop_oldest", "spill")
+
+
+class DropOldestQueue(InstrumentedQueue):
+    """Bounded queue whose ``put`` never blocks: when full, the oldest item
+    is discarded to make room.
+
+    'DONE' sentinels are never discarded, otherwise a consumer would wait
+    forever.
+    """
+
+    def put(self, item, block=True, timeout=None):
+        with self.not_full:
+            if self._qsize() >= self.maxsize:
+                self._drop_oldest()
+            self._put(item)
+            self.unfinished_tasks += 1
+            self.not_empty.notify()
+
+    def _drop_oldest(self):
+        for index, (enqueued_at, item) in enumerate(self.queue):
+            if item != SENTINEL:
+                del self.queue[index]
+                self.dropped += 1
+                # the dropped item will never be marked done by a consumer
+                self.unfinished_tasks -= 1
+                return
+
+
+class SpillQueue(InstrumentedQueue):
+    """Queue holding at most ``maxsize`` items in memory, the rest on disk.
+
+    Once the in-memory part is full, new items are pickled to a spill file
+    and read back in order as consumers make room, so memory stays bounded
+    without blocking or losing items. ``put`` never blocks.
+    """
+
+    def __init__(self, maxsize, spill_dir=None):
+        # the base class must not block: the bound is applied by _put instead
+        super(SpillQueue, self).__init__(0)
+        self._memory_size = maxsize
+        self._spill_file = tempfile.TemporaryFile(prefix="queue-spill-", dir=spill_dir)
+        self._spill_read_offset = 0
+        self._spill_count = 0
+
+    def _qsize(self):
+        return len(self.queue) + self._spill_count
+
+    def _put(self, item):
+        if self._spill_count or len(self.queue) >= self._memory_size:
+            self._spill_file.seek(0, os.SEEK_END)
+            pickle.dump((time.perf_counter(), item), self._spill_file, pickle.HIGHEST_PROTOCOL)
+            self._spill_count += 1
+            self.spilled += 1
+            self.puts += 1
+        else:
+            super(SpillQueue, self)._put(item)
+
+    def _get(self):
+        item = super(SpillQueue, self)._get()
+        while self._spill_count and len(self.queue) < self._memory_size:
+            self._spill_file.seek(self._spill_read_offset)
+            self.queue.append(pickle.load(self._spill_file))
+            self._spill_read_offset = self._spill_file.tell()
+            self._spill_count -= 1
+        if not self._spill_count and self._spill_read_offset:
+            # everything spilled has been read back, start the file over
+            self._spill_file.seek(0)
+            self._spill_file.truncate()
+            self._spill_read_offset = 0
+        return item
+
+
+class DurableQueue(InstrumentedQueue):
+    """Queue whose items are also written to a ``CheckpointStore``.
+
+    An item stays in the store from ``put`` until its consumer passes it to
+    ``ack``, so when the process dies, the items that were queued or being
+    worked on are queued again by the next run. Delivery is at least once:
+    an item handled but not yet acknowledged is handled again. 'DONE'
+    sentinels are not stored; the executor sends them on every run.
+    """
+
+    def __init__(self, store, name, maxsize=0):
+        super(DurableQueue, self).__init__(maxsize)
+        self._store = store
+        self._name = name
+        # id(item) -> [(item, row_id)] handed out and not acknowledged yet; the
+        # item is kept so its id can't be reused by a later one while it's here
+        self._in_flight = {}
+        for row_id, item in store.pending(name):
+            self.queue.append((time.perf_counter(), item, row_id))
+        self.recovered = len(self.queue)
+        self.unfinished_tasks = self.recovered
+
+    def _put(self, item):
+        row_id = None if item == SENTINEL else self._store.append(self._name, item)
+        self.queue.append((time.perf_counter(), item, row_id))
+        self.puts += 1
+
+    def _get(self):
+        enqueued_at, item, row_id = self.queue.popleft()
+        self.gets += 1
+        self.wait.observe(time.perf_counter() - enqueued_at)
+        if row_id is not None:
+            self._in_flight.setdefault(id(item), []).append((item, row_id))
+        return item
+
+    def ack(self, *items):
+        """Drop items returned by ``get`` from the store: they are done with."""
+        row_ids = []
+        with self.mutex:
+            for item in items:
+                handed_out = self._in_flight.get(id(item), [])
+                for index, (in_flight_item, row_id) in enumerate(handed_out):
+                    if in_flight_item is item:
+                        row_ids.append(row_id)
+                        del handed_out[index]
+                        break
+                if not handed_out:
+                    self._in_flight.pop(id(item), None)
+        if row_ids:
+            self._store.delete(row_ids)
+
+
+def ack(pipeline_queue, *items):
+    """Tell ``pipeline_queue`` its ``items`` are fully handled: their results
+    were put downstream or written out. A no-op unless the queue is durable."""
+    acknowledge = getattr(pipeline_queue, "ack", None)
+    if acknowledge is not None and items:
+        acknowledge(*items)
+
+
+def make_thread_queue(maxsize=0, overflow="block", spill_dir=None):
+    """Build the in-process queue for a YAML queue entry."""
+    if overflow not in OVERFLOW_POLICIES:
+        raise ValueError(f"Unknown overflow {overflow!r}, expected one of {OVERFLOW_POLICIES}")
+    if overflow != "block" and maxsize <= 0:
+        raise ValueError(f"overflow: {overflow} needs a positive maxsize")
+    if overflow == "drop_oldest":
+        return DropOldestQueue(maxsize)
+    if overflow == "spill":
+        return SpillQueue(maxsize, spill_dir)
+    return InstrumentedQueue(maxsize)
+
+
+def partition_key(item):
+    """Key used to route an item: a symbol, or the first field of a row."""
+    if isinstance(item, tuple):
+        return item[0]
+    return item
+
+
+class PartitionRouter():
+    """Queue-like front for several queues that sends every item to one of
+    them, picked by a stable hash of its key, instead of to all of them.
+
+    The same symbol always lands in the same queue, also across processes.
+    A ``PriceBatch`` is split so each row follows its symbol.
+    """
+
+    def __init__(self, queues):
+        self._queues = list(queues)
+
+    def _index(self, key):
+        return zlib.crc32(str(key).encode("utf-8")) % len(self._queues)
+
+    def put(self, item, block=True, timeout=None):
+        if isinstance(item, PriceBatch):
+            for index, part in item.split(self._index).items():
+                self._queues[index].put(part, block, timeout)
+            return
+        self._queues[self._index(partition_key(item))].put(item, block, timeout)
+
+    def qsize(self):
+        return sum(pipeline_queue.qsize() for pipeline_queue in self._queues)
+
+
+class PartitionedQueue():
+    """Queue split into one sub-queue per consumer instance.
+
+    Items are routed by symbol over a consistent ``HashRing`` of the
+    partitions, so a symbol is always handled by the same instance and
+    adding or removing an instance moves only the symbols of that
+    partition. Each instance reads its own sub-queue from
+    ``add_partition``; sub-queues are built like the unpartitioned queue
+    would be (``maxsize``, ``overflow``).
+
+    'DONE' sentinels are not routed: each one goes to the next partition
+    that has not been sent one yet, so putting one per consumer closes every
+    partition. ``remove_partition`` takes a partition off the ring and sends
+    it 'DONE' after the items already queued for it.
+
+    Producers may start before the consumer's instances: until the first
+    partition is added, ``put`` waits (or raises ``queue.Full`` when not
+    blocking or on timeout) instead of routing onto an empty ring.
+    """
+
+    def __init__(self, maxsize=0, overflow="block", spill_dir=None, virtual_nodes=64):
+        self._queue_options = (maxsize, overflow, spill_dir)
+        self._ring = HashRing(virtual_nodes=virtual_nodes)
+        self._partitions = {}
+        self._retired = []
+        self._closed = set()
+        self._lock = threading.Lock()
+        self._partition_added = threading.Condition(self._lock)
+
+    def add_partition(self, name):
+        """Create partition ``name``, put it on the ring and return its sub-queue."""
+        sub_queue = make_thread_queue(*self._queue_options)
+        with self._lock:
+            self._partitions[name] = sub_queue
+            self._ring.add(name)
+            self._partition_added.notify_all()
+        return sub_queue
+
+    def remove_partition(self, name):
+        with self._lock:
+            self._ring.remove(name)
+            sub_queue = self._partitions.pop(name)
+            self._retired.append(sub_queue)
+        sub_queue.put(SENTINEL)
+
+    def partitions(self):
+        with self._lock:
+            return dict(self._partitions)
+
+    def _put_routed(self, key, item, block, timeout):
+        # routed and put under the lock, so an item can't land in a partition
+        # after remove_partition has sent it 'DONE'; a full sub-queue is
+        # waited on outside the lock, then the item is routed again
+        started = time.perf_counter()
+        deadline = None if timeout is None else started + timeout
+        waited = False
+        while True:
+            with self._lock:
+                sub_queue = self._partitions[self._ring.get(key)]
+                try:
+                    sub_queue.put(item, block=False)
+                except queue.Full:
+                    if not block or (deadline is not None and time.perf_counter() >= deadline):
+                        raise
+                else:
+                    if waited:
+                        sub_queue.put_blocked.observe(time.perf_counter() - started)
+                    return
+            with sub_queue.not_full:
+                # checked under the sub-queue's own lock: a get in between
+                # would otherwise notify before we wait
+                if sub_queue._qsize() >= sub_queue.maxsize:
+                    sub_queue.not_full.wait(None if deadline is None
+                                            else max(0.0, deadline - time.perf_counter()))
+            waited = True
+
+    def _wait_for_partitions(self, block, timeout):
+        with self._lock:
+            if not self._partition_added.wait_for(lambda: self._partitions,
+                                                  timeout if block else 0):
+                raise queue.Full
+
+    def put(self, item, block=True, timeout=None):
+        if item == SENTINEL:
+            with self._lock:
+                open_partitions = [name for name in sorted(self._partitions) if name not in self._closed]
+                if not open_partitions:
+                    return
+                self._closed.add(open_partitions[0])
+                sub_queue = self._partitions[open_partitions[0]]
+            sub_queue.put(item, block, timeout)
+            return
+        self._wait_for_partitions(block, timeout)
+        if isinstance(item, PriceBatch):
+            for part in item.split(self._ring.get).values():
+                self._put_routed(part.symbols[0], part, block, timeout)
+            return
+        self._put_routed(partition_key(item), item, block, timeout)
+
+    def qsize(self):
+        with self._lock:
+            # retired partitions count until their instance has drained them
+            self._retired = [sub_queue for sub_queue in self._retired if sub_queue.qsize()]
+            sub_queues = list(self._partitions.values()) + self._retired
+        return sum(sub_queue.qsize() for sub_queue in sub_queues)
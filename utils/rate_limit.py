@@ -0,0 +1,58 @@
+import asyncio
+import threading
+import time
+
+
+class TokenBucket():
+    """Token-bucket rate limiter shared by threads or coroutines.
+
+    ``rate`` tokens are added per second up to ``capacity``. Each request
+    takes one token; when the bucket is empty the caller waits until its
+    token has been refilled instead of sleeping for a random time.
+    """
+
+    def __init__(self, rate, capacity=None):
+        if rate <= 0:
+            raise ValueError("rate must be positive")
+        self._rate = float(rate)
+        self._capacity = float(capacity if capacity is not None else rate)
+        self._tokens = self._capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _reserve(self):
+        """Take a token and return how long the caller must wait for it."""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self._capacity, self._tokens + (now - self._updated) * self._rate)
+            self._updated = now
+            self._tokens -= 1
+            if self._tokens >= 0:
+                return 0.0
+            return -self._tokens / self._rate
+
+    def take(self):
+        """Block the calling thread until a token is available."""
+        delay = self._reserve()
+        if delay:
+            time.sleep(delay)
+
+    async def wait(self):
+        """Suspend the calling coroutine until a token is available."""
+        delay = self._reserve()
+        if delay:
+            await asyncio.sleep(delay)
+
+
+_buckets = {}
+_buckets_lock = threading.Lock()
+
+
+def get_token_bucket(host, rate, capacity=None):
+    """Return the process wide bucket for ``host``, so every instance (and
+    stage) sending to it shares one rate; ``rate`` and ``capacity`` only
+    apply to the call that creates it."""
+    with _buckets_lock:
+        if host not in _buckets:
+            _buckets[host] = TokenBucket(rate, capacity)
+        return _buckets[host]
@@ -0,0 +1,76 @@
+import sys
+from array import array
+from datetime import datetime, timedelta, timezone
+
+_EPOCH = datetime(1970, 1, 1)
+_NAN = float("nan")
+
+
+class PriceBatch():
+    """Many ``(symbol, price, ingest_date)`` rows in a compact form.
+
+    Symbols are interned strings and prices and ingest dates are stored in
+    ``array('d')`` columns (ingest dates as UTC epoch seconds, a missing
+    price as NaN), so a batch costs a few objects instead of three per row.
+    Pickling, e.g. through a ``multiprocessing.Queue``, sends the symbols as
+    one string and each column as one bytes buffer.
+
+    Iterating yields the usual ``(symbol, price, ingest_date)`` tuples with
+    naive UTC datetimes, so sinks can treat a batch like a list of rows.
+    """
+
+    __slots__ = ("symbols", "prices", "timestamps")
+
+    def __init__(self, symbols=None, prices=None, timestamps=None):
+        self.symbols = symbols if symbols is not None else []
+        self.prices = prices if prices is not None else array('d')
+        self.timestamps = timestamps if timestamps is not None else array('d')
+
+    @classmethod
+    def from_rows(cls, rows):
+        batch = cls()
+        for symbol, price, ingest_date in rows:
+            batch.append(symbol, price, ingest_date)
+        return batch
+
+    def append(self, symbol, price, ingest_date):
+        self.symbols.append(sys.intern(symbol))
+        self.prices.append(_NAN if price is None else price)
+        self.timestamps.append(ingest_date.replace(tzinfo=timezone.utc).timestamp())
+
+    def split(self, key):
+        """Return ``{key(symbol): PriceBatch}`` with the rows grouped by key,
+        in their original order, e.g. to route a batch by symbol."""
+        parts = {}
+        for symbol, price, timestamp in zip(self.symbols, self.prices, self.timestamps):
+            part = parts.get(key(symbol))
+            if part is None:
+                part = parts[key(symbol)] = PriceBatch()
+            part.symbols.append(symbol)
+            part.prices.append(price)
+            part.timestamps.append(timestamp)
+        return parts
+
+    def __len__(self):
+        return len(self.symbols)
+
+    def __iter__(self):
+        for symbol, price, timestamp in zip(self.symbols, self.prices, self.timestamps):
+            yield symbol, None if price != price else price, _EPOCH + timedelta(seconds=timestamp)
+
+    def __reduce__(self):
+        return (_unpack_price_batch,
+                ("\n".join(self.symbols), self.prices.tobytes(), self.timestamps.tobytes()))
+
+    def __repr__(self):
+        return f"PriceBatch({len(self)} rows)"
+
+
+def _unpack_price_batch(symbols, prices, timestamps):
+    price_column = array('d')
+    price_column.frombytes(prices)
+    timestamp_column = array('d')
+    timestamp_column.frombytes(timestamps)
+    symbol_list = [sys.intern(symbol) for symbol in symbols.split("\n")] if symbols else []
+    return PriceBatch(symbol_list, price_column, timestamp_column)
+
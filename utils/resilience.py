@@ -0,0 +1,263 @@
+import logging
+import random
+import threading
+import time
+import urllib.parse
+from collections import deque
+
+import requests
+
+logger = logging.getLogger(__name__)
+
+# throttling and server errors are worth another try, other statuses are final
+RETRY_STATUSES = frozenset({429, 500, 502, 503, 504})
+
+
+class RetryBudget():
+    """Caps retries at a fraction of requests, shared by all fetch threads.
+
+    Every first attempt deposits ``ratio`` tokens and every retry spends one,
+    so when a host is failing across the board retries stop at roughly
+    ``ratio`` times the request rate instead of multiplying the load.
+    ``min_retries`` tokens are there from the start so an idle process can
+    still retry.
+    """
+
+    def __init__(self, ratio=0.2, min_retries=10):
+        self._ratio = ratio
+        self._max_tokens = max(min_retries, 1)
+        self._tokens = float(min_retries)
+        self._lock = threading.Lock()
+        self.exhausted = 0
+
+    def deposit(self):
+        with self._lock:
+            self._tokens = min(self._max_tokens, self._tokens + self._ratio)
+
+    def withdraw(self):
+        with self._lock:
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return True
+            self.exhausted += 1
+            return False
+
+
+class CircuitBreaker():
+    """Per-host breaker that pauses requests while a host keeps failing.
+
+    The breaker opens once at least ``min_requests`` of the last ``window``
+    requests were made and ``failure_rate`` of them failed. While open,
+    ``wait_time`` tells callers how long to pause; after ``reset_timeout``
+    seconds one probe request is let through, which closes the breaker on
+    success or opens it again on failure.
+    """
+
+    def __init__(self, name, failure_rate=0.5, window=20, min_requests=10, reset_timeout=30.0):
+        self.name = name
+        self._failure_rate = failure_rate
+        self._min_requests = min_requests
+        self._reset_timeout = reset_timeout
+        self._outcomes = deque(maxlen=window)
+        self._state = "closed"
+        self._opened_until = 0.0
+        self._probe_in_flight = False
+        self._lock = threading.Lock()
+        self.opened = 0
+
+    @property
+    def state(self):
+        return self._state
+
+    def wait_time(self):
+        """Seconds to wait before sending a request; 0 means go ahead."""
+        with self._lock:
+            if self._state == "closed":
+                return 0.0
+            if self._state == "open":
+                remaining = self._opened_until - time.monotonic()
+                if remaining > 0:
+                    return remaining
+                self._state = "half_open"
+                self._probe_in_flight = False
+            if not self._probe_in_flight:
+                self._probe_in_flight = True
+                return 0.0
+            return min(1.0, self._reset_timeout)
+
+    def record(self, success):
+        with self._lock:
+            if self._state == "half_open":
+                if success:
+                    logger.info("circuit for %s closed", self.name)
+                    self._state = "closed"
+                    self._outcomes.clear()
+                else:
+                    self._open()
+                return
+            self._outcomes.append(success)
+            failures = self._outcomes.count(False)
+            if len(self._outcomes) >= self._min_requests and \
+                    failures >= self._failure_rate * len(self._outcomes):
+                self._open()
+
+    def _open(self):
+        self._state = "open"
+        self._opened_until = time.monotonic() + self._reset_timeout
+        self._outcomes.clear()
+        self._probe_in_flight = False
+        self.opened += 1
+        logger.warning("circuit for %s opened, pausing requests for %ss", self.name, self._reset_timeout)
+
+
+_breakers = {}
+_budgets = {}
+_registry_lock = threading.Lock()
+
+
+def get_circuit_breaker(host, **settings):
+    """Return the process wide breaker for ``host``; ``settings`` only apply
+    to the call that creates it."""
+    with _registry_lock:
+        if host not in _breakers:
+            _breakers[host] = CircuitBreaker(host, **settings)
+        return _breakers[host]
+
+
+def get_retry_budget(ratio=0.2, min_retries=10):
+    """Return the process wide budget for these settings."""
+    key = (ratio, min_retries)
+    with _registry_lock:
+        if key not in _budgets:
+            _budgets[key] = RetryBudget(ratio, min_retries)
+        return _budgets[key]
+
+
+class RetryPolicy():
+    """Timeouts, retries with backoff and per-host circuit breaking.
+
+    Retries use capped exponential backoff with full jitter
+    (``uniform(0, min(backoff_max, backoff_base * 2 ** attempt))``), or the
+    server's ``Retry-After`` when it asks for longer, and are limited by
+    ``max_retries`` per request and by a process wide ``RetryBudget``.
+    ``get`` and ``wrap`` cover ``requests``; async callers drive the same
+    policy with ``wait_time`` and ``after_attempt``.
+    """
+
+    def __init__(self, connect_timeout=3.05, read_timeout=30.0, max_retries=3, backoff_base=0.5,
+                 backoff_max=30.0, budget=None, breaker_settings=None):
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self._max_retries = max_retries
+        self._backoff_base = backoff_base
+        self._backoff_max = backoff_max
+        self._budget = budget if budget is not None else get_retry_budget()
+        self._breaker_settings = breaker_settings or {}
+
+    @classmethod
+    def from_kwargs(cls, kwargs):
+        """Pop the resilience settings shared by the fetch schedulers.
+
+        ``connect_timeout`` and ``read_timeout`` (seconds), ``max_retries``,
+        ``backoff_base`` and ``backoff_max`` (seconds), ``retry_budget``
+        (retries per request, process wide), and the per-host breaker's
+        ``breaker_failure_rate``, ``breaker_window``, ``breaker_min_requests``
+        and ``breaker_reset`` (seconds).
+        """
+        breaker_settings = {
+            "failure_rate": float(kwargs.pop('breaker_failure_rate', 0.5)),
+            "window": int(kwargs.pop('breaker_window', 20)),
+            "min_requests": int(kwargs.pop('breaker_min_requests', 10)),
+            "reset_timeout": float(kwargs.pop('breaker_reset', 30.0)),
+        }
+        return cls(
+            connect_timeout=float(kwargs.pop('connect_timeout', 3.05)),
+            read_timeout=float(kwargs.pop('read_timeout', 30.0)),
+            max_retries=int(kwargs.pop('max_retries', 3)),
+            backoff_base=float(kwargs.pop('backoff_base', 0.5)),
+            backoff_max=float(kwargs.pop('backoff_max', 30.0)),
+            budget=get_retry_budget(float(kwargs.pop('retry_budget', 0.2))),
+            breaker_settings=breaker_settings,
+        )
+
+    @property
+    def timeout(self):
+        """``(connect, read)`` timeout tuple for ``requests``."""
+        return (self.connect_timeout, self.read_timeout)
+
+    def breaker(self, url):
+        return get_circuit_breaker(urllib.parse.urlsplit(url).netloc, **self._breaker_settings)
+
+    def wait_time(self, url):
+        """Seconds to pause before a request to ``url``'s host."""
+        return self.breaker(url).wait_time()
+
+    def _backoff(self, attempt, retry_after=None):
+        delay = random.uniform(0, min(self._backoff_max, self._backoff_base * 2 ** attempt))
+        try:
+            delay = max(delay, min(self._backoff_max, float(retry_after)))
+        except (TypeError, ValueError):
+            pass  # missing, or an HTTP date
+        return delay
+
+    def after_attempt(self, url, attempt, status=None, error=None, retry_after=None):
+        """Record the outcome of attempt ``attempt`` (0 based) with the host's
+        breaker and return the seconds to wait before retrying, or ``None``
+        when the request should not be retried."""
+        failed = error is not None or status in RETRY_STATUSES
+        self.breaker(url).record(not failed)
+        if attempt == 0:
+            self._budget.deposit()
+        if not failed or attempt >= self._max_retries or not self._budget.withdraw():
+            return None
+        return self._backoff(attempt, retry_after)
+
+    def get(self, session, url, **kwargs):
+        """``session.get`` with timeouts, retries and circuit breaking.
+
+        Returns the last response, or raises the last exception when no
+        attempt got a response.
+        """
+        kwargs.setdefault("timeout", self.timeout)
+        attempt = 0
+        while True:
+            wait = self.wait_time(url)
+            if wait > 0:
+                time.sleep(wait)
+                continue
+            response, error = None, None
+            try:
+                response = session.get(url, **kwargs)
+            except requests.RequestException as e:
+                error = e
+            except BaseException:
+                # not retried, but counted: a half-open breaker waits for its probe's outcome
+                self.breaker(url).record(False)
+                raise
+            status = response.status_code if response is not None else None
+            retry_after = response.headers.get("Retry-After") if response is not None else None
+            delay = self.after_attempt(url, attempt, status, error, retry_after)
+            if delay is None:
+                if error is not None:
+                    raise error
+                return response
+            logger.debug("retrying %s in %.2fs after %s", url, delay, error or status)
+            if response is not None:
+                response.close()
+            time.sleep(delay)
+            attempt += 1
+
+    def wrap(self, session):
+        """Return a session-like object whose ``get`` goes through ``get``."""
+        return ResilientSession(session, self)
+
+
+class ResilientSession():
+    """Drop-in for a ``requests.Session`` used only through ``get``."""
+
+    def __init__(self, session, policy):
+        self._session = session
+        self._policy = policy
+
+    def get(self, url, **kwargs):
+        return self._policy.get(self._session, url, **kwargs)
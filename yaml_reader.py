@@ -1,17 +1,50 @@
 import importlib
-import random
-import time
+import multiprocessing
+import os
+import queue
 import threading
-from multiprocessing import Queue
+import time
 
 import yaml
 
 import logging
+from utils.cache import log_cache_stats
+from utils.checkpoint import CheckpointStore
+from utils.metrics import MetricsRegistry, MetricsReporter, serve_metrics
+from utils.queues import DurableQueue, PartitionedQueue, PartitionRouter, make_thread_queue
 from utils.setup_logging import setup_logging
 setup_logging()
 logger = logging.getLogger(__name__)
 logger.info("yaml_reader logging initialized")
 
+QUEUE_TYPES = ("thread", "simple", "process")
+WORKER_MODES = ("thread", "process")
+FAN_OUT_MODES = ("broadcast", "partition")
+
+
+class PipelineValidationError(ValueError):
+    """The pipeline YAML does not describe a runnable DAG."""
+
+
+def _worker_output_queues(worker):
+    """Every queue a worker puts to: its output queues and dead letter queue."""
+    output_queues = list(worker.get("output_queues") or [])
+    if worker.get("dead_letter_queue") is not None:
+        output_queues.append(worker["dead_letter_queue"])
+    return output_queues
+
+
+def _run_worker_process(location, class_name, input_params):
+    """Entry point of a ``mode: process`` worker instance.
+
+    The worker class is built inside the child process, so its thread (and
+    the parsing it does) runs under that process's own GIL.
+    """
+    workerClass = getattr(importlib.import_module(location), class_name)
+    worker = workerClass(**input_params)
+    worker.join()
+
+
 class YamlPipelineExecutor(threading.Thread):
     
     def __init__(self, pipeline_location):
@@ -20,47 +53,362 @@ class YamlPipelineExecutor(threading.Thread):
         self._queues = {}
         self._workers = {}
         self._queue_consumers = {}    # how many workers will consume that queue
+        self._queue_producers = {}    # stages still putting to that queue
         self._downstream_queues = {}   # what queues the workers will put to
+        self._stages_running = set()   # stages with at least one live instance
+        self._stage_done = threading.Condition()   # also guards instance counts and sealed queues
+        self._worker_specs = {}        # how to start another instance of a stage
+        self._active_instances = {}    # instances not asked to retire, per stage
+        self._sealed_queues = set()    # queues that already got their 'DONE' sentinels
+        self._finished_stages = set()  # stages whose instances have all exited
+        self._autoscale = {}           # autoscale settings per stage
+        self._instance_partitions = {} # partitions of a partitioned input queue, per stage
+        self._unassigned_partitions = {}  # sub-queues created for instances not started yet
+        self._checkpoint = None        # CheckpointStore when the YAML has a checkpoint entry
+        self._resumed_stages = set()   # stages finished by an earlier, interrupted run
+        self._autoscaler_stop = threading.Event()
+        # spawn, not fork: the parent is full of running threads and locks
+        self._mp_context = multiprocessing.get_context("spawn")
+        self.metrics = MetricsRegistry()
+        self._metrics_reporter = None
+        self._metrics_server = None
             
 
     def _load_pipeline(self):
         with open(self._pipeline_location, "r") as infile:
             self._yaml_data = yaml.safe_load(infile)
+        self._validate_pipeline()
+
+
+    def _validate_pipeline(self):
+        """Check that the stages and queues form a DAG that can shut down.
+
+        Raises ``PipelineValidationError`` for duplicate or unknown names,
+        cycles (their 'DONE' sentinels would never arrive) and orphan
+        stages: stages connected to nothing, or reading a queue no stage
+        puts to.
+        """
+        queue_names = [queue_def["name"] for queue_def in self._yaml_data.get("queues") or []]
+        duplicates = {name for name in queue_names if queue_names.count(name) > 1}
+        if duplicates:
+            raise PipelineValidationError(f"Queues declared more than once: {sorted(duplicates)}")
+        workers = self._yaml_data.get("workers") or []
+        worker_names = [worker.get("name") for worker in workers]
+        if None in worker_names:
+            raise PipelineValidationError("Every worker needs a name")
+        duplicates = {name for name in worker_names if worker_names.count(name) > 1}
+        if duplicates:
+            raise PipelineValidationError(f"Workers declared more than once: {sorted(duplicates)}")
+
+        producers = {name: set() for name in queue_names}
+        consumers = {name: set() for name in queue_names}
+        for worker in workers:
+            worker_name = worker["name"]
+            input_queue = worker.get("input_queue")
+            output_queues = _worker_output_queues(worker)
+            for queue_name in ([input_queue] if input_queue is not None else []) + output_queues:
+                if queue_name not in producers:
+                    raise PipelineValidationError(f"Worker {worker_name}: unknown queue {queue_name!r}")
+            if input_queue is None and not output_queues:
+                raise PipelineValidationError(f"Worker {worker_name} has neither an input nor an output queue")
+            if input_queue is not None:
+                consumers[input_queue].add(worker_name)
+            for queue_name in output_queues:
+                producers[queue_name].add(worker_name)
+            fan_out = worker.get("fan_out", "broadcast")
+            if fan_out not in FAN_OUT_MODES:
+                raise PipelineValidationError(
+                    f"Worker {worker_name}: unknown fan_out {fan_out!r}, expected one of {FAN_OUT_MODES}")
+
+        durable_queues = set()
+        for queue_def in self._yaml_data.get("queues") or []:
+            # producers wait for the reader's partitions, so there must be one reader
+            if queue_def.get("partitioned") and len(consumers[queue_def["name"]]) != 1:
+                raise PipelineValidationError(
+                    f"Queue {queue_def['name']} is partitioned and must be read by exactly one worker, "
+                    f"not {sorted(consumers[queue_def['name']])}")
+            # adding or retiring an instance would move symbols between
+            # partitions while their earlier items are still queued
+            autoscaled = [worker["name"] for worker in workers if worker.get("autoscale") is not None
+                          and worker.get("input_queue") == queue_def["name"]]
+            if queue_def.get("partitioned") and autoscaled:
+                raise PipelineValidationError(
+                    f"Queue {queue_def['name']} is partitioned, so its reader {autoscaled[0]} cannot autoscale")
+            if queue_def.get("durable"):
+                if not self._yaml_data.get("checkpoint"):
+                    raise PipelineValidationError(
+                        f"Queue {queue_def['name']} is durable, which needs a checkpoint entry")
+                durable_queues.add(queue_def["name"])
+        for worker in workers:
+            # an item is acknowledged once its results are put downstream,
+            # so they have to survive a crash as well
+            if worker.get("input_queue") in durable_queues:
+                lost = [name for name in _worker_output_queues(worker) if name not in durable_queues]
+                if lost:
+                    raise PipelineValidationError(
+                        f"Worker {worker['name']} reads durable queue {worker['input_queue']}, "
+                        f"so its output queues {lost} must be durable too")
+
+        for worker in workers:
+            input_queue = worker.get("input_queue")
+            if input_queue is not None and not producers[input_queue]:
+                raise PipelineValidationError(
+                    f"Worker {worker['name']} reads {input_queue}, which no worker puts to")
+        for queue_name in queue_names:
+            if not producers[queue_name] and not consumers[queue_name]:
+                logger.warning("queue %s is not used by any worker", queue_name)
+            elif not consumers[queue_name]:
+                logger.warning("nothing reads queue %s, its items will be left behind", queue_name)
+
+        # stage -> stages reading what it puts out; a cycle can never be sealed
+        downstream = {worker["name"]: set() for worker in workers}
+        for worker in workers:
+            for queue_name in _worker_output_queues(worker):
+                downstream[worker["name"]].update(consumers[queue_name])
+        visiting, visited = [], set()
+
+        def visit(stage):
+            if stage in visiting:
+                cycle = visiting[visiting.index(stage):] + [stage]
+                raise PipelineValidationError(f"Pipeline has a cycle: {' -> '.join(cycle)}")
+            if stage in visited:
+                return
+            visiting.append(stage)
+            for next_stage in sorted(downstream[stage]):
+                visit(next_stage)
+            visiting.pop()
+            visited.add(stage)
+
+        for worker_name in worker_names:
+            visit(worker_name)
+        self._queue_producers = producers
+        self._queue_readers = consumers
+        self._durable_queues = durable_queues
+
+
+    def _init_checkpoint(self):
+        """Open the checkpoint store from the top-level ``checkpoint`` entry.
+
+        ``path`` is the SQLite file (default ``data/checkpoint.db``),
+        ``run_id`` names the run (default: the pipeline file name). Stages
+        an earlier run of the same ``run_id`` finished are skipped when all
+        their output queues are durable, since their results are still
+        queued; the other stages run again, so durable queues fed only by
+        stages that start over are emptied first.
+        """
+        checkpoint_conf = self._yaml_data.get("checkpoint")
+        if not checkpoint_conf:
+            return
+        run_id = checkpoint_conf.get(
+            "run_id", os.path.splitext(os.path.basename(self._pipeline_location))[0])
+        self._checkpoint = CheckpointStore(
+            checkpoint_conf.get("path", os.path.join("data", "checkpoint.db")), str(run_id))
+
+        finished = self._checkpoint.finished_stages()
+        resumable = {worker["name"]: worker for worker in self._yaml_data["workers"]
+                     if worker["name"] in finished
+                     and all(name in self._durable_queues for name in _worker_output_queues(worker))}
+        # a stage whose non-durable input is refilled by a producer that runs
+        # again has to run again too
+        changed = True
+        while changed:
+            changed = False
+            for worker_name, worker in list(resumable.items()):
+                input_queue = worker.get("input_queue")
+                if input_queue is not None and input_queue not in self._durable_queues and \
+                        not self._queue_producers[input_queue] <= set(resumable):
+                    del resumable[worker_name]
+                    changed = True
+        self._resumed_stages = set(resumable)
+        restarted = {worker["name"] for worker in self._yaml_data["workers"]
+                     if worker["name"] not in self._resumed_stages
+                     and worker.get("input_queue") not in self._durable_queues}
+        for queue_name in self._durable_queues:
+            if self._queue_producers[queue_name] <= restarted:
+                self._checkpoint.clear_queue(queue_name)
+        if self._resumed_stages:
+            logger.info("resuming run %s: skipping stages finished earlier: %s",
+                        run_id, sorted(self._resumed_stages))
+
+
+    def _queue_type(self, queue_def):
+        """Pick the queue implementation for a queue entry of the YAML.
+
+        ``type`` may be ``thread`` (queue.Queue), ``simple``
+        (queue.SimpleQueue) or ``process`` (multiprocessing.Queue). Without
+        it, a queue is a process queue only when a ``mode: process`` worker
+        reads or writes it, so thread-only stages never pickle their items.
+        """
+        queue_name = queue_def["name"]
+        process_stage = False
+        for worker in self._yaml_data["workers"]:
+            worker_queues = [worker.get("input_queue")] + _worker_output_queues(worker)
+            if queue_name in worker_queues and worker.get("mode", "thread") == "process":
+                process_stage = True
+
+        queue_type = queue_def.get("type")
+        if queue_type is None:
+            return "process" if process_stage else "thread"
+        if queue_type not in QUEUE_TYPES:
+            raise ValueError(f"Queue {queue_name}: unknown type {queue_type!r}, expected one of {QUEUE_TYPES}")
+        if process_stage and queue_type != "process":
+            raise ValueError(f"Queue {queue_name} is used by a process worker and must have type: process")
+        return queue_type
 
 
     def _init_queues(self):
-        for queue in self._yaml_data["queues"]:
-            queue_name = queue["name"]
-            self._queues[queue_name] = Queue()
+        for queue_def in self._yaml_data["queues"]:
+            queue_name = queue_def["name"]
+            queue_type = self._queue_type(queue_def)
+            maxsize = queue_def.get("maxsize", 0)
+            overflow = queue_def.get("overflow", "block")
+            if queue_def.get("durable"):
+                if queue_type != "thread" or overflow != "block" or queue_def.get("partitioned"):
+                    raise ValueError(f"Queue {queue_name}: durable queues must be unpartitioned thread "
+                                     f"queues with overflow: block")
+                self._queues[queue_name] = DurableQueue(self._checkpoint, queue_name, maxsize)
+                if self._queues[queue_name].recovered:
+                    logger.info("queue %s: %s items recovered from %s",
+                                queue_name, self._queues[queue_name].recovered, self._checkpoint.path)
+            elif queue_def.get("partitioned"):
+                if queue_type != "thread":
+                    raise ValueError(f"Queue {queue_name}: partitioned queues must be thread queues")
+                # sub-queues are added as the consumer's instances start
+                self._queues[queue_name] = PartitionedQueue(maxsize, overflow, queue_def.get("spill_dir"),
+                                                            int(queue_def.get("virtual_nodes", 64)))
+            elif queue_type == "process":
+                if overflow != "block":
+                    raise ValueError(f"Queue {queue_name}: process queues only support overflow: block")
+                self._queues[queue_name] = self._mp_context.Queue(maxsize)
+            elif queue_type == "simple":
+                if maxsize or overflow != "block":
+                    raise ValueError(f"Queue {queue_name}: simple queues cannot be bounded")
+                self._queues[queue_name] = queue.SimpleQueue()
+            else:
+                self._queues[queue_name] = make_thread_queue(maxsize, overflow, queue_def.get("spill_dir"))
+            self.metrics.register_queue(queue_name, self._queues[queue_name])
+            logger.debug("queue %s uses %s queue (maxsize %s, overflow %s)",
+                         queue_name, queue_type, maxsize or "unbounded", overflow)
 
 
     def _init_workers(self):
+        starting = []   # (stage, instances), started once every stage is set up
         for worker in self._yaml_data["workers"]:
             workerClass = getattr(importlib.import_module(worker["location"]), worker["class"])
             input_queue = worker.get("input_queue", None)
             output_queues = worker.get("output_queues", None)
             worker_name = worker.get("name")
             num_instances = worker.get("instances", 1)                      
+            mode = worker.get("mode", "thread")
+            if mode not in WORKER_MODES:
+                raise ValueError(f"Worker {worker_name}: unknown mode {mode!r}, expected one of {WORKER_MODES}")
+            autoscale = worker.get("autoscale")
+            if autoscale is not None:
+                num_instances = self._init_autoscale(worker_name, input_queue, output_queues,
+                                                     autoscale, num_instances)
+            if worker_name in self._resumed_stages:
+                # its watcher seals its output queues right away
+                num_instances = 0
+                self._finished_stages.add(worker_name)
             
+            # failed inputs are put here; sealed like an output queue
+            dead_letter_queue = worker.get("dead_letter_queue")
+
             # track the name of the queues
-            self._downstream_queues[worker_name] = output_queues
+            self._downstream_queues[worker_name] = _worker_output_queues(worker)
             
-            # need to know how many workers will consume the input_queue
+            # need to know how many workers will consume the input_queue,
+            # summed over every stage reading it
             if input_queue is not None:
-                self._queue_consumers[input_queue] = num_instances
+                self._queue_consumers[input_queue] = self._queue_consumers.get(input_queue, 0) + num_instances
             
+            stage_output_queues = None
+            if output_queues is not None:
+                stage_output_queues = [self._queues[output_q] for output_q in output_queues]
+                if worker.get("fan_out", "broadcast") == "partition":
+                    # each item to one output queue, by symbol, instead of to all
+                    stage_output_queues = [PartitionRouter(stage_output_queues)]
             input_params = {                          
                 "input_queue": self._queues[input_queue] if input_queue is not None else None,
-                "output_queues": [self._queues[output_q] for output_q in output_queues] \
-                        if output_queues is not None else None
+                "output_queues": stage_output_queues,
             }
             input_values = worker.get('input_values')
             if input_values is not None: 
                 input_params['input_values'] = input_values
+            if dead_letter_queue is not None:
+                input_params['dead_letter_queue'] = self._queues[dead_letter_queue]
+            # worker specific settings (batch sizes, pool sizes, ...)
+            parameters = worker.get('parameters')
+            if parameters is not None:
+                input_params.update(parameters)
             
+            self._worker_specs[worker_name] = (worker, workerClass, mode, input_params)
             self._workers[worker_name] = []
+            self._active_instances[worker_name] = 0
+            if isinstance(input_params["input_queue"], PartitionedQueue):
+                # every partition exists before any producer starts: added one
+                # by one as instances start, the first would get nearly every
+                # symbol, and symbols would move as the others came up
+                self._unassigned_partitions[worker_name] = [
+                    self._add_partition(worker_name) for i in range(num_instances)]
+            starting.append((worker_name, num_instances))
+
+        for worker_name, num_instances in starting:
             for i in range(num_instances):
-                self._workers[worker_name].append(workerClass(**input_params))
+                self._start_instance(worker_name)
+
+
+    def _start_instance(self, worker_name):
+        """Start one more instance of a stage and count it as a consumer."""
+        worker, workerClass, mode, input_params = self._worker_specs[worker_name]
+        stage_metrics = self.metrics.stage(worker_name)
+        index = len(self._workers[worker_name])
+        if isinstance(input_params["input_queue"], PartitionedQueue):
+            input_params = dict(input_params, input_queue=self._unassigned_partitions[worker_name].pop(0))
+        if mode == "process":
+            instance = self._mp_context.Process(
+                target=_run_worker_process,
+                args=(worker["location"], worker["class"], input_params),
+                name=f"{worker_name}-{index}",
+            )
+            instance.start()
+        else:
+            # process workers keep the default no-op hook: the registry lives in this process
+            instance = workerClass(metrics=stage_metrics, **input_params)
+        self._workers[worker_name].append(instance)
+        self._active_instances[worker_name] += 1
+        stage_metrics.instances = self._active_instances[worker_name]
+        return instance
+
+
+    def _add_partition(self, worker_name):
+        """Give a new instance its own partition of the stage's input queue.
+
+        Partitions are named ``<stage>-<n>`` with the lowest free ``n``, so a
+        restarted pipeline gets the same names and so the same symbol
+        placement on the hash ring.
+        """
+        input_queue_name = self._worker_specs[worker_name][0]["input_queue"]
+        partitions = self._instance_partitions.setdefault(worker_name, [])
+        number = 0
+        while f"{worker_name}-{number}" in partitions:
+            number += 1
+        partition_name = f"{worker_name}-{number}"
+        partitions.append(partition_name)
+        sub_queue = self._queues[input_queue_name].add_partition(partition_name)
+        self.metrics.register_queue(f"{input_queue_name}[{partition_name}]", sub_queue)
+        return sub_queue
+
+
+    def stop(self):
+        """Ask long-running source workers (those with a ``stop()`` method,
+        e.g. ``SymbolPollingScheduler``) to finish; the rest of the pipeline
+        then drains and shuts down through the usual 'DONE' sentinels."""
+        for worker_name, instances in list(self._workers.items()):
+            for instance in list(instances):
+                if hasattr(instance, "stop"):
+                    logger.info("stopping %s", instance.name)
+                    instance.stop()
 
 
     def _join_workers(self):
@@ -69,45 +417,244 @@ class YamlPipelineExecutor(threading.Thread):
                 worker_thread.join()
 
 
+    def _watch_stage(self, worker_name):
+        """Wait for every instance of a stage, then close its output queues.
+
+        Runs on its own thread per stage so the 'DONE' sentinels go
+        downstream as soon as the last instance of the stage exits.
+        """
+        # the autoscaler may add instances while we wait, so re-check the list
+        while True:
+            with self._stage_done:
+                alive = [instance for instance in self._workers[worker_name] if instance.is_alive()]
+                if not alive:
+                    self._finished_stages.add(worker_name)
+                    break
+            for instance in alive:
+                instance.join()
+        self._checkpoint_stage(worker_name)
+
+        for output_queue in self._downstream_queues[worker_name]:
+            with self._stage_done:
+                # a queue fed by several stages is sealed by the last one to finish
+                producers = self._queue_producers[output_queue]
+                producers.discard(worker_name)
+                if producers:
+                    logger.debug("queue %s still has producers %s", output_queue, producers)
+                    continue
+                # counted under the lock so autoscaling can't change it meanwhile
+                number_of_consumers = self._queue_consumers.get(output_queue, 0)
+                self._sealed_queues.add(output_queue)
+            for i in range(number_of_consumers):
+                self._queues[output_queue].put('DONE')
+
+        self.metrics.stage(worker_name).instances = 0
+        with self._stage_done:
+            self._stages_running.remove(worker_name)
+            logger.debug("stage %s finished, still running: %s", worker_name, self._stages_running)
+            self._stage_done.notify_all()
+
+
+    def _checkpoint_stage(self, worker_name):
+        """Record a finished stage whose results are all in durable queues,
+        and drop what is left of a durable input no running stage reads."""
+        if self._checkpoint is None or worker_name in self._resumed_stages:
+            return
+        worker = self._worker_specs[worker_name][0]
+        if not all(name in self._durable_queues for name in _worker_output_queues(worker)):
+            return
+        input_queue = worker.get("input_queue")
+        drained_queues = []
+        with self._stage_done:
+            if input_queue in self._durable_queues and \
+                    self._queue_readers[input_queue] <= self._finished_stages:
+                drained_queues.append(input_queue)
+        self._checkpoint.mark_finished(worker_name, drained_queues)
+
+
+    def _init_autoscale(self, worker_name, input_queue, output_queues, autoscale, num_instances):
+        """Validate a stage's ``autoscale`` entry; return its starting instance count."""
+        if input_queue is None:
+            raise ValueError(f"Worker {worker_name}: autoscale needs an input_queue to watch")
+        settings = {
+            "min_instances": int(autoscale.get("min_instances", 1)),
+            "max_instances": int(autoscale.get("max_instances", num_instances)),
+            "interval": float(autoscale.get("interval", 2.0)),
+            # queued items per active instance above which one may be added
+            "scale_up_depth": int(autoscale.get("scale_up_depth", 20)),
+            # seconds a shrinking backlog may take to drain before one is added
+            "drain_time": float(autoscale.get("drain_time", 30.0)),
+            # queue depth at or below which one is retired
+            "scale_down_depth": int(autoscale.get("scale_down_depth", 0)),
+            # consecutive intervals at that depth before one is retired
+            "scale_down_intervals": int(autoscale.get("scale_down_intervals", 3)),
+            "input_queue": input_queue,
+            "output_queues": output_queues or [],
+            "last_check": time.monotonic(),
+            "last_items_in": 0,
+            "last_depth": 0,
+            "idle_intervals": 0,
+        }
+        if not 1 <= settings["min_instances"] <= settings["max_instances"]:
+            raise ValueError(f"Worker {worker_name}: autoscale needs 1 <= min_instances <= max_instances")
+        self._autoscale[worker_name] = settings
+        return min(max(num_instances, settings["min_instances"]), settings["max_instances"])
+
+
+    def _autoscale_stage(self, worker_name, settings, now):
+        """Add or retire one instance of a stage based on its queues.
+
+        The arrival rate of the input queue is its drain rate (items the
+        stage took in since the last check) plus the change in its depth.
+        Scales up while the input queue holds more than ``scale_up_depth``
+        items per active instance and either items arrive at least as fast
+        as the stage drains them or, at the current rates, the backlog would
+        take more than ``drain_time`` seconds to drain; a backlog the stage
+        is already working off fast enough adds nothing. Not while an output
+        queue is that deep, either: a slower stage downstream would only get
+        more backlog.
+
+        Retires an instance once the input queue has stayed at
+        ``scale_down_depth`` or less for ``scale_down_intervals`` checks in
+        a row, so a short lull between bursts does not retire instances only
+        to add them again. A retired instance is sent its own 'DONE', so the
+        consumer count used for the final sentinels drops with it. Once the
+        input queue has been sealed, an added instance gets its own extra
+        'DONE' instead, and nothing is retired.
+        """
+        try:
+            depth = self._queues[settings["input_queue"]].qsize()
+        except NotImplementedError:
+            return
+        items_in = self.metrics.stage(worker_name).counters()[0]
+        elapsed = max(now - settings["last_check"], 1e-6)
+        drain_rate = (items_in - settings["last_items_in"]) / elapsed
+        arrival_rate = max(0.0, drain_rate + (depth - settings["last_depth"]) / elapsed)
+        if arrival_rate >= drain_rate:
+            falling_behind = depth > 0
+        else:
+            falling_behind = depth / (drain_rate - arrival_rate) > settings["drain_time"]
+        settings["last_items_in"] = items_in
+        settings["last_depth"] = depth
+        settings["last_check"] = now
+        if depth <= settings["scale_down_depth"]:
+            settings["idle_intervals"] += 1
+        else:
+            settings["idle_intervals"] = 0
+
+        with self._stage_done:
+            if worker_name in self._finished_stages:
+                return
+            sealed = settings["input_queue"] in self._sealed_queues
+            active = self._active_instances[worker_name]
+            downstream_backlog = False
+            for output_queue in settings["output_queues"]:
+                try:
+                    downstream_backlog |= self._queues[output_queue].qsize() > settings["scale_up_depth"] * active
+                except NotImplementedError:
+                    pass
+
+            if depth > settings["scale_up_depth"] * active and falling_behind and not downstream_backlog \
+                    and active < settings["max_instances"]:
+                self._start_instance(worker_name)
+                if sealed:
+                    self._queues[settings["input_queue"]].put('DONE')
+                else:
+                    self._queue_consumers[settings["input_queue"]] += 1
+                action = "added"
+            elif settings["idle_intervals"] >= settings["scale_down_intervals"] \
+                    and active > settings["min_instances"] and not sealed:
+                settings["idle_intervals"] = 0
+                self._active_instances[worker_name] -= 1
+                self._queue_consumers[settings["input_queue"]] -= 1
+                self.metrics.stage(worker_name).instances = self._active_instances[worker_name]
+                self._queues[settings["input_queue"]].put('DONE')
+                action = "retired"
+            else:
+                return
+        logger.info("autoscale %s: %s an instance (depth %s, arrival %.1f items/s, drain %.1f items/s, "
+                    "now %s instances)", worker_name, action, depth, arrival_rate, drain_rate,
+                    self._active_instances[worker_name])
+
+
+    def _run_autoscaler(self):
+        interval = min(settings["interval"] for settings in self._autoscale.values())
+        while not self._autoscaler_stop.wait(interval):
+            now = time.monotonic()
+            for worker_name, settings in self._autoscale.items():
+                if now - settings["last_check"] >= settings["interval"]:
+                    self._autoscale_stage(worker_name, settings, now)
+
+
+    def _start_stage_watchers(self):
+        with self._stage_done:
+            self._stages_running = set(self._workers)
+        for worker_name in self._workers:
+            threading.Thread(target=self._watch_stage, args=(worker_name,),
+                             name=f"{worker_name}-watcher", daemon=True).start()
+
+
+    def _start_metrics(self):
+        """Start the optional metrics outputs from the top-level ``metrics`` entry.
+
+        ``interval`` logs a JSON snapshot every so many seconds, ``port``
+        serves Prometheus text on http://127.0.0.1:<port>/metrics.
+        """
+        metrics_conf = self._yaml_data.get("metrics") or {}
+        if metrics_conf.get("interval"):
+            self._metrics_reporter = MetricsReporter(self.metrics, float(metrics_conf["interval"]))
+            self._metrics_reporter.start()
+        if metrics_conf.get("port") is not None:
+            self._metrics_server = serve_metrics(self.metrics, int(metrics_conf["port"]))
+
+
+    def _stop_metrics(self):
+        if self._metrics_reporter is not None:
+            self._metrics_reporter.stop()
+            self._metrics_reporter.report()
+        if self._metrics_server is not None:
+            self._metrics_server.shutdown()
+
+
+    def _log_unconsumed_queues(self):
+        """Warn about items left in queues nobody reads, e.g. a dead letter
+        queue without a retry stage."""
+        for queue_name, pipeline_queue in self._queues.items():
+            if self._queue_consumers.get(queue_name):
+                continue
+            try:
+                left = pipeline_queue.qsize()
+            except NotImplementedError:
+                continue
+            if left:
+                logger.warning("%s items left in queue %s, which has no consumer", left, queue_name)
+
+
     def process_pipeline(self):
         self._load_pipeline()
+        self._init_checkpoint()
         self._init_queues()
+        self._start_metrics()
         self._init_workers()
+        self._start_stage_watchers()
+        if self._autoscale:
+            threading.Thread(target=self._run_autoscaler, name="autoscaler", daemon=True).start()
         # self._join_workers()  # this will block if run
 
 
     def run(self):
         self.process_pipeline()
-        
-        while True:
-            total_workers_alive = 0
-            worker_stats = []
-            to_del = []
-            # monitor threads
-            for worker_name in self._workers:
-                total_worker_threads_alive = 0
-                for worker_thread in self._workers[worker_name]:
-                    if worker_thread.is_alive():
-                        total_worker_threads_alive += 1
-                total_workers_alive += total_worker_threads_alive        
-                if total_worker_threads_alive == 0:
-                    if self._downstream_queues[worker_name] is not None:
-                        for output_queue in self._downstream_queues[worker_name]:
-                            number_of_consumers = self._queue_consumers[output_queue]
-                            for i in range(number_of_consumers):
-                                self._queues[output_queue].put('DONE')
-
-                    # del self._workers[worker_name]   # skip the track once done   
-                    to_del.append(worker_name)
-            
-                worker_stats.append((worker_name, total_worker_threads_alive))
-               
-            print(f"worker_stats:{worker_stats}")
-            logger.debug("worker_stats: %s", worker_stats)
-            if total_workers_alive ==  0:
-                    break
-            
-            for worker_name in to_del:
-                del self._workers[worker_name]
 
-            time.sleep(1)            
\ No newline at end of file
+        # woken by the stage watchers, no polling
+        with self._stage_done:
+            while self._stages_running:
+                self._stage_done.wait()
+        logger.debug("all pipeline stages finished")
+        self._autoscaler_stop.set()
+        self._stop_metrics()
+        self._log_unconsumed_queues()
+        if self._checkpoint is not None:
+            # nothing to resume: the next run starts from scratch
+            self._checkpoint.clear()
+            self._checkpoint.close()
+        log_cache_stats()